@@ -5,19 +5,78 @@ from allowlisted users using OpenAI.
 
 import api
 import cdp_agent
-from time import sleep
+import model_router
+import notifications
+from context_packer import CONTEXT_TOKEN_BUDGET, ContextPacker
+from conversation import ConversationLimits, async_run_conversation, run_conversation
+from intent_router import Intent, IntentRouter
+from response_cache import ResponseCache
+from thread_summary import ThreadSummaryStore
+from journal import Journal, stage_reached
+from notifications import Mention
+from pipeline import Job, Pipeline, Stage
+from ticket_batcher import TicketCompletionBatcher
+from ticket_indexer import TicketIndexer
 from atproto import Client, client_utils
 from dotenv import load_dotenv
+from web3 import Web3
+import asyncio
+import functools
 import os
-import json
 import re
 
 import cdp_agentkit_core.actions.get_valid_ticket as getValidTicketIdAction
+import cdp_agentkit_core.actions.ticket_system as ticket_system
 import cdp_agentkit_core.actions.complete_ticket as completeTicketAction
+import cdp_agentkit_core.actions.complete_tickets as completeTicketsAction
 
 # How often to check for new notifications (in seconds)
 FETCH_NOTIFICATIONS_DELAY_SEC = 60
-CREATE_TICKET_URL = "https://sepolia.basescan.org/address/0xf0c37a5e8a46a6ed670f239f3be8ad81e0cbeea5#writeContract#F1"
+CREATE_TICKET_URL = ticket_system.buy_tickets_url()
+# Ancestors fetched per mention; they are packed into the prompt's token
+# budget (CONTEXT_TOKEN_BUDGET), see context_packer.py
+CONTEXT_FETCH_MESSAGES = 10
+context_packer = ContextPacker(budget_tokens=int(os.environ.get("CONTEXT_TOKEN_BUDGET", CONTEXT_TOKEN_BUDGET)))
+# Bounds on each reply's tool-calling loop, see conversation.py
+CONVERSATION_LIMITS = ConversationLimits(max_rounds=6, deadline_sec=60.0, max_tokens=20000)
+# Stream completions so a reply goes to the poster as soon as </response>
+# closes, see streaming.py
+STREAM_COMPLETIONS = os.environ.get("STREAM_COMPLETIONS", "1") != "0"
+# Replies to repeated questions, see response_cache.py
+response_cache = ResponseCache()
+# Rolling summaries of conversations the bot has replied in, see
+# thread_summary.py. Opened on first use, like api.get_thread_index().
+_thread_summaries = None
+
+# Pipeline sizing: workers per stage and the bound on each stage's queue
+ENRICH_WORKERS = 8
+GENERATE_WORKERS = 8
+POST_WORKERS = 16
+QUEUE_SIZE = 32
+
+# Run the ticket check and thread fetch concurrently and start generating
+# before the ticket check returns; the generation is cancelled for users
+# without tickets.
+SPECULATIVE_GENERATION = True
+
+# Complete tickets through TicketSystemV2.completeTickets, one transaction per
+# batch window, instead of one completeTicket transaction per reply. Only
+# applies when TICKET_SYSTEM_VERSION is 2; the deployed V1 contract has no
+# completeTickets, so V1 always completes one ticket per transaction. A batch
+# holds at most POST_WORKERS handles since each post worker waits on its
+# completion.
+BATCH_TICKET_COMPLETION = False
+TICKET_BATCH_WINDOW_SEC = 2.0
+
+# Local ticket index (see ticket_indexer.py): how often to pull new events,
+# how many log chunks per pull while catching up, and how often to check
+# recently used handles against the contract.
+DEFAULT_RPC_URL = "https://sepolia.base.org"
+TICKET_SYNC_INTERVAL_SEC = 10
+TICKET_SYNC_MAX_CHUNKS = 50
+TICKET_RECONCILE_INTERVAL_SEC = 600
+# Users without tickets get the "buy tickets" reply at most once per window
+CANNED_REPLY_WINDOW_SEC = 3600
 
 # Load environment variables
 load_dotenv()
@@ -32,10 +91,10 @@ def should_respond(notification) -> bool:
     # Check if author is in allowlist
     return notification.author.handle in ALLOWED_USERS
 
-def get_ai_response(agent: dict, prompt: str) -> str:
-    """Get AI response using OpenAI."""
+def build_messages(prompt: str) -> list:
+    """Build the chat messages for a mention prompt."""
     sanitized_prompt = prompt.replace('<user_prompt>', '[injected_prompt]').replace('</user_prompt>', '[/injected_prompt]')
-    messages = [
+    return [
         {
             "role": "system",
             "content": ("You are a helpful AI assistant responding to mentions on Bluesky, a social media platform:\n"
@@ -65,113 +124,504 @@ def get_ai_response(agent: dict, prompt: str) -> str:
                         "  - Do not call any other function other than `get_wallet_details`, `get_balance`, or `get_valid_ticket`!")
         }
     ]
-    
-    while True:
-        response = api.generate_response(messages, tools=agent["tools"])
-        finished = False
-        for choice in response.choices:
-            if choice.finish_reason == "tool_calls":
-                messages.append(choice.message)
-                results = cdp_agent.process_tool_calls(agent["wallet"], agent["Cdp"], choice.message)
-                print(results)
-                for result in results:
-                    function_call_result_message = {
-                        "role": "tool",
-                        "content": json.dumps(result["result"]),
-                        "tool_call_id": result["id"]
-                    }
-                    messages.append(function_call_result_message)
-            elif choice.finish_reason == "stop":
-                finished = True
-                break
-
-        if finished:
-            break
-
-    response = response.choices[0].message.content
+
+def extract_response(response: str) -> str:
+    """Pull the text out of the <response>...</response> part of a completion."""
     print(f"\nFull AI Response: {response}\n")
-    if re.search(r'<response>(.*?)</response>', response, re.DOTALL):
-        return re.search(r'<response>(.*?)</response>', response, re.DOTALL).group(1).strip()
+    match = re.search(r'<response>(.*?)</response>', response, re.DOTALL)
+    if match:
+        return match.group(1).strip()
     else:
         return response.strip()
 
-def main() -> None:
-    # Initialize Bluesky client
-    agent = cdp_agent.init_agent()
+def get_ai_response(agent: dict, prompt: str) -> str:
+    """Get AI response using OpenAI."""
+    result = run_conversation(agent, build_messages(prompt), CONVERSATION_LIMITS, STREAM_COMPLETIONS)
+    return extract_response(result.content)
+
+async def async_get_ai_response(agent: dict, prompt: str) -> str:
+    """Async version of `get_ai_response`."""
+    result = await async_run_conversation(agent, build_messages(prompt), CONVERSATION_LIMITS, STREAM_COMPLETIONS)
+    return extract_response(result.content)
+
+def buy_tickets_text() -> client_utils.TextBuilder:
+    """The canned reply for users without any tickets."""
+    text_builder = client_utils.TextBuilder()
+    text_builder.text('Buy tickets to chat by visiting ')
+    text_builder.link('this link', CREATE_TICKET_URL)
+    text_builder.text('\n\nCost: 0.0001 ETH per ticket, Handle should be your Bluesky handle (e.g., "example.bsky.social")')
+    return text_builder
+
+# Markdown links and bare URLs in a reply, posted as real links
+LINK_PATTERN = re.compile(r"\[([^\]]+)\]\((https?://[^)\s]+)\)|(https?://\S*[^\s.,;:!?)\]])")
+
+def reply_text(reply: str) -> client_utils.TextBuilder:
+    """Build a post from reply text, turning `[text](url)` and bare URLs into links."""
+    text_builder = client_utils.TextBuilder()
+    position = 0
+    for match in LINK_PATTERN.finditer(reply):
+        text_builder.text(reply[position:match.start()])
+        if match.group(3):
+            text_builder.link(match.group(3), match.group(3))
+        else:
+            text_builder.link(match.group(1), match.group(2))
+        position = match.end()
+    text_builder.text(reply[position:])
+    return text_builder
+
+def create_intent_router() -> IntentRouter:
+    """Intents answered from templates instead of the LLM."""
+    router = IntentRouter()
+    router.register(Intent(
+        "ticket_balance",
+        rules=[r"^(how many|how much) tickets? (do i|i) (have|got)( left)?\W*$",
+               r"^(check|show) my tickets?\W*$",
+               r"^my tickets?\W*$"],
+        examples=["how many tickets do i have", "how many tickets do I have left", "ticket balance",
+                  "check my tickets", "what's my ticket balance", "tickets left?", "do i have any tickets left",
+                  "how many tickets are left on my account"],
+        keywords=[r"\btickets?\b"],
+        render=lambda num_tickets, **facts: (
+            f"You have {num_tickets} ticket{'s' if num_tickets != '1' else ''}, "
+            "including the one this reply uses.")))
+    router.register(Intent(
+        "buy_tickets",
+        rules=[r"^(how|where) (do|can) i (buy|get|purchase) (more )?tickets?\W*$",
+               r"^(buy|purchase) (more )?tickets?\W*$"],
+        examples=["how do i buy tickets", "where can i get more tickets", "how to purchase tickets",
+                  "buy tickets", "how can i get tickets", "where do i buy tickets", "i want more tickets"],
+        keywords=[r"\btickets?\b"],
+        render=lambda **facts: (
+            f"Buy tickets by visiting [this link]({CREATE_TICKET_URL})\n\n"
+            'Cost: 0.0001 ETH per ticket, Handle should be your Bluesky handle (e.g., "example.bsky.social")')))
+    router.register(Intent(
+        "help",
+        rules=[r"^(help|what can you do|what do you do)\W*$"],
+        examples=["help", "what can you do", "what do you do", "how does this work", "what are you",
+                  "how do i use you", "what are your commands"],
+        # Whole phrases: "what can you do with my tickets" is not a help request
+        keywords=[r"\b(help|commands)\b", r"^(what can you do|what do you do|what are you|how does this work|"
+                  r"how do i use you)\W*$"],
+        render=lambda **facts: (
+            "I'm an AI agent with a CDP wallet on Base Sepolia. Mention me with a question and I'll answer; "
+            "each reply uses one ticket. I can check my wallet, its balances and your tickets.")))
+    router.add_other_examples([
+        "what is the price of eth", "send me some eth", "tell me a joke", "what do you think about this",
+        "deploy a token for me", "what's the weather", "can you explain this thread", "who are you voting for",
+        "what is your wallet balance", "gm", "thanks!", "how does ethereum staking work",
+        "how many tickets are there", "how many tickets have been sold", "how much eth do you have"])
+    return router
+
+def parse_available_tickets(ticket_id_response: str) -> str:
+    """Extract `availableTickets` from a `get_valid_ticket` result string."""
+    return re.search(r"name='availableTickets', value='(.*)'", ticket_id_response).group(1)
+
+def format_post(post) -> str:
+    return f"@{post.author.handle}: {post.record.text}"
+
+async def fetch_mentions(journal: Journal, pipeline: Pipeline) -> None:
+    """Fetch stage: drain new mentions since the high-water mark and submit them."""
+    # Resume whatever was in flight when the previous run stopped.
+    for uri, key, mention in journal.unfinished():
+        print(f"Resuming {uri}")
+        await pipeline.submit(Job(key, Mention.from_dict(mention)))
+
+    pending_mark = notifications.load_mark()
+    commit = None
 
-    print(f"Started monitoring mentions for {BLUESKY_USERNAME}")
-    
     while True:
         try:
             # Save current time for marking notifications as read
-            last_seen_at = api.bluesky_client.get_current_time_iso()
-
-            # Fetch new notifications
-            response = api.bluesky_client.app.bsky.notification.list_notifications()
-            
-            for notification in response.notifications:
-                if not notification.is_read:
-                    print(f"Processing notification {notification}")                    
-                    if notification.reason != 'mention': continue
-
-                    print(f"from @{notification.author.handle}")
-                    print(f"text: {notification.record.text}")
-
-                    # Check if we've already responded to this thread
-                    thread_response = api.bluesky_get_post_thread(notification.uri)
-                    has_responded = api.bluesky_has_responded(thread_response)
-                    
-                    if has_responded:
-                        print(f"Already responded to thread")
-                        continue
-
-                    # Post the response
-                    context = []
-                    root = thread_response.thread
-                    while root.parent is not None:
-                        root = root.parent
-                        context.append(f"@{root.post.author.handle}: {root.post.record.text}")
-
-                    ticket_id_response = getValidTicketIdAction.get_valid_ticket(agent["wallet"], agent["Cdp"], notification.author.handle)
-                    print(ticket_id_response)
-                    num_tickets = re.search(r"name='availableTickets', value='(.*)'", ticket_id_response).group(1)
-                    print(f"Number of tickets: {num_tickets}")
-                    if num_tickets == "0":
-                        print(f"User {notification.author.handle} does not have enough tickets")
-                        text_builder = client_utils.TextBuilder()
-                        text_builder.text('Buy tickets to chat by visiting ')
-                        text_builder.link('this link', CREATE_TICKET_URL)
-                        text_builder.text('\n\nCost: 0.0001 ETH per ticket, Handle should be your Bluesky handle (e.g., "example.bsky.social")')
-                        api.bluesky_reply_post(
-                            notification,
-                            root,
-                            text_builder)
-                        continue
-
-                    # Get the mention text
-                    mention_text = notification.record.text
-                    print(f"Mention text: {mention_text}")
-                    
-                    MAX_CONTEXT_MESSAGES = 5
-                    previous_messages = '\n--\n'.join(context[:MAX_CONTEXT_MESSAGES][::-1])
-                    prompt = f"<previous_messages>{previous_messages}</previous_messages>\n--\n<current_message>@{notification.author.handle}: {mention_text}</current_message>"
-                    
-                    # Generate AI response
-                    ai_response = get_ai_response(agent, prompt)
-                    print(f"AI response: {ai_response}")
-                    complete_ticket_response = completeTicketAction.complete_ticket(agent["wallet"], agent["Cdp"], notification.author.handle)
-                    print(f"Complete ticket response: {complete_ticket_response}")
-                    api.bluesky_reply_post(notification, root, ai_response)
-                    print(f"Posted response to @{notification.author.handle}")
-
-            # Mark notifications as seen
-            api.bluesky_client.app.bsky.notification.update_seen({'seen_at': last_seen_at})
-            
+            last_seen_at = api.get_async_bluesky_client().get_current_time_iso()
+
+            drained_mark = pending_mark.copy()
+            mentions = []
+            async for page in notifications.iter_new_notifications(pending_mark):
+                for notification in page:
+                    drained_mark.advance(notification)
+                    mentions.append(Mention.from_notification(notification))
+
+            # Pages, and the notifications in each, come newest first. Submit
+            # after the whole drain, oldest first, so replies in the same
+            # thread are handled in the order written even across pages.
+            jobs = []
+            for mention in reversed(mentions):
+                print(f"Processing mention {mention.uri} from @{mention.handle}")
+                # The journal also drops posts seen as both a mention and a reply.
+                if not journal.add(mention.uri, mention.root_uri, mention.to_dict()):
+                    continue
+
+                job = Job(mention.root_uri, mention)
+                jobs.append(job)
+                await pipeline.submit(job)
+            pending_mark = drained_mark
+
+            # Persist the mark and mark notifications as seen once everything
+            # in this batch (and every earlier batch) has been handled.
+            commit = asyncio.create_task(
+                commit_when_done(jobs, last_seen_at, drained_mark.copy(), commit))
+
         except Exception as e:
-            print(f"Error processing notifications: {e}")
-            
+            print(f"Error fetching notifications: {e}")
+
         # Wait before checking for new notifications
-        sleep(FETCH_NOTIFICATIONS_DELAY_SEC)
+        await asyncio.sleep(FETCH_NOTIFICATIONS_DELAY_SEC)
+
+async def commit_when_done(jobs: list, seen_at: str, mark, previous) -> None:
+    if previous is not None:
+        await previous
+    for job in jobs:
+        await job.done.wait()
+    notifications.save_mark(mark)
+    if jobs:
+        print(f"Cache stats: {api.cache_stats()}, tools: {cdp_agent.tool_cache_stats()}, "
+              f"responses: {response_cache.stats()}")
+        print(f"Model tier stats: {model_router.tier_stats()}")
+        print(f"Context packing stats: {context_packer.stats()}")
+    try:
+        await api.async_bluesky_update_seen(seen_at)
+    except Exception as e:
+        print(f"Error marking notifications as seen: {e}")
+
+def get_thread_summaries() -> ThreadSummaryStore:
+    global _thread_summaries
+    if _thread_summaries is None:
+        _thread_summaries = ThreadSummaryStore()
+    return _thread_summaries
+
+async def fetch_context(mention: Mention) -> tuple:
+    """Thread context for a mention packed into the token budget, nearest
+    ancestor first and the root (or the conversation summary) last.
+
+    The summary is the one stored with the bot's nearest reply among the
+    mention's ancestors, so each branch of a thread has its own.
+
+    Returns:
+        tuple: (context, the posts not yet in that summary, oldest first,
+        the URI of the bot's reply the summary belongs to or None)
+    """
+    ancestors, root = await api.async_bluesky_get_context(
+        mention.uri, mention.root_uri, CONTEXT_FETCH_MESSAGES, mention.parent_uri, mention.parent_cid)
+    if root is None and ancestors and ancestors[-1].uri == mention.root_uri:
+        ancestors, root = ancestors[:-1], ancestors[-1]
+
+    uris = [post.uri for post in ancestors]
+    summary = get_thread_summaries().nearest(uris)
+    if summary is None:
+        recent = [format_post(post) for post in ancestors]
+        # The root is kept as the oldest message even when it's out of the
+        # nearest-ancestors window, so the model still sees what the thread is about.
+        oldest = format_post(root) if root is not None else None
+        new_messages = recent + ([oldest] if oldest is not None else [])
+    else:
+        # Only posts since the bot's last reply are sent raw; the rest of the
+        # thread is in the summary and its raw window.
+        ancestors = ancestors[:uris.index(summary.last_uri)]
+        new_messages = [format_post(post) for post in ancestors]
+        *recent, oldest = new_messages + summary.previous_messages()
+    context = context_packer.pack(recent, oldest, mention.text)
+    print(context.report())
+    return context.messages, new_messages[::-1], summary.last_uri if summary is not None else None
+
+async def check_tickets(agent: dict, mention: Mention) -> str:
+    """Number of available tickets for the mention's author, as a string.
+
+    A ticket is reserved for the mention in the local ledger at the same
+    time, so concurrent mentions from the same user can't spend the same
+    ticket. A positive balance from the local ticket index is trusted. Zero
+    (or an index that hasn't caught up) is confirmed on chain, since a
+    purchase may not have been indexed yet, and a confirmed zero is cached
+    until the user buys tickets.
+    """
+    indexer = agent.get("ticket_indexer")
+    if indexer is not None:
+        agent["touched_handles"].add(mention.handle)
+        if indexer.has_no_tickets(mention.handle):
+            print("Number of tickets (cached): 0")
+            return "0"
+        available = indexer.reserve(mention.handle, mention.uri)
+        if available:
+            print(f"Number of tickets (indexed): {available}")
+            return str(available)
+
+    ticket_id_response = await asyncio.to_thread(
+        getValidTicketIdAction.get_valid_ticket, agent["wallet"], agent["Cdp"], mention.handle)
+    print(ticket_id_response)
+    num_tickets = parse_available_tickets(ticket_id_response)
+    if indexer is not None and num_tickets == "0":
+        indexer.mark_no_tickets(mention.handle)
+    elif indexer is not None:
+        num_tickets = str(indexer.reserve(mention.handle, mention.uri, available=int(num_tickets)))
+    print(f"Number of tickets: {num_tickets}")
+    return num_tickets
+
+async def generate_ai_reply(agent: dict, mention: Mention, context: list) -> tuple:
+    """Reply text for the mention, and whether it is the degraded answer
+    (a conversation limit was hit), which isn't charged a ticket."""
+    # Get the mention text
+    print(f"Mention text: {mention.text}")
+
+    previous_messages = '\n--\n'.join(context[::-1])
+    prompt = f"<previous_messages>{previous_messages}</previous_messages>\n--\n<current_message>@{mention.handle}: {mention.text}</current_message>"
+
+    # Repeated questions are answered from the response cache
+    key = response_cache.key(mention.text, context, mention.handle)
+    ai_response = await asyncio.to_thread(
+        response_cache.lookup, key, mention.handle,
+        functools.partial(cdp_agent.run_read_only_tool, agent["wallet"], agent["Cdp"]))
+    if ai_response is not None:
+        print(f"AI response (cached): {ai_response}")
+        return ai_response, False
+
+    # Generate AI response
+    result = await async_run_conversation(agent, build_messages(prompt), CONVERSATION_LIMITS, STREAM_COMPLETIONS)
+    ai_response = extract_response(result.content)
+    if result.limit_hit is None:
+        response_cache.store(key, mention.handle, ai_response, result.tool_calls, cdp_agent.READ_ONLY_TOOLS)
+    print(f"AI response: {ai_response}")
+    return ai_response, result.limit_hit is not None
+
+def start_enrich(journal: Journal, job: Job) -> bool:
+    """Shared start of both enrich stages.
+
+    Returns False when the job has nothing left to do here, either because a
+    previous run already got past this stage or because the post was answered.
+    """
+    mention = job.payload
+    stage, data = journal.get(mention.uri)
+    job.data.update(data)
+    if stage_reached(stage, "ticket_checked"):
+        job.data["skipped"] = stage == "skipped"
+        return False
+
+    print(f"from @{mention.handle}")
+    print(f"text: {mention.text}")
+
+    # Check if we've already responded to this post (local index, no network)
+    if api.bluesky_has_responded_to(mention.uri):
+        print(f"Already responded to thread")
+        journal.advance(mention.uri, "skipped")
+        job.data["skipped"] = True
+        return False
+    return True
+
+async def enrich_mention(agent: dict, journal: Journal, job: Job) -> bool:
+    """Enrich stage: thread context and ticket check."""
+    if not start_enrich(journal, job):
+        return not job.data.get("skipped")
+    return await check_then_fetch(agent, journal, job)
+
+async def check_then_fetch(agent: dict, journal: Journal, job: Job) -> bool:
+    mention = job.payload
+    num_tickets = await check_tickets(agent, mention)
+    # Context is only needed to generate a paid reply.
+    context, thread_messages, summary_uri = (
+        await fetch_context(mention) if num_tickets != "0" else ([], [], None))
+
+    job.data.update(context=context, thread_messages=thread_messages, summary_uri=summary_uri,
+                    num_tickets=num_tickets)
+    journal.advance(mention.uri, "ticket_checked", context=context, thread_messages=thread_messages,
+                    summary_uri=summary_uri, num_tickets=num_tickets)
+    return True
+
+async def speculative_enrich_mention(agent: dict, journal: Journal, job: Job) -> bool:
+    """Enrich stage for SPECULATIVE_GENERATION mode.
+
+    The ticket check and the context fetch don't depend on each other, so they
+    run at the same time, and generation starts as soon as the context is in
+    rather than waiting for the ticket check. If the user turns out to have no
+    tickets the speculative generation is cancelled. A reply generated here is
+    journaled, so the generate stage just passes the job through.
+    """
+    if not start_enrich(journal, job):
+        return not job.data.get("skipped")
+
+    mention = job.payload
+    if agent["ticket_indexer"].has_no_tickets(mention.handle) or agent["intent_router"].matches(mention.text):
+        # Known non-payer or a templated intent: nothing to speculate on.
+        return await check_then_fetch(agent, journal, job)
+    tickets_task = asyncio.create_task(check_tickets(agent, mention))
+
+    async def fetch_and_generate():
+        context, thread_messages, summary_uri = await fetch_context(mention)
+        job.data.update(context=context, thread_messages=thread_messages, summary_uri=summary_uri)
+        return await generate_ai_reply(agent, mention, context)
+    generation_task = asyncio.create_task(fetch_and_generate())
+
+    try:
+        num_tickets = await tickets_task
+    except BaseException:
+        generation_task.cancel()
+        raise
+
+    if num_tickets == "0":
+        generation_task.cancel()
+        try:
+            await generation_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error in cancelled speculative generation: {e}")
+        job.data.setdefault("context", [])
+        job.data["num_tickets"] = num_tickets
+        journal.advance(mention.uri, "ticket_checked", context=job.data["context"], thread_messages=[],
+                        num_tickets=num_tickets)
+        return True
+
+    ai_response, degraded = await generation_task
+    job.data.update(num_tickets=num_tickets, reply=ai_response, paid=True, degraded=degraded)
+    journal.advance(mention.uri, "ticket_checked", context=job.data["context"],
+                    thread_messages=job.data["thread_messages"], summary_uri=job.data["summary_uri"],
+                    num_tickets=num_tickets)
+    journal.advance(mention.uri, "generated", reply=ai_response, paid=True, degraded=degraded)
+    return True
+
+async def generate_reply(agent: dict, journal: Journal, job: Job) -> bool:
+    """Generate stage: build the prompt and ask the model for a reply."""
+    mention = job.payload
+    stage, data = journal.get(mention.uri)
+    job.data.update(data)
+    if stage_reached(stage, "generated"):
+        return True
+
+    if job.data["num_tickets"] == "0":
+        print(f"User {mention.handle} does not have enough tickets")
+        # The canned reply is rebuilt at post time; a TextBuilder can't be journaled.
+        job.data.update(reply=None, paid=False)
+        journal.advance(mention.uri, "generated", reply=None, paid=False)
+        return True
+
+    # Common questions are answered from templates without the LLM
+    ai_response = agent["intent_router"].route(mention.text, num_tickets=job.data["num_tickets"])
+    degraded = False
+    if ai_response is not None:
+        print(f"AI response (intent template): {ai_response}")
+    else:
+        ai_response, degraded = await generate_ai_reply(agent, mention, job.data["context"])
+    job.data.update(reply=ai_response, paid=True, degraded=degraded)
+    journal.advance(mention.uri, "generated", reply=ai_response, paid=True, degraded=degraded)
+    return True
+
+async def post_reply(agent: dict, journal: Journal, job: Job) -> bool:
+    """Post stage: complete the ticket (for paid replies) and post."""
+    mention = job.payload
+    stage, data = journal.get(mention.uri)
+    job.data.update(data)
+    if stage_reached(stage, "posted"):
+        return True
+
+    if job.data["paid"] and job.data.get("degraded") and not stage_reached(stage, "ticket_completed"):
+        # "Sorry, I couldn't finish..." isn't worth a ticket
+        print(f"Degraded reply for @{mention.handle}, not completing a ticket")
+        agent["ticket_indexer"].release(mention.uri)
+        journal.advance(mention.uri, "ticket_completed", complete_ticket_response=None)
+    elif job.data["paid"] and not stage_reached(stage, "ticket_completed"):
+        if BATCH_TICKET_COMPLETION and ticket_system.supports_batch_completion():
+            complete_ticket_response = await agent["ticket_batcher"].complete(mention.handle)
+        else:
+            complete_ticket_response = await asyncio.to_thread(
+                completeTicketAction.complete_ticket, agent["wallet"], agent["Cdp"], mention.handle)
+        print(f"Complete ticket response: {complete_ticket_response}")
+        # Cached get_valid_ticket results are stale after a completion.
+        cdp_agent.invalidate_tool_results(agent["wallet"])
+        if complete_ticket_response.startswith("Successfully"):
+            agent["ticket_indexer"].mark_submitted(mention.uri)
+        else:
+            agent["ticket_indexer"].release(mention.uri)
+        journal.advance(mention.uri, "ticket_completed", complete_ticket_response=complete_ticket_response)
+
+    if not job.data["paid"] and not agent["ticket_indexer"].claim_canned_reply(
+            mention.handle, mention.uri, CANNED_REPLY_WINDOW_SEC):
+        print(f"Already sent @{mention.handle} the buy tickets reply recently")
+        journal.advance(mention.uri, "skipped")
+        return True
+
+    # A resumed job may have posted before the previous run stopped.
+    if api.bluesky_has_responded_to(mention.uri):
+        print(f"Already responded to {mention.uri}")
+        journal.advance(mention.uri, "posted")
+        return True
+
+    reply = reply_text(job.data["reply"]) if job.data["paid"] else buy_tickets_text()
+    reply_post = await api.async_bluesky_reply_post(mention, mention.root_ref(), reply)
+    journal.advance(mention.uri, "posted")
+    print(f"Posted response to @{mention.handle}")
+
+    if job.data["paid"] and not job.data.get("degraded"):
+        # Off the reply's critical path: it has already been posted.
+        messages = [*job.data.get("thread_messages", []), f"@{mention.handle}: {mention.text}",
+                    f"@{api.BLUESKY_HANDLE}: {job.data['reply']}"]
+        thread_summaries = get_thread_summaries()
+        previous = thread_summaries.get(job.data["summary_uri"]) if job.data.get("summary_uri") else None
+        try:
+            await asyncio.to_thread(thread_summaries.update, previous, mention.root_uri, messages, reply_post.uri)
+        except Exception as e:
+            print(f"Error updating thread summary: {e}")
+    return True
+
+def create_ticket_indexer():
+    web3 = Web3(Web3.HTTPProvider(os.environ.get("BASE_SEPOLIA_RPC_URL", DEFAULT_RPC_URL)))
+    return TicketIndexer(
+        web3,
+        ticket_system.ticket_system_address(),
+        start_block=int(os.environ.get("TICKET_SYSTEM_START_BLOCK", "0")))
+
+def release_reservation(agent: dict, job: Job, error: Exception) -> None:
+    """Pipeline error hook: give back the ticket reserved for a job that
+    failed before its completion was submitted."""
+    agent["ticket_indexer"].release(job.payload.uri)
+
+async def sync_ticket_index(agent: dict) -> None:
+    """Keep the ticket index current and reconcile recently used handles."""
+    indexer = agent["ticket_indexer"]
+    last_reconcile = asyncio.get_running_loop().time()
+    while True:
+        try:
+            applied = await asyncio.to_thread(indexer.sync, TICKET_SYNC_MAX_CHUNKS)
+            if applied:
+                print(f"Indexed {applied} ticket events up to block {indexer.last_block}")
+
+            if asyncio.get_running_loop().time() - last_reconcile >= TICKET_RECONCILE_INTERVAL_SEC:
+                handles, agent["touched_handles"] = agent["touched_handles"], set()
+                for handle in handles:
+                    await asyncio.to_thread(indexer.reconcile, handle)
+                last_reconcile = asyncio.get_running_loop().time()
+        except Exception as e:
+            print(f"Error syncing ticket index: {e}")
+        await asyncio.sleep(TICKET_SYNC_INTERVAL_SEC)
+
+async def run(agent: dict) -> None:
+    await api.async_bluesky_login()
+    if api.get_thread_index().is_empty():
+        print(f"Rebuilt reply index with {await api.async_bluesky_rebuild_thread_index()} replies")
+    journal = Journal()
+    agent["ticket_indexer"] = create_ticket_indexer()
+    agent["touched_handles"] = set()
+    agent["intent_router"] = create_intent_router()
+    agent["ticket_batcher"] = TicketCompletionBatcher(
+        functools.partial(completeTicketsAction.complete_tickets_each, agent["wallet"], agent["Cdp"],
+                          agent["ticket_indexer"].web3),
+        window_sec=TICKET_BATCH_WINDOW_SEC, max_batch=POST_WORKERS)
+    ticket_sync = asyncio.create_task(sync_ticket_index(agent))
+    pipeline = Pipeline([
+        Stage("enrich", functools.partial(
+            speculative_enrich_mention if SPECULATIVE_GENERATION else enrich_mention, agent, journal),
+            workers=ENRICH_WORKERS),
+        Stage("generate", functools.partial(generate_reply, agent, journal), workers=GENERATE_WORKERS),
+        Stage("post", functools.partial(post_reply, agent, journal), workers=POST_WORKERS),
+    ], queue_size=QUEUE_SIZE, on_error=functools.partial(release_reservation, agent))
+    try:
+        await pipeline.run(functools.partial(fetch_mentions, journal))
+    finally:
+        ticket_sync.cancel()
+        journal.close()
+
+def main() -> None:
+    # Initialize Bluesky client
+    agent = cdp_agent.init_agent()
+
+    print(f"Started monitoring mentions for {BLUESKY_USERNAME}")
+    asyncio.run(run(agent))
 
 if __name__ == '__main__':
     main()
@@ -1,25 +1,189 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from atproto import Client as atproto_client
+from atproto import AsyncClient as atproto_async_client
 from atproto import models as atproto_models
+import asyncio
+import itertools
 import json
+import time
 from retrying import retry
 from dotenv import load_dotenv
 import os
 
 from requests_oauthlib import OAuth1Session
 
+from batching import Coalescer
+from cache import LRUTTLCache
+import model_router
+import streaming
+from thread_index import ThreadIndex
+
 load_dotenv()
-openai_client = OpenAI()
 
 BLUESKY_USERNAME = os.environ["BLUESKY_USERNAME"]
 BLUESKY_PASSWORD = os.environ["BLUESKY_PASSWORD"]
 BLUESKY_HANDLE = os.environ["BLUESKY_HANDLE"]
 
-bluesky_client = atproto_client()
-bluesky_client.login(BLUESKY_USERNAME, BLUESKY_PASSWORD)
+# Session strings of the logged-in Bluesky clients, kept up to date as
+# sessions are created and refreshed, so a restart reuses the session instead
+# of calling createSession (which is rate limited) again. The sync and async
+# clients each refresh their own session, so each gets its own entry.
+BLUESKY_SESSION_FILE = "bluesky_session.json"
+
+# Clients are built on first use, see the getters below, so importing this
+# module costs no network round trips.
+# OpenAI clients by base URL (None for the default endpoint)
+_openai_clients = {}
+_async_openai_clients = {}
+_bluesky_client = None
+_async_bluesky_client = None
+# Posts the bot has already replied to, see `bluesky_has_responded_to`.
+# Opened on first use too, so importing doesn't create the database.
+_thread_index = None
+
+
+def _load_session(name):
+    try:
+        with open(BLUESKY_SESSION_FILE) as f:
+            return json.load(f).get(name)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save_session(name, session_string):
+    try:
+        with open(BLUESKY_SESSION_FILE) as f:
+            sessions = json.load(f)
+    except (FileNotFoundError, ValueError):
+        sessions = {}
+    sessions[name] = session_string
+    tmp_path = f"{BLUESKY_SESSION_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(sessions, f)
+    os.replace(tmp_path, BLUESKY_SESSION_FILE)
+
+
+def get_openai_client(base_url=None):
+    if base_url not in _openai_clients:
+        _openai_clients[base_url] = OpenAI(base_url=base_url)
+    return _openai_clients[base_url]
+
+
+def get_async_openai_client(base_url=None):
+    if base_url not in _async_openai_clients:
+        _async_openai_clients[base_url] = AsyncOpenAI(base_url=base_url)
+    return _async_openai_clients[base_url]
+
+
+def get_bluesky_client():
+    """The sync Bluesky client, logged in on first use."""
+    global _bluesky_client
+    if _bluesky_client is None:
+        client = atproto_client()
+        client.on_session_change(
+            lambda event, session: _save_session("sync", session.export()))
+        start = time.perf_counter()
+        session_string = _load_session("sync")
+        if session_string:
+            try:
+                client.login(session_string=session_string)
+            except Exception as e:
+                print(f"Saved Bluesky session rejected, logging in again: {e}")
+                session_string = None
+        if not session_string:
+            client.login(BLUESKY_USERNAME, BLUESKY_PASSWORD)
+        print(f"Bluesky login ({'saved session' if session_string else 'password'}) "
+              f"took {time.perf_counter() - start:.2f}s")
+        _bluesky_client = client
+    return _bluesky_client
+
+
+def get_async_bluesky_client():
+    """The async Bluesky client. It has to be logged in from inside the event
+    loop, see `async_bluesky_login`."""
+    global _async_bluesky_client
+    if _async_bluesky_client is None:
+        _async_bluesky_client = atproto_async_client()
+
+        async def save_session(event, session):
+            _save_session("async", session.export())
+        _async_bluesky_client.on_session_change(save_session)
+    return _async_bluesky_client
+
+
+def get_thread_index():
+    global _thread_index
+    if _thread_index is None:
+        _thread_index = ThreadIndex()
+    return _thread_index
+
+
+def __getattr__(name):
+    # Keep the old module-level client names working, built lazily.
+    getters = {
+        "openai_client": get_openai_client,
+        "async_openai_client": get_async_openai_client,
+        "bluesky_client": get_bluesky_client,
+        "async_bluesky_client": get_async_bluesky_client,
+        "thread_index": get_thread_index,
+    }
+    if name in getters:
+        return getters[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Post views keyed by URI and checked against the expected CID, so a cached
+# post is never served for edited content. Posts are immutable per CID; the
+# TTL only bounds how long a deleted post can linger.
+POST_CACHE_SIZE = 2048
+POST_CACHE_TTL_SEC = 600
+post_cache = LRUTTLCache(max_size=POST_CACHE_SIZE, ttl_sec=POST_CACHE_TTL_SEC)
+
+# Whole `get_post_thread` responses, tagged with their thread root URI and
+# dropped whenever the bot posts into that thread (their replies go stale).
+THREAD_CACHE_SIZE = 256
+THREAD_CACHE_TTL_SEC = 60
+thread_cache = LRUTTLCache(max_size=THREAD_CACHE_SIZE, ttl_sec=THREAD_CACHE_TTL_SEC)
+
+
+def _root_uri(post):
+    reply = getattr(post.record, 'reply', None)
+    return reply.root.uri if reply is not None else post.uri
+
+
+def _cache_post(post, root_uri=None):
+    post_cache.set(post.uri, post, tag=root_uri or _root_uri(post))
+
+
+def _cache_thread(uri, thread_response, partial=False):
+    """Cache a `get_post_thread` response and the posts in it.
+
+    Partial responses (fetched with a reduced depth or parent height) only
+    feed `post_cache`: served from `thread_cache` they would look like whole
+    threads without replies to `bluesky_has_responded`.
+    """
+    thread = thread_response.thread
+    root_uri = _root_uri(thread.post) if getattr(thread, 'post', None) is not None else uri
+    if not partial:
+        thread_cache.set(uri, thread_response, tag=root_uri)
+    if getattr(thread, 'post', None) is not None:
+        _cache_post(thread.post, root_uri)
+        for post in bluesky_iter_ancestors(thread):
+            _cache_post(post, root_uri)
+
+
+def _get_cached_post(uri, cid=None):
+    post = post_cache.get(uri)
+    if post is None or (cid is not None and post.cid != cid):
+        return None
+    return post
+
+
+def cache_stats():
+    """Hit/miss counters for the Bluesky lookup caches."""
+    return {"posts": post_cache.stats(), "threads": thread_cache.stats()}
 
 def bluesky_send_post(message):
-    post = bluesky_client.send_post(message)
+    post = get_bluesky_client().send_post(message)
     return post
 
 
@@ -29,33 +193,259 @@ def bluesky_reply_post(post, root, text):
     else:
         root_post_ref = atproto_models.create_strong_ref(root.post)
     parent_post_ref = atproto_models.create_strong_ref(post)
-    reply_to_parent = bluesky_client.send_post(
+    reply_to_parent = get_bluesky_client().send_post(
         text=text,
         reply_to=atproto_models.AppBskyFeedPost.ReplyRef(
             parent=parent_post_ref, root=root_post_ref
         ),
     )
+    get_thread_index().record(parent_post_ref.uri, root_post_ref.uri, reply_to_parent.uri)
+    thread_cache.invalidate_tag(root_post_ref.uri)
     return reply_to_parent
 
 
 def bluesky_get_post_thread(uri):
-    return bluesky_client.get_post_thread(uri)
+    thread_response = thread_cache.get(uri)
+    if thread_response is None:
+        thread_response = get_bluesky_client().get_post_thread(uri)
+        _cache_thread(uri, thread_response)
+    return thread_response
+
+
+async def async_bluesky_login():
+    """Log the async client in, reusing the saved session when it is still valid."""
+    client = get_async_bluesky_client()
+    start = asyncio.get_running_loop().time()
+    session_string = _load_session("async")
+    if session_string:
+        try:
+            await client.login(session_string=session_string)
+        except Exception as e:
+            print(f"Saved Bluesky session rejected, logging in again: {e}")
+            session_string = None
+    if not session_string:
+        await client.login(BLUESKY_USERNAME, BLUESKY_PASSWORD)
+    print(f"Bluesky login ({'saved session' if session_string else 'password'}) "
+          f"took {asyncio.get_running_loop().time() - start:.2f}s")
+
+
+async def async_bluesky_list_notifications(params=None):
+    return await get_async_bluesky_client().app.bsky.notification.list_notifications(params)
+
+
+async def async_bluesky_update_seen(seen_at):
+    await get_async_bluesky_client().app.bsky.notification.update_seen({'seen_at': seen_at})
+
+
+async def async_bluesky_reply_post(post, root_post, text):
+    """Reply to `post` inside the thread rooted at `root_post`.
+
+    Unlike `bluesky_reply_post`, `root_post` is the root post itself (anything
+    with `uri` and `cid`), not a thread view node.
+    """
+    if root_post is None:
+        root_post = post
+    reply_to_parent = await get_async_bluesky_client().send_post(
+        text=text,
+        reply_to=atproto_models.AppBskyFeedPost.ReplyRef(
+            parent=atproto_models.create_strong_ref(post),
+            root=atproto_models.create_strong_ref(root_post),
+        ),
+    )
+    get_thread_index().record(post.uri, root_post.uri, reply_to_parent.uri)
+    thread_cache.invalidate_tag(root_post.uri)
+    return reply_to_parent
+
+
+def bluesky_iter_ancestors(thread):
+    """Lazily yield the ancestor posts of a thread view, nearest first.
+
+    Stops early at a missing or blocked parent, which has no `post`.
+    """
+    node = getattr(thread, 'parent', None)
+    while node is not None and getattr(node, 'post', None) is not None:
+        yield node.post
+        node = node.parent
+
+
+class PostBatcher(Coalescer):
+    """Coalesce single-post lookups into batched `app.bsky.feed.get_posts` calls.
+
+    Lookups made within `window_sec` of each other (up to `max_batch` URIs,
+    the getPosts limit) share one request.
+    """
+
+    def __init__(self, window_sec=0.02, max_batch=25):
+        super().__init__(window_sec, max_batch, dedupe=True)
+
+    async def get(self, uri):
+        """Return the post view for `uri`, or None if it no longer exists."""
+        return await self.request(uri)
+
+    async def run_batch(self, uris: list) -> list:
+        response = await get_async_bluesky_client().get_posts(uris)
+        posts = {post.uri: post for post in response.posts}
+        return [posts.get(uri) for uri in uris]
+
+
+post_batcher = PostBatcher()
+
+
+def _cached_ancestors(parent_uri, parent_cid, max_messages):
+    """Walk the ancestor chain through `post_cache`; None on any miss."""
+    ancestors = []
+    while parent_uri is not None and len(ancestors) < max_messages:
+        post = _get_cached_post(parent_uri, parent_cid)
+        if post is None:
+            return None
+        ancestors.append(post)
+        reply = getattr(post.record, 'reply', None)
+        parent_uri, parent_cid = (reply.parent.uri, reply.parent.cid) if reply is not None else (None, None)
+    return ancestors
+
+
+async def async_bluesky_get_context(uri, root_uri, max_messages, parent_uri=None, parent_cid=None):
+    """Fetch just enough of a thread to build prompt context.
+
+    When the post's parent ref is given and the whole ancestor chain is in
+    `post_cache` (e.g. a burst of mentions in one hot thread), no request is
+    made. Otherwise `get_post_thread` is asked for `max_messages` parents and
+    no replies, so the payload does not grow with thread depth, and every
+    post it returns is cached. If the thread root lies beyond that window it
+    is hydrated separately through the batched `get_posts` path.
+
+    Returns:
+        tuple: (ancestor post views nearest first, root post view or None if
+        the root is already among the ancestors or is the post itself)
+    """
+    ancestors = None
+    if parent_uri is not None:
+        ancestors = _cached_ancestors(parent_uri, parent_cid, max_messages)
+    if ancestors is None:
+        thread_response = await get_async_bluesky_client().get_post_thread(uri, depth=0, parent_height=max_messages)
+        _cache_thread(uri, thread_response, partial=True)
+        ancestors = list(itertools.islice(bluesky_iter_ancestors(thread_response.thread), max_messages))
+    root = None
+    if root_uri != uri and all(post.uri != root_uri for post in ancestors):
+        root = _get_cached_post(root_uri)
+        if root is None:
+            root = await post_batcher.get(root_uri)
+            if root is not None:
+                _cache_post(root, root_uri)
+    return ancestors, root
+
+
+async def async_bluesky_rebuild_thread_index(limit=100):
+    """Rebuild the local reply index from the bot's own author feed."""
+    cursor = None
+    count = 0
+    while True:
+        response = await get_async_bluesky_client().get_author_feed(
+            BLUESKY_HANDLE, cursor=cursor, filter='posts_with_replies', limit=limit)
+        count += get_thread_index().record_feed_posts(response.feed)
+        cursor = response.cursor
+        if not cursor or not response.feed:
+            return count
 
 
 def bluesky_has_responded(thread_response):
+    if bluesky_has_responded_to(thread_response.thread.post.uri):
+        return True
     for reply in thread_response.thread.replies:
         if reply.post.author.handle == BLUESKY_HANDLE:
             return True
     return False
 
 
+def bluesky_has_responded_to(uri):
+    """Local lookup: has the bot already replied directly to the post `uri`?"""
+    return get_thread_index().has_responded(uri)
+
+
+def _create_completion(client, stream=False, on_tool_call=None, **request):
+    if stream:
+        return streaming.stream_completion(client, on_tool_call, **request)
+    return client.chat.completions.create(**request)
+
+
+async def _async_create_completion(client, stream=False, on_tool_call=None, **request):
+    if stream:
+        return await streaming.async_stream_completion(client, on_tool_call, **request)
+    return await client.chat.completions.create(**request)
+
+
+def _generate_routed(messages, tools, temperature, timeout, stream=False, on_tool_call=None):
+    """Try tiers from the one `model_router` picks upwards; see model_router.py."""
+    start_tier = model_router.choose_tier(messages, tools)
+    tiers = model_router.MODEL_TIERS[start_tier:]
+    # Low-confidence answers from tiers that fell back still cost tokens
+    spent = []
+    for i, tier in enumerate(tiers):
+        last = i == len(tiers) - 1
+        start = time.perf_counter()
+        try:
+            response = _create_completion(
+                get_openai_client(tier.base_url), stream, on_tool_call,
+                model=tier.model,
+                messages=messages,
+                temperature=temperature,
+                tools=tools,
+                timeout=timeout,
+            )
+        except Exception as e:
+            model_router.record(tier, time.perf_counter() - start, failed=True, fell_back=not last)
+            print(f"Error from {tier.name} model tier ({tier.model}): {e}")
+            if last:
+                raise
+            continue
+        fall_back = not last and model_router.low_confidence(response)
+        model_router.record(tier, time.perf_counter() - start, response, fell_back=fall_back)
+        if not fall_back:
+            return model_router.add_usage(response, spent)
+        spent.append(response)
+        print(f"Low-confidence answer from {tier.name} model tier, retrying on {tiers[i + 1].name}")
+
+
+async def _async_generate_routed(messages, tools, temperature, timeout, stream=False, on_tool_call=None):
+    """Async counterpart of `_generate_routed`."""
+    start_tier = model_router.choose_tier(messages, tools)
+    tiers = model_router.MODEL_TIERS[start_tier:]
+    # Low-confidence answers from tiers that fell back still cost tokens
+    spent = []
+    for i, tier in enumerate(tiers):
+        last = i == len(tiers) - 1
+        start = time.perf_counter()
+        try:
+            response = await _async_create_completion(
+                get_async_openai_client(tier.base_url), stream, on_tool_call,
+                model=tier.model,
+                messages=messages,
+                temperature=temperature,
+                tools=tools,
+                timeout=timeout,
+            )
+        except Exception as e:
+            model_router.record(tier, time.perf_counter() - start, failed=True, fell_back=not last)
+            print(f"Error from {tier.name} model tier ({tier.model}): {e}")
+            if last:
+                raise
+            continue
+        fall_back = not last and model_router.low_confidence(response)
+        model_router.record(tier, time.perf_counter() - start, response, fell_back=fall_back)
+        if not fall_back:
+            return model_router.add_usage(response, spent)
+        spent.append(response)
+        print(f"Low-confidence answer from {tier.name} model tier, retrying on {tiers[i + 1].name}")
+
+
 # Define a decorator to handle retrying on specific exceptions
 @retry(
     stop_max_attempt_number=3,
     wait_exponential_multiplier=100,
     wait_exponential_max=1000,
 )
-def generate_response(messages, tools=None, temperature=0.0, model="gpt-4o-mini"):
+def generate_response(messages, tools=None, temperature=0.0, model=None, timeout=None, stream=False,
+                      on_tool_call=None):
     """Generate a response using OpenAI API's Chat Completion feature.
 
     Args:
@@ -63,6 +453,13 @@ def generate_response(messages, tools=None, temperature=0.0, model="gpt-4o-mini"
             dict with `role` (system, assistant, user) and `content`.
         temperature (float, optional): Controls the randomness of the response. 
             Defaults to 0.5.
+        model (str, optional): Model to use. By default a model tier is picked
+            per request, see model_router.py.
+        stream (bool, optional): Stream the completion (see streaming.py). The
+            stream is dropped as soon as `</response>` closes, so the reply is
+            available before the model has finished generating.
+        on_tool_call (callable, optional): With `stream`, called with each tool
+            call as soon as its arguments are complete.
 
     Returns:
         str: The generated response from the chat model.
@@ -82,11 +479,16 @@ def generate_response(messages, tools=None, temperature=0.0, model="gpt-4o-mini"
         ]
     """
     try:
-        response = openai_client.chat.completions.create(
+        if model is None:
+            return _generate_routed(messages, tools, temperature, timeout, stream, on_tool_call)
+
+        response = _create_completion(
+            get_openai_client(), stream, on_tool_call,
             model=model,
             messages=messages,
             temperature=temperature,
             tools=tools,
+            timeout=timeout,
         )
 
         return response
@@ -98,3 +500,31 @@ def generate_response(messages, tools=None, temperature=0.0, model="gpt-4o-mini"
     except Exception as e:
         print(f"Unexpected error: {e}")
         raise
+
+
+async def async_generate_response(messages, tools=None, temperature=0.0, model=None, timeout=None, stream=False,
+                                  on_tool_call=None):
+    """Async counterpart of `generate_response` using the AsyncOpenAI client.
+
+    Retries with the same policy as `generate_response` (3 attempts, exponential
+    backoff from 100ms capped at 1s) since `retrying` cannot wrap coroutines.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            if model is None:
+                return await _async_generate_routed(messages, tools, temperature, timeout, stream, on_tool_call)
+            return await _async_create_completion(
+                get_async_openai_client(), stream, on_tool_call,
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                tools=tools,
+                timeout=timeout,
+            )
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            if attempt >= 3:
+                raise
+            await asyncio.sleep(min(0.1 * 2 ** attempt, 1.0))
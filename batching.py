@@ -0,0 +1,75 @@
+"""
+Coalescing of concurrent requests into batches.
+
+Several calls have a batched form upstream: `app.bsky.feed.get_posts` takes
+up to 25 URIs, and `completeTickets` takes any number of handles. A
+`Coalescer` parks each request for a short window and then hands everything
+collected in that window to one `run_batch` call.
+"""
+
+import asyncio
+
+
+class Coalescer:
+    """Collect requests for `window_sec` (or until `max_batch`) and run them together.
+
+    Subclasses implement `run_batch(items)`, returning one result per item in
+    order. If it raises, every request in the batch gets the exception.
+
+    Args:
+        window_sec (float): How long the first request in a batch waits for company.
+        max_batch (int): Run the batch immediately once this many requests are waiting.
+        dedupe (bool): Equal items waiting in the same batch share one slot and
+            one result, instead of each taking their own.
+    """
+
+    def __init__(self, window_sec, max_batch, dedupe=False):
+        self.window_sec = window_sec
+        self.max_batch = max_batch
+        self.dedupe = dedupe
+        # (item, future) in arrival order
+        self._pending = []
+        # item -> future for the pending batch, with `dedupe`
+        self._waiting = {}
+        self._flush_handle = None
+        # The event loop only holds weak references to tasks
+        self._tasks = set()
+
+    async def request(self, item):
+        """Add `item` to the next batch and return its result."""
+        future = self._waiting.get(item) if self.dedupe else None
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append((item, future))
+            if self.dedupe:
+                self._waiting[item] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.window_sec, self._flush)
+        return await future
+
+    async def run_batch(self, items: list) -> list:
+        raise NotImplementedError
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending, self._waiting = self._pending, [], {}
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,116 @@
+"""
+A small thread-safe LRU cache with per-entry expiry and hit/miss counters.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUTTLCache:
+    """Bounded cache evicting the least recently used entry once full.
+
+    Entries also expire `ttl_sec` seconds after they were set. An entry can
+    carry a `tag` (e.g. a thread root URI) so related entries can be dropped
+    together with `invalidate_tag`.
+
+    With `policy="lfu"` a full cache evicts the least frequently used entry
+    instead (ties go to the least recently used), which keeps a few popular
+    entries alive through bursts of one-off keys.
+    """
+
+    def __init__(self, max_size=1024, ttl_sec=300.0, clock=time.monotonic, policy="lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self.policy = policy
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, tag)
+        self._entries = OrderedDict()
+        self._tags = {}
+        # key -> number of hits, for the LFU policy
+        self._uses = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._uses[key] = self._uses.get(key, 0) + 1
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl_sec=None, tag=None):
+        ttl_sec = self.ttl_sec if ttl_sec is None else ttl_sec
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._clock() + ttl_sec, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(self._victim(exclude=key))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._remove(key)
+            return entry[0]
+
+    def invalidate_tag(self, tag) -> int:
+        """Drop every entry set with `tag`. Returns how many were dropped."""
+        with self._lock:
+            keys = self._tags.pop(tag, set())
+            for key in keys:
+                self._entries.pop(key, None)
+                self._uses.pop(key, None)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._uses.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _victim(self, exclude):
+        """Key to evict; never the entry that was just set."""
+        if self.policy == "lru":
+            return next(iter(self._entries))
+        # min() keeps the first of equal counts, i.e. the least recently used.
+        return min((k for k in self._entries if k != exclude), key=lambda k: self._uses.get(k, 0))
+
+    def _remove(self, key):
+        self._uses.pop(key, None)
+        _, _, tag = self._entries.pop(key)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
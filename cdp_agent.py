@@ -1,13 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
 import os
 from cdp import Cdp, Wallet, WalletData
 import json
+import time
+from cache import LRUTTLCache
 from cdp_agentkit_core.actions import CDP_ACTIONS
+from tool_specs import get_tool_specs
 
 # Configure a file to persist the agent's CDP MPC Wallet Data.
 WALLET_DATA_FILE = "wallet_data.txt"
 
-def init_agent(network_id='base-sepolia'):
+# Tool dispatch by name instead of scanning CDP_ACTIONS per call.
+ACTIONS_BY_NAME = {action.name: action for action in CDP_ACTIONS}
+
+# Tools without side effects, safe to run concurrently within one turn.
+READ_ONLY_TOOLS = frozenset({"get_balance", "get_wallet_details", "get_valid_ticket"})
+# Per-tool deadlines for read-only calls, in seconds
+DEFAULT_TOOL_TIMEOUT_SEC = 30
+TOOL_TIMEOUTS_SEC = {
+    "get_wallet_details": 15,
+    "get_balance": 20,
+    "get_valid_ticket": 20,
+}
+TOOL_WORKERS = 8
+_tool_executor = None
+
+# Named sets of tools the model may see and call. Only the profile's schemas
+# are sent with each request, and calls outside it are rejected before
+# dispatch. None allows every action.
+TOOL_PROFILES = {
+    "public_read_only": READ_ONLY_TOOLS,
+    "full": None,
+}
+DEFAULT_TOOL_PROFILE = "public_read_only"
+
+# Results of read-only tools, keyed by tool, network and validated arguments
+# and tagged with the wallet id. Any write transaction from the wallet drops
+# that wallet's entries, see `invalidate_tool_results`.
+TOOL_CACHE_SIZE = 256
+TOOL_CACHE_TTL_SEC = 15
+tool_result_cache = LRUTTLCache(max_size=TOOL_CACHE_SIZE, ttl_sec=TOOL_CACHE_TTL_SEC)
+
+def init_agent(network_id='base-sepolia', tool_profile=DEFAULT_TOOL_PROFILE):
   load_dotenv()
   Cdp.configure(
       api_key_name=os.environ["CDP_API_KEY_NAME"],
@@ -26,56 +61,122 @@ def init_agent(network_id='base-sepolia'):
     wallet = Wallet.create(network_id=network_id)
   values["wallet"] = wallet
 
-  tools = []
-
-  for action in CDP_ACTIONS:
-      # Extract function specifications
-      action_name = action.name
-      action_description = action.description.strip()
-      action_args_schema = action.args_schema.model_json_schema()
-      action_args_schema["strict"] = True
-
-      # Create the tool specification
-      tool = {
-          "type": "function",
-          "function": {
-              "name": action_name,
-              "description": action_description,
-              "parameters": action_args_schema
-          }
-      }
-      
-      # Append to the tools list
-      tools.append(tool)
-
-  # Print or use the tools list
-  print(json.dumps(tools, indent=4))
-  values["tools"] = tools
+  # Tool specs are built once and cached on disk, see tool_specs.py
+  allowed_tools = TOOL_PROFILES[tool_profile]
+  tool_specs = get_tool_specs(CDP_ACTIONS).select(allowed_tools)
+  values["tool_profile"] = tool_profile
+  values["allowed_tools"] = allowed_tools
+  values["tool_specs"] = tool_specs
+  values["tools"] = list(tool_specs.tools)
+  print(f"Tool profile '{tool_profile}': {', '.join(tool['function']['name'] for tool in tool_specs.tools)}")
   return values
 
-def process_tool_calls(wallet, Cdp, response):
+def run_tool(action, wallet, Cdp, arguments: str) -> str:
+    """Validate a tool call's raw JSON arguments and run the action.
+
+    Read-only tools are served from `tool_result_cache` when possible.
+    """
+    validated_args = action.args_schema.model_validate_json(arguments or "{}")
+    print(f"Validated args: {validated_args}")
+    kwargs = validated_args.model_dump()
+    if action.name not in READ_ONLY_TOOLS:
+        return action.func(wallet, Cdp, **kwargs)
+
+    key = (action.name, wallet.network_id, json.dumps(kwargs, sort_keys=True, default=str))
+    result = tool_result_cache.get(key)
+    if result is None:
+        result = action.func(wallet, Cdp, **kwargs)
+        # Actions report failures as strings; only cache real answers.
+        if not result.startswith(("Error", "Contract error")):
+            tool_result_cache.set(key, result, tag=wallet.id)
+    return result
+
+def run_read_only_tool(wallet, Cdp, tool_name: str, arguments: str) -> str:
+    """Run one read-only tool outside a model turn (memoized like `run_tool`)."""
+    if tool_name not in READ_ONLY_TOOLS:
+        raise ValueError(f"Tool '{tool_name}' is not read-only")
+    return run_tool(ACTIONS_BY_NAME[tool_name], wallet, Cdp, arguments)
+
+def invalidate_tool_results(wallet) -> int:
+    """Drop cached read-only results for `wallet` after it sent a transaction."""
+    return tool_result_cache.invalidate_tag(wallet.id)
+
+def tool_cache_stats() -> dict:
+    return tool_result_cache.stats()
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    global _tool_executor
+    if _tool_executor is None:
+        _tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+    return _tool_executor
+
+def start_tool_call(wallet, Cdp, tool_call):
+    """Submit a read-only tool call to the pool before its message is complete
+    (e.g. while the rest of a streamed completion arrives). Pass the returned
+    handle to `process_tool_calls` via `started`."""
+    tool_name = tool_call.function.name
+    if tool_name not in READ_ONLY_TOOLS:
+        raise ValueError(f"Tool '{tool_name}' is not read-only")
+    timeout = TOOL_TIMEOUTS_SEC.get(tool_name, DEFAULT_TOOL_TIMEOUT_SEC)
+    future = get_tool_executor().submit(run_tool, ACTIONS_BY_NAME[tool_name], wallet, Cdp, tool_call.function.arguments)
+    return future, time.monotonic() + timeout, timeout
+
+def process_tool_calls(wallet, Cdp, response, allowed_tools=None, started=None):
+    """Run the tool calls of one assistant message.
+
+    Read-only tools run concurrently in a thread pool, each with its own
+    deadline (TOOL_TIMEOUTS_SEC). Tools with side effects run one at a time
+    in the order they were called, and read-only calls that come after one
+    start once it has finished. Results are returned in tool call order.
+
+    Calls to tools outside `allowed_tools` (if given) are rejected without
+    running anything. `started` maps tool call ids to handles from
+    `start_tool_call` for calls that are already running.
+    """
     tool_calls = response.tool_calls
 
-    results = []
+    results = [None] * len(tool_calls)
+    pending = []
 
-    for tool_call in tool_calls:
+    for i, tool_call in enumerate(tool_calls):
         tool_name = tool_call.function.name
-        arguments = json.loads(tool_call.function.arguments)
-
-        # Find the action in CDP_ACTIONS
-        for action in CDP_ACTIONS:
-            if action.name == tool_name:
-                try:
-                    # Validate and call the function
-                    validated_args = action.args_schema(**arguments)
-                    print(f"Validated args: {validated_args}")
-                    result = action.func(wallet, Cdp, **validated_args.dict())
-                    results.append({"id": tool_call.id, "result": result})
-                except Exception as e:
-                    results.append({"id": tool_call.id, "error": str(e)})
-                break
-        else:
+        action = ACTIONS_BY_NAME.get(tool_name)
+        if action is None:
             # Handle case where the tool is not found
-            results.append({"id": tool_call.id, "error": f"Tool '{tool_name}' not found"})
+            results[i] = {"id": tool_call.id, "error": f"Tool '{tool_name}' not found"}
+            continue
+        if allowed_tools is not None and tool_name not in allowed_tools:
+            print(f"Rejected call to disallowed tool '{tool_name}'")
+            results[i] = {"id": tool_call.id, "error": f"Tool '{tool_name}' is not allowed"}
+            continue
+
+        if started and tool_call.id in started:
+            pending.append((i, tool_call, *started[tool_call.id]))
+            continue
+        if tool_name in READ_ONLY_TOOLS:
+            timeout = TOOL_TIMEOUTS_SEC.get(tool_name, DEFAULT_TOOL_TIMEOUT_SEC)
+            future = get_tool_executor().submit(run_tool, action, wallet, Cdp, tool_call.function.arguments)
+            pending.append((i, tool_call, future, time.monotonic() + timeout, timeout))
+            continue
+
+        try:
+            result = run_tool(action, wallet, Cdp, tool_call.function.arguments)
+            results[i] = {"id": tool_call.id, "result": result}
+        except Exception as e:
+            results[i] = {"id": tool_call.id, "error": str(e)}
+        finally:
+            invalidate_tool_results(wallet)
+
+    for i, tool_call, future, deadline, timeout in pending:
+        try:
+            result = future.result(timeout=max(deadline - time.monotonic(), 0))
+            results[i] = {"id": tool_call.id, "result": result}
+        except FutureTimeoutError:
+            # The worker thread can't be interrupted; its result is dropped.
+            future.cancel()
+            results[i] = {"id": tool_call.id,
+                          "error": f"Tool '{tool_call.function.name}' timed out after {timeout}s"}
+        except Exception as e:
+            results[i] = {"id": tool_call.id, "error": str(e)}
 
-    return results
\ No newline at end of file
+    return results
@@ -1,30 +1,38 @@
+import importlib
+
 from cdp_agentkit_core.actions.cdp_action import CdpAction
-from cdp_agentkit_core.actions.deploy_nft import DeployNftAction
-from cdp_agentkit_core.actions.deploy_token import DeployTokenAction
-from cdp_agentkit_core.actions.get_balance import GetBalanceAction
-from cdp_agentkit_core.actions.get_wallet_details import GetWalletDetailsAction
-from cdp_agentkit_core.actions.mint_nft import MintNftAction
-from cdp_agentkit_core.actions.register_basename import RegisterBasenameAction
-from cdp_agentkit_core.actions.request_faucet_funds import RequestFaucetFundsAction
-from cdp_agentkit_core.actions.trade import TradeAction
-from cdp_agentkit_core.actions.transfer import TransferAction
-from cdp_agentkit_core.actions.wow.buy_token import WowBuyTokenAction
-from cdp_agentkit_core.actions.wow.create_token import WowCreateTokenAction
-from cdp_agentkit_core.actions.wow.sell_token import WowSellTokenAction
-from cdp_agentkit_core.actions.get_valid_ticket import GetValidTicketAction
-
-# WARNING: All new CdpAction subclasses must be imported above, otherwise they will not be discovered
-# by get_all_cdp_actions(). The import ensures the class is registered as a subclass of CdpAction.
-def get_all_cdp_actions() -> list[type[CdpAction]]:
-    """Retrieve all subclasses of CdpAction defined in the package."""
+from cdp_agentkit_core.actions.registry import ACTION_REGISTRY, ActionEntry, LazyAction
+
+# WARNING: All new CdpAction subclasses must be listed in ACTION_REGISTRY
+# (registry.py), otherwise they will not be discovered by get_all_cdp_actions().
+# Action modules are imported on first use, not here, so importing this
+# package stays cheap.
+def get_all_cdp_actions() -> list[LazyAction]:
+    """Retrieve all registered actions, each loading its implementation on first use."""
     actions = []
-    for action in CdpAction.__subclasses__():
-        actions.append(action())
+    for entry in ACTION_REGISTRY:
+        actions.append(LazyAction(entry))
     return actions
 
 
+def load_all_cdp_actions() -> list[CdpAction]:
+    """Import every registered action now (the old eager behaviour)."""
+    return [action.load() for action in CDP_ACTIONS]
+
+
 CDP_ACTIONS = get_all_cdp_actions()
 
+_ACTION_CLASSES = {entry.class_name: entry.module for entry in ACTION_REGISTRY}
+
+
+def __getattr__(name):
+    # `from cdp_agentkit_core.actions import GetBalanceAction` keeps working,
+    # importing only that action's module.
+    if name in _ACTION_CLASSES:
+        return getattr(importlib.import_module(_ACTION_CLASSES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
     "CdpAction",
     "GetWalletDetailsAction",
@@ -40,5 +48,8 @@ __all__ = [
     "WowBuyTokenAction",
     "WowSellTokenAction",
     "GetValidTicketAction",
+    "ActionEntry",
+    "LazyAction",
+    "ACTION_REGISTRY",
     "CDP_ACTIONS",
 ]
@@ -6,22 +6,13 @@ from web3 import Web3
 from web3.exceptions import ContractLogicError
 
 from cdp_agentkit_core.actions import CdpAction
+from cdp_agentkit_core.actions.ticket_system import (
+    complete_ticket_abis, complete_ticket_args, ticket_system_address, ticket_system_version,
+)
 
 # Constants
-TICKET_SYSTEM_ADDRESS_TESTNET = "0xF0c37a5E8a46a6ED670F239f3be8ad81e0cbeeA5"
 COMPLETE_TICKET_PROMPT = "Complete a ticket in the ticket system contract."
 
-# ABIs for smart contracts
-ticket_abi = [
-    {
-        "inputs": [{"internalType": "string", "name": "bskyHandle", "type": "string"}],
-        "name": "completeTicket",
-        "outputs": [],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    }
-]
-
 class CompleteTicketInput(BaseModel):
     """Input argument schema for completing a ticket."""
     bsky_handle: str = Field(..., description="The Bluesky handle associated with the ticket to complete")
@@ -38,11 +29,13 @@ def complete_ticket(wallet: Wallet, cdp: Cdp, bsky_handle: str) -> str:
         str: Success message or error message
     """
     try:
+        # V1 takes the handle, V2 its hash (a different selector)
+        version = ticket_system_version()
         wallet.invoke_contract(
-            contract_address=TICKET_SYSTEM_ADDRESS_TESTNET,
+            contract_address=ticket_system_address(),
             method="completeTicket",
-            args={"bskyHandle": bsky_handle},
-            abi=ticket_abi,
+            args=complete_contract_method_args(bsky_handle, version),
+            abi=complete_ticket_abis[version],
         )
         
         return f"Successfully completed ticket for {bsky_handle}"
@@ -58,15 +51,14 @@ class CompleteTicketAction(CdpAction):
     args_schema: type[BaseModel] | None = CompleteTicketInput
     func: Callable[..., str] = complete_ticket
 
-def complete_contract_method_args(bsky_handle: str) -> dict:
+def complete_contract_method_args(bsky_handle: str, version: int = 1) -> dict:
     """Create arguments for completing a ticket.
 
     Args:
         bsky_handle (str): The Bluesky handle associated with the ticket to complete
+        version (int): Ticket system contract version
 
     Returns:
         dict: Formatted arguments for the ticket contract method
     """
-    return {
-        "bskyHandle": bsky_handle
-    }
+    return complete_ticket_args(bsky_handle, version)
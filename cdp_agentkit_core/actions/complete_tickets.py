@@ -0,0 +1,131 @@
+from collections import Counter
+from collections.abc import Callable
+
+from cdp import Wallet, Cdp
+from pydantic import BaseModel, Field
+from web3 import Web3
+from web3.exceptions import ContractLogicError
+
+from cdp_agentkit_core.actions import CdpAction
+from cdp_agentkit_core.actions.ticket_system import ticket_system_address
+
+# Constants
+COMPLETE_TICKETS_PROMPT = "Complete one ticket for each of several Bluesky handles in a single transaction."
+# Emitted once per ticket completeTickets actually completed
+TICKET_COMPLETED_BY_HASH_TOPIC = bytes(Web3.keccak(text="TicketCompletedByHash(bytes32)"))
+
+# ABIs for smart contracts
+ticket_abi = [
+    {
+        "inputs": [{"internalType": "bytes32[]", "name": "handleHashes", "type": "bytes32[]"}],
+        "name": "completeTickets",
+        "outputs": [{"internalType": "uint256", "name": "completed", "type": "uint256"}],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    }
+]
+
+class CompleteTicketsInput(BaseModel):
+    """Input argument schema for completing a batch of tickets."""
+    bsky_handles: list[str] = Field(..., description="The Bluesky handles to complete one ticket for each")
+
+def complete_tickets(wallet: Wallet, cdp: Cdp, bsky_handles: list[str]) -> str:
+    """Complete a batch of tickets in the ticket system contract.
+
+    Handles are hashed off chain, so the contract gets fixed-size `bytes32`
+    calldata and skips hashing. A handle listed twice completes two tickets.
+
+    Args:
+        wallet (Wallet): The wallet to complete the tickets with
+        cdp (Cdp): CDP instance
+        bsky_handles (list[str]): The Bluesky handles to complete one ticket for each
+
+    Returns:
+        str: Success message or error message
+    """
+    try:
+        invocation = invoke_complete_tickets(wallet, bsky_handles)
+        return f"Successfully submitted {len(bsky_handles)} ticket completions. Transaction link: {invocation.transaction_link}"
+    except ContractLogicError as e:
+        return f"Contract error during batch ticket completion: {e!s}"
+    except Exception as e:
+        return f"Error completing tickets: {e!s}"
+
+def complete_tickets_each(wallet: Wallet, cdp: Cdp, web3: Web3, bsky_handles: list[str]) -> list[str]:
+    """Complete a batch of tickets and report the outcome for each handle.
+
+    `completeTickets` skips handles without an available ticket instead of
+    reverting, so which handles were completed is read from the
+    `TicketCompletedByHash` logs in the transaction receipt.
+
+    Args:
+        wallet (Wallet): The wallet to complete the tickets with
+        cdp (Cdp): CDP instance
+        web3 (Web3): Connection to the network, used to fetch the receipt
+        bsky_handles (list[str]): The Bluesky handles to complete one ticket for each
+
+    Returns:
+        list[str]: A success or error message per handle, in order
+    """
+    try:
+        invocation = invoke_complete_tickets(wallet, bsky_handles)
+        receipt = web3.eth.wait_for_transaction_receipt(invocation.transaction_hash)
+        completed = completed_handles(receipt, bsky_handles)
+    except ContractLogicError as e:
+        return [f"Contract error during batch ticket completion: {e!s}"] * len(bsky_handles)
+    except Exception as e:
+        return [f"Error completing tickets: {e!s}"] * len(bsky_handles)
+    return [
+        f"Successfully completed ticket for {bsky_handle}. Transaction link: {invocation.transaction_link}"
+        if done else
+        f"No ticket available for {bsky_handle}, skipped in batch. Transaction link: {invocation.transaction_link}"
+        for bsky_handle, done in zip(bsky_handles, completed)
+    ]
+
+def invoke_complete_tickets(wallet: Wallet, bsky_handles: list[str]):
+    """Send `completeTickets` for the handles and wait for it to be mined."""
+    invocation = wallet.invoke_contract(
+        contract_address=ticket_system_address(),
+        method="completeTickets",
+        args=complete_tickets_contract_method_args(bsky_handles),
+        abi=ticket_abi,
+    )
+    invocation.wait()
+    return invocation
+
+def completed_handles(receipt, bsky_handles: list[str]) -> list[bool]:
+    """Which of `bsky_handles` a `completeTickets` receipt completed a ticket for.
+
+    A handle listed twice is matched against as many completion logs.
+    """
+    contract_address = ticket_system_address()
+    remaining = Counter(
+        bytes(log["topics"][1]) for log in receipt["logs"]
+        if Web3.to_checksum_address(log["address"]) == contract_address
+        and log["topics"] and bytes(log["topics"][0]) == TICKET_COMPLETED_BY_HASH_TOPIC)
+    completed = []
+    for bsky_handle in bsky_handles:
+        key = bytes(Web3.keccak(text=bsky_handle))
+        completed.append(remaining[key] > 0)
+        remaining[key] -= 1
+    return completed
+
+class CompleteTicketsAction(CdpAction):
+    """Complete a batch of tickets in the Ticket System action."""
+    name: str = "complete_tickets"
+    description: str = COMPLETE_TICKETS_PROMPT
+    args_schema: type[BaseModel] | None = CompleteTicketsInput
+    func: Callable[..., str] = complete_tickets
+
+def complete_tickets_contract_method_args(bsky_handles: list[str]) -> dict:
+    """Create arguments for completing a batch of tickets.
+
+    Args:
+        bsky_handles (list[str]): The Bluesky handles to complete one ticket for each
+
+    Returns:
+        dict: Formatted arguments for the ticket contract method
+    """
+    return {
+        "handleHashes": [Web3.keccak(text=bsky_handle).to_0x_hex() for bsky_handle in bsky_handles]
+    }
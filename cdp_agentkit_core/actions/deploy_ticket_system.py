@@ -0,0 +1,156 @@
+from collections.abc import Callable
+import json
+import os
+
+from cdp import Wallet, Cdp
+from pydantic import BaseModel, Field
+from web3 import Web3
+from web3.exceptions import ContractLogicError
+
+from cdp_agentkit_core.actions import CdpAction
+
+# Constants
+DEFAULT_RPC_URL = "https://sepolia.base.org"
+# Build output of compile_contracts.py at the repository root
+TICKET_SYSTEM_V2_ARTIFACT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "contracts", "build", "TicketSystemV2.json")
+# Balances imported per migrate transaction
+MIGRATION_CHUNK_SIZE = 100
+DEPLOY_TICKET_SYSTEM_PROMPT = "Deploy the gas-optimized TicketSystemV2 contract, owned by the wallet's default address."
+
+# ABIs for smart contracts
+ticket_abi = [
+    {
+        "inputs": [
+            {"internalType": "bytes32[]", "name": "handleHashes", "type": "bytes32[]"},
+            {"internalType": "uint128[]", "name": "fundedCounts", "type": "uint128[]"},
+            {"internalType": "uint128[]", "name": "completedCounts", "type": "uint128[]"}
+        ],
+        "name": "migrate",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "finalizeMigration",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    }
+]
+
+class DeployTicketSystemInput(BaseModel):
+    """Input argument schema for deploying TicketSystemV2."""
+    rpc_url: str = Field(DEFAULT_RPC_URL, description="JSON-RPC endpoint of the network to deploy to")
+
+def load_artifact(path: str = TICKET_SYSTEM_V2_ARTIFACT) -> dict:
+    """Load the compiled TicketSystemV2 ABI and bytecode.
+
+    Args:
+        path (str): Path to the artifact written by compile_contracts.py
+
+    Returns:
+        dict: The artifact with `abi` and `bin` keys
+    """
+    with open(path) as f:
+        return json.load(f)
+
+def deploy_ticket_system(wallet: Wallet, cdp: Cdp, rpc_url: str = DEFAULT_RPC_URL) -> str:
+    """Deploy TicketSystemV2 owned by the wallet's default address.
+
+    The CDP SDK can only deploy its built-in token and NFT templates, so the
+    deployment transaction is signed with the default address's local key and
+    sent through `rpc_url`. Ticket sales stay closed until
+    `migrate_ticket_system` finalizes the migration.
+
+    Args:
+        wallet (Wallet): The wallet to deploy from; it must hold its keys locally
+        cdp (Cdp): CDP instance
+        rpc_url (str): JSON-RPC endpoint of the network to deploy to
+
+    Returns:
+        str: Message with the deployed contract address or an error message
+    """
+    try:
+        key = wallet.default_address.key
+        if key is None:
+            return "Error deploying ticket system: the wallet's default address cannot sign locally"
+
+        artifact = load_artifact()
+        web3 = Web3(Web3.HTTPProvider(rpc_url))
+        contract = web3.eth.contract(abi=artifact["abi"], bytecode=artifact["bin"])
+        transaction = contract.constructor(key.address).build_transaction({
+            "from": key.address,
+            "nonce": web3.eth.get_transaction_count(key.address),
+            "chainId": web3.eth.chain_id,
+        })
+        signed = key.sign_transaction(transaction)
+        tx_hash = web3.eth.send_raw_transaction(signed.raw_transaction)
+        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+
+        return f"Deployed TicketSystemV2 at {receipt.contractAddress} (transaction {tx_hash.to_0x_hex()})"
+    except FileNotFoundError:
+        return "Error deploying ticket system: contract artifact not found, run compile_contracts.py first"
+    except Exception as e:
+        return f"Error deploying ticket system: {e!s}"
+
+def migrate_ticket_system(wallet: Wallet, cdp: Cdp, contract_address: str, balances: list, finalize: bool = True) -> str:
+    """Import ticket balances into a TicketSystemV2 deployment.
+
+    Args:
+        wallet (Wallet): The owner wallet of the V2 contract
+        cdp (Cdp): CDP instance
+        contract_address (str): Address of the V2 contract
+        balances (list): `(handle_hash, funded, completed)` tuples, with
+            `handle_hash` the hex keccak256 of the handle (e.g. from the ticket index)
+        finalize (bool): Open ticket sales once every balance has been imported
+
+    Returns:
+        str: Success message or error message
+    """
+    try:
+        for start in range(0, len(balances), MIGRATION_CHUNK_SIZE):
+            wallet.invoke_contract(
+                contract_address=contract_address,
+                method="migrate",
+                args=migrate_contract_method_args(balances[start:start + MIGRATION_CHUNK_SIZE]),
+                abi=ticket_abi,
+            ).wait()
+
+        if finalize:
+            wallet.invoke_contract(
+                contract_address=contract_address,
+                method="finalizeMigration",
+                args={},
+                abi=ticket_abi,
+            ).wait()
+
+        return f"Successfully migrated {len(balances)} ticket balances to {contract_address}"
+    except ContractLogicError as e:
+        return f"Contract error during ticket migration: {e!s}"
+    except Exception as e:
+        return f"Error migrating tickets: {e!s}"
+
+class DeployTicketSystemAction(CdpAction):
+    """Deploy the TicketSystemV2 contract action."""
+    name: str = "deploy_ticket_system"
+    description: str = DEPLOY_TICKET_SYSTEM_PROMPT
+    args_schema: type[BaseModel] | None = DeployTicketSystemInput
+    func: Callable[..., str] = deploy_ticket_system
+
+def migrate_contract_method_args(balances: list) -> dict:
+    """Create arguments for one migrate call.
+
+    Args:
+        balances (list): `(handle_hash, funded, completed)` tuples
+
+    Returns:
+        dict: Formatted arguments for the ticket contract method
+    """
+    return {
+        "handleHashes": [handle_hash if handle_hash.startswith("0x") else f"0x{handle_hash}"
+                         for handle_hash, _, _ in balances],
+        "fundedCounts": [str(funded) for _, funded, _ in balances],
+        "completedCounts": [str(completed) for _, _, completed in balances],
+    }
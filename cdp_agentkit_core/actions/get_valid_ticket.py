@@ -7,9 +7,9 @@ from web3.exceptions import ContractLogicError
 import json
 
 from cdp_agentkit_core.actions import CdpAction
+from cdp_agentkit_core.actions.ticket_system import ticket_system_address
 
 # Constants
-TICKET_SYSTEM_ADDRESS_TESTNET = "0xF0c37a5E8a46a6ED670F239f3be8ad81e0cbeeA5"
 GET_VALID_TICKET_PROMPT = "Check how many tickets a Bluesky handle (e.g., 'alice.bsky.social') has in the ticket system. This is needed before we will chat with a user."
 
 # ABIs for smart contracts
@@ -48,7 +48,7 @@ def get_valid_ticket(wallet: Wallet, Cdp: Cdp, bsky_handle: str) -> str:
             method="getTicketInfo")
         result = Cdp.api_clients.smart_contracts.read_contract(
             wallet.network_id,
-            TICKET_SYSTEM_ADDRESS_TESTNET,
+            ticket_system_address(),
             request)
         
         # Looks like:
@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+import importlib
+import importlib.util
+
+
+@dataclass(frozen=True)
+class ActionEntry:
+    """Where a CdpAction is implemented, without importing it."""
+
+    name: str
+    module: str
+    class_name: str
+
+
+# Every action offered to the model, in the order they are offered. Adding an
+# action means adding an entry here; its module is only imported once the
+# action is actually used.
+ACTION_REGISTRY = (
+    ActionEntry("deploy_nft", "cdp_agentkit_core.actions.deploy_nft", "DeployNftAction"),
+    ActionEntry("deploy_token", "cdp_agentkit_core.actions.deploy_token", "DeployTokenAction"),
+    ActionEntry("get_balance", "cdp_agentkit_core.actions.get_balance", "GetBalanceAction"),
+    ActionEntry("get_wallet_details", "cdp_agentkit_core.actions.get_wallet_details", "GetWalletDetailsAction"),
+    ActionEntry("mint_nft", "cdp_agentkit_core.actions.mint_nft", "MintNftAction"),
+    ActionEntry("register_basename", "cdp_agentkit_core.actions.register_basename", "RegisterBasenameAction"),
+    ActionEntry("request_faucet_funds", "cdp_agentkit_core.actions.request_faucet_funds", "RequestFaucetFundsAction"),
+    ActionEntry("trade", "cdp_agentkit_core.actions.trade", "TradeAction"),
+    ActionEntry("transfer", "cdp_agentkit_core.actions.transfer", "TransferAction"),
+    ActionEntry("wow_buy_token", "cdp_agentkit_core.actions.wow.buy_token", "WowBuyTokenAction"),
+    ActionEntry("wow_create_token", "cdp_agentkit_core.actions.wow.create_token", "WowCreateTokenAction"),
+    ActionEntry("wow_sell_token", "cdp_agentkit_core.actions.wow.sell_token", "WowSellTokenAction"),
+    ActionEntry("get_valid_ticket", "cdp_agentkit_core.actions.get_valid_ticket", "GetValidTicketAction"),
+)
+
+
+class LazyAction:
+    """Stand-in for a CdpAction that imports its implementation on first use.
+
+    `name` and `source_file` are known up front. `description`,
+    `args_schema` and `func` load the action module the first time one of
+    them is read.
+    """
+
+    def __init__(self, entry: ActionEntry):
+        self.entry = entry
+        self.name = entry.name
+        self._action = None
+
+    @property
+    def source_file(self) -> str:
+        """Path of the implementation module, found without importing it."""
+        return importlib.util.find_spec(self.entry.module).origin
+
+    @property
+    def loaded(self) -> bool:
+        return self._action is not None
+
+    def load(self):
+        """Import the implementation and return the real CdpAction instance."""
+        if self._action is None:
+            module = importlib.import_module(self.entry.module)
+            self._action = getattr(module, self.entry.class_name)()
+        return self._action
+
+    @property
+    def description(self) -> str:
+        return self.load().description
+
+    @property
+    def args_schema(self):
+        return self.load().args_schema
+
+    @property
+    def func(self):
+        return self.load().func
+
+    def __repr__(self) -> str:
+        return f"LazyAction({self.name!r}, loaded={self.loaded})"
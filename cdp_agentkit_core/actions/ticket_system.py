@@ -0,0 +1,74 @@
+"""
+The ticket system contract the bot works against.
+
+`TICKET_SYSTEM_ADDRESS` and `TICKET_SYSTEM_VERSION` (1 for TicketSystem in
+contracts/TicketContract.sol, 2 for TicketSystemV2) select it; both default
+to the original TicketSystem deployment. After `migrate_ticket_system.py`
+has run, point them at the new contract:
+
+    TICKET_SYSTEM_ADDRESS=0x... TICKET_SYSTEM_VERSION=2
+
+The two versions share `buyTickets(string,uint256)`, `getTicketInfo(string)`
+and `withdraw()`, but V1's `completeTicket` takes the handle string and V2's
+its keccak256 hash. Only V2 has the batched `completeTickets(bytes32[])`; the
+deployed V1 contract completes one ticket per transaction.
+"""
+
+import os
+
+from web3 import Web3
+
+# The original TicketSystem deployment on Base Sepolia
+TICKET_SYSTEM_ADDRESS_TESTNET = "0xF0c37a5E8a46a6ED670F239f3be8ad81e0cbeeA5"
+TICKET_SYSTEM_VERSIONS = (1, 2)
+
+complete_ticket_abis = {
+    1: [
+        {
+            "inputs": [{"internalType": "string", "name": "bskyHandle", "type": "string"}],
+            "name": "completeTicket",
+            "outputs": [],
+            "stateMutability": "nonpayable",
+            "type": "function"
+        }
+    ],
+    2: [
+        {
+            "inputs": [{"internalType": "bytes32", "name": "handleHash", "type": "bytes32"}],
+            "name": "completeTicket",
+            "outputs": [],
+            "stateMutability": "nonpayable",
+            "type": "function"
+        }
+    ],
+}
+
+
+def ticket_system_address() -> str:
+    """Address of the configured ticket system contract."""
+    return Web3.to_checksum_address(os.environ.get("TICKET_SYSTEM_ADDRESS") or TICKET_SYSTEM_ADDRESS_TESTNET)
+
+
+def ticket_system_version() -> int:
+    """Version (1 or 2) of the configured ticket system contract."""
+    version = int(os.environ.get("TICKET_SYSTEM_VERSION") or 1)
+    if version not in TICKET_SYSTEM_VERSIONS:
+        raise ValueError(f"Unsupported TICKET_SYSTEM_VERSION {version}")
+    return version
+
+
+def supports_batch_completion() -> bool:
+    """Whether the configured contract has `completeTickets`."""
+    return ticket_system_version() >= 2
+
+
+def complete_ticket_args(bsky_handle: str, version: int) -> dict:
+    """Arguments for `completeTicket` on the given contract version."""
+    if version == 1:
+        return {"bskyHandle": bsky_handle}
+    return {"handleHash": Web3.keccak(text=bsky_handle).to_0x_hex()}
+
+
+def buy_tickets_url() -> str:
+    """Basescan page for buying tickets on the configured contract."""
+    return f"https://sepolia.basescan.org/address/{ticket_system_address().lower()}#writeContract#F1"
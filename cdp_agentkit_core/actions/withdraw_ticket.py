@@ -6,9 +6,9 @@ from web3 import Web3
 from web3.exceptions import ContractLogicError
 
 from cdp_agentkit_core.actions import CdpAction
+from cdp_agentkit_core.actions.ticket_system import ticket_system_address
 
 # Constants
-TICKET_SYSTEM_ADDRESS_TESTNET = "0xF0c37a5E8a46a6ED670F239f3be8ad81e0cbeeA5"
 WITHDRAW_TICKET_PROMPT = "Withdraw accumulated funds from the ticket system contract."
 
 # ABIs for smart contracts
@@ -39,7 +39,7 @@ def withdraw_ticket(wallet: Wallet, Cdp: Cdp) -> str:
     try:
         # Call the withdraw function
         wallet.invoke_contract(
-            contract_address=TICKET_SYSTEM_ADDRESS_TESTNET,
+            contract_address=ticket_system_address(),
             method="withdraw",
             args=[],
             abi=ticket_abi,
@@ -0,0 +1,78 @@
+"""
+Compile the Solidity contracts in contracts/ into contracts/build/<Contract>.json
+artifacts (ABI and bytecode) used by the deploy and benchmark scripts.
+
+Needs the optional dev dependency `py-solc-x`:
+
+    pip install py-solc-x
+    python compile_contracts.py
+
+py-solc-x downloads solc SOLC_VERSION on first use. Offline, point
+`SOLC_BINARY` at a local solc of that version instead (or put it on PATH):
+
+    SOLC_BINARY=/usr/local/bin/solc python compile_contracts.py
+"""
+
+import json
+import os
+
+SOLC_VERSION = "0.8.20"
+CONTRACTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "contracts")
+BUILD_DIR = os.path.join(CONTRACTS_DIR, "build")
+
+# Source file -> contract name
+CONTRACTS = {
+    "TicketContract.sol": "TicketSystem",
+    "TicketSystemV2.sol": "TicketSystemV2",
+}
+
+
+def solc_source(solcx) -> dict:
+    """`compile_files` arguments selecting SOLC_BINARY, a solc on PATH or a
+    py-solc-x install of SOLC_VERSION, in that order."""
+    binary = os.environ.get("SOLC_BINARY")
+    if binary:
+        return {"solc_binary": binary}
+    try:
+        solcx.import_installed_solc()
+    except Exception:
+        pass
+    if SOLC_VERSION not in {str(version) for version in solcx.get_installed_solc_versions()}:
+        try:
+            solcx.install_solc(SOLC_VERSION)
+        except Exception as e:
+            raise SystemExit(f"Could not download solc {SOLC_VERSION} ({e}). Set SOLC_BINARY to a local solc.")
+    return {"solc_version": SOLC_VERSION}
+
+
+def compile_contract(file_name: str, contract_name: str) -> dict:
+    """Compile a contract from contracts/ and return its `abi` and `bin`."""
+    try:
+        import solcx
+    except ImportError as e:
+        raise SystemExit(f"{e}. Install py-solc-x to compile the contracts.")
+
+    compiled = solcx.compile_files(
+        [os.path.join(CONTRACTS_DIR, file_name)],
+        output_values=["abi", "bin"],
+        optimize=True,
+        **solc_source(solcx),
+    )
+    for key, value in compiled.items():
+        if key.endswith(f":{contract_name}"):
+            return {"abi": value["abi"], "bin": value["bin"]}
+    raise KeyError(contract_name)
+
+
+def main() -> None:
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    for file_name, contract_name in CONTRACTS.items():
+        artifact = compile_contract(file_name, contract_name)
+        path = os.path.join(BUILD_DIR, f"{contract_name}.json")
+        with open(path, "w") as f:
+            json.dump(artifact, f)
+        print(f"Wrote {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Token-aware packing of thread context into the prompt.
+
+The prompt used to carry the five nearest ancestor posts whatever their
+length. `ContextPacker` fills a token budget instead:
+
+- the thread root is always kept (capped at `ROOT_MAX_TOKENS`), so the model
+  knows what the thread is about,
+- the remaining ancestors are taken most relevant first: nearest to the
+  mention, plus words shared with the mention text,
+- any single post is capped at `POST_MAX_TOKENS`, and a post that doesn't
+  fit in what's left of the budget is cut on a grapheme boundary (an emoji
+  or accented letter is never split) or, if too little is left, dropped.
+
+Token counts come from `estimate_tokens`, a local approximation of the
+OpenAI BPE tokenizers: text is split like their pre-tokenizer and each piece
+is costed by length. It errs slightly high, which is the safe side for a
+budget. Every request reports how many tokens packing saved.
+"""
+
+from dataclasses import dataclass
+import math
+import re
+import threading
+import unicodedata
+
+CONTEXT_TOKEN_BUDGET = 600
+ROOT_MAX_TOKENS = 200
+POST_MAX_TOKENS = 150
+# A post cut shorter than this is dropped instead
+MIN_TRUNCATED_TOKENS = 16
+# Weight of word overlap with the mention against nearness in the thread
+OVERLAP_WEIGHT = 0.5
+# "\n--\n" between messages in <previous_messages>
+SEPARATOR_TOKENS = 2
+ELLIPSIS = "…"
+
+# Close to the cl100k/o200k pre-tokenizer split
+_PIECE = re.compile(r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+", re.IGNORECASE)
+_WORD = re.compile(r"[^\W_]{3,}")
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece.isascii():
+        # Common English words (with their leading space) are a single token;
+        # longer words and runs take about one more per 5 characters
+        return max(1, math.ceil((len(piece.strip()) - 2) / 5))
+    # Non-Latin scripts and emoji take roughly one token per 2-3 UTF-8 bytes
+    return max(1, math.ceil(len(piece.encode("utf-8")) / 2.5))
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated number of tokens in `text`."""
+    return sum(_piece_tokens(piece) for piece in _PIECE.findall(text))
+
+
+def _extends_grapheme(previous: str, char: str) -> bool:
+    code = ord(char)
+    return (unicodedata.category(char) in ("Mn", "Me", "Mc")
+            or char == "\u200d" or previous == "\u200d"  # zero-width joiner sequences
+            or 0xFE00 <= code <= 0xFE0F  # variation selectors
+            or 0x1F3FB <= code <= 0x1F3FF  # skin tone modifiers
+            or 0xE0020 <= code <= 0xE007F  # tag sequences (subdivision flags)
+            or (previous, char) == ("\r", "\n"))
+
+
+def graphemes(text: str) -> list:
+    """Split `text` into (approximate extended) grapheme clusters."""
+    clusters = []
+    regional_indicators = 0
+    for char in text:
+        is_regional = 0x1F1E6 <= ord(char) <= 0x1F1FF
+        # Flags are pairs of regional indicators
+        pairs_flag = is_regional and regional_indicators % 2 == 1
+        if clusters and (pairs_flag or _extends_grapheme(clusters[-1][-1], char)):
+            clusters[-1] += char
+        else:
+            clusters.append(char)
+        regional_indicators = regional_indicators + 1 if is_regional else 0
+    return clusters
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """`text` cut on a grapheme boundary (with an ellipsis) to fit `max_tokens`."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    clusters = graphemes(text)
+    # Longest prefix that fits, by binary search over grapheme boundaries
+    low, high = 0, len(clusters)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens("".join(clusters[:middle]).rstrip() + ELLIPSIS) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return "".join(clusters[:low]).rstrip() + ELLIPSIS if low else ""
+
+
+def _words(text: str) -> set:
+    return {word.casefold() for word in _WORD.findall(text)}
+
+
+@dataclass
+class PackedContext:
+    # Nearest ancestor first, root last (the order `fetch_context` uses)
+    messages: list
+    tokens: int
+    original_tokens: int
+    dropped: int = 0
+    truncated: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.tokens
+
+    def report(self) -> str:
+        return (f"Context: {len(self.messages)} messages, {self.tokens} tokens "
+                f"(saved {self.tokens_saved} of {self.original_tokens}; "
+                f"{self.dropped} dropped, {self.truncated} truncated)")
+
+
+class ContextPacker:
+
+    def __init__(self, budget_tokens=CONTEXT_TOKEN_BUDGET, root_max_tokens=ROOT_MAX_TOKENS,
+                 post_max_tokens=POST_MAX_TOKENS):
+        self.budget_tokens = budget_tokens
+        self.root_max_tokens = root_max_tokens
+        self.post_max_tokens = post_max_tokens
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.original_tokens = 0
+        self.packed_tokens = 0
+
+    def pack(self, ancestors: list, root: str | None = None, current: str = "") -> PackedContext:
+        """Pack formatted posts into the token budget.
+
+        Args:
+            ancestors (list): Ancestor posts, nearest first, not including the root.
+            root (str, optional): The thread root post.
+            current (str, optional): The mention text, for relevance.
+        """
+        original_tokens = sum(estimate_tokens(post) + SEPARATOR_TOKENS for post in ancestors)
+        remaining = self.budget_tokens
+        packed = {}
+        truncated = 0
+
+        def take(index, post, cap):
+            nonlocal remaining, truncated
+            limit = min(cap, remaining - SEPARATOR_TOKENS)
+            text = truncate_tokens(post, limit) if limit > 0 else ""
+            if not text or (text != post and limit < MIN_TRUNCATED_TOKENS):
+                return
+            truncated += text != post
+            packed[index] = text
+            remaining -= estimate_tokens(text) + SEPARATOR_TOKENS
+
+        if root is not None:
+            original_tokens += estimate_tokens(root) + SEPARATOR_TOKENS
+            take(len(ancestors), root, self.root_max_tokens)
+
+        current_words = _words(current)
+
+        def relevance(index):
+            words = _words(ancestors[index])
+            overlap = len(words & current_words) / len(words | current_words) if words else 0.0
+            return 1.0 / (1 + index) + OVERLAP_WEIGHT * overlap
+
+        for index in sorted(range(len(ancestors)), key=relevance, reverse=True):
+            take(index, ancestors[index], self.post_max_tokens)
+
+        messages = [packed[index] for index in sorted(packed)]
+        context = PackedContext(
+            messages=messages,
+            tokens=self.budget_tokens - remaining,
+            original_tokens=original_tokens,
+            dropped=len(ancestors) + (root is not None) - len(messages),
+            truncated=truncated,
+        )
+        with self._lock:
+            self.requests += 1
+            self.original_tokens += context.original_tokens
+            self.packed_tokens += context.tokens
+        return context
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "original_tokens": self.original_tokens,
+                    "packed_tokens": self.packed_tokens,
+                    "tokens_saved": self.original_tokens - self.packed_tokens}
@@ -0,0 +1,160 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.4;
+
+// Gas-optimized TicketSystem.
+//
+// Differences from TicketSystem (TicketContract.sol):
+// - Both counters for a handle are packed into one storage slot.
+// - Every owner entry point is keyed by bytes32 keccak256(bskyHandle), hashed
+//   off chain, so there is no string calldata and no on-chain hashing.
+// - getTicketInfoBatch reads many handles in one call.
+// - The owner can import balances from the old contract before opening it.
+contract TicketSystemV2 {
+    struct TicketInfo {
+        uint128 fundedCount;    // Number of funded tickets
+        uint128 completedCount; // Number of completed tickets
+    }
+
+    address public immutable owner;
+    uint256 public constant TICKET_PRICE = 0.0001 ether;
+    bool public migrationFinalized;
+
+    // Mapping from bluesky handle hash to ticket info
+    mapping(bytes32 => TicketInfo) public tickets;
+
+    // handleHash matches the topic TicketSystem's string-indexed events carry
+    event TicketsPurchasedByHash(bytes32 indexed handleHash, address indexed buyer, uint256 amount);
+    event TicketCompletedByHash(bytes32 indexed handleHash);
+
+    error InvalidOwner();
+    error NotOwner();
+    error NoTickets();
+    error EmptyHandle();
+    error IncorrectPayment();
+    error NoFundedTickets();
+    error LengthMismatch();
+    error MigrationFinalized();
+    error MigrationPending();
+    error InvalidBalance();
+
+    constructor(address _owner) {
+        if (_owner == address(0)) revert InvalidOwner();
+        owner = _owner;
+    }
+
+    modifier onlyOwner() {
+        if (msg.sender != owner) revert NotOwner();
+        _;
+    }
+
+    // Same signature as TicketSystem.buyTickets so buyers' flow is unchanged
+    function buyTickets(string calldata bskyHandle, uint256 numberOfTickets) external payable returns (bool) {
+        if (bytes(bskyHandle).length == 0) revert EmptyHandle();
+        _buy(keccak256(bytes(bskyHandle)), numberOfTickets);
+        return true;
+    }
+
+    function buyTicketsByHash(bytes32 handleHash, uint256 numberOfTickets) external payable returns (bool) {
+        _buy(handleHash, numberOfTickets);
+        return true;
+    }
+
+    function _buy(bytes32 handleHash, uint256 numberOfTickets) private {
+        // Sales open once imported balances can no longer be overwritten
+        if (!migrationFinalized) revert MigrationPending();
+        if (numberOfTickets == 0) revert NoTickets();
+        if (msg.value != TICKET_PRICE * numberOfTickets) revert IncorrectPayment();
+
+        // numberOfTickets is bounded by msg.value / TICKET_PRICE, far below 2^128
+        tickets[handleHash].fundedCount += uint128(numberOfTickets);
+        emit TicketsPurchasedByHash(handleHash, msg.sender, numberOfTickets);
+    }
+
+    function completeTicket(bytes32 handleHash) external onlyOwner {
+        TicketInfo storage info = tickets[handleHash];
+        if (info.fundedCount <= info.completedCount) revert NoFundedTickets();
+
+        unchecked { info.completedCount++; }
+        emit TicketCompletedByHash(handleHash);
+    }
+
+    // Handles without an available ticket are skipped rather than reverting
+    // the whole batch. Returns how many tickets were completed.
+    function completeTickets(bytes32[] calldata handleHashes) external onlyOwner returns (uint256 completed) {
+        uint256 length = handleHashes.length;
+        for (uint256 i = 0; i < length; ) {
+            bytes32 handleHash = handleHashes[i];
+            TicketInfo storage info = tickets[handleHash];
+            if (info.fundedCount > info.completedCount) {
+                unchecked {
+                    info.completedCount++;
+                    ++completed;
+                }
+                emit TicketCompletedByHash(handleHash);
+            }
+            unchecked { ++i; }
+        }
+    }
+
+    function getTicketInfo(string calldata bskyHandle) external view returns (
+        uint256 fundedCount,
+        uint256 completedCount,
+        uint256 availableTickets
+    ) {
+        return getTicketInfoByHash(keccak256(bytes(bskyHandle)));
+    }
+
+    function getTicketInfoByHash(bytes32 handleHash) public view returns (
+        uint256 fundedCount,
+        uint256 completedCount,
+        uint256 availableTickets
+    ) {
+        TicketInfo memory info = tickets[handleHash];
+        return (info.fundedCount, info.completedCount, info.fundedCount - info.completedCount);
+    }
+
+    function getTicketInfoBatch(bytes32[] calldata handleHashes) external view returns (
+        uint256[] memory fundedCounts,
+        uint256[] memory completedCounts,
+        uint256[] memory availableTickets
+    ) {
+        uint256 length = handleHashes.length;
+        fundedCounts = new uint256[](length);
+        completedCounts = new uint256[](length);
+        availableTickets = new uint256[](length);
+        for (uint256 i = 0; i < length; ) {
+            TicketInfo memory info = tickets[handleHashes[i]];
+            fundedCounts[i] = info.fundedCount;
+            completedCounts[i] = info.completedCount;
+            availableTickets[i] = info.fundedCount - info.completedCount;
+            unchecked { ++i; }
+        }
+    }
+
+    // Import balances from TicketSystem. Entries overwrite existing balances,
+    // so re-running a chunk is harmless. Ticket sales stay closed until the
+    // owner calls finalizeMigration, after which migrate is disabled. A fresh
+    // deployment with nothing to import just finalizes straight away.
+    function migrate(
+        bytes32[] calldata handleHashes,
+        uint128[] calldata fundedCounts,
+        uint128[] calldata completedCounts
+    ) external onlyOwner {
+        if (migrationFinalized) revert MigrationFinalized();
+        uint256 length = handleHashes.length;
+        if (fundedCounts.length != length || completedCounts.length != length) revert LengthMismatch();
+        for (uint256 i = 0; i < length; ) {
+            if (completedCounts[i] > fundedCounts[i]) revert InvalidBalance();
+            tickets[handleHashes[i]] = TicketInfo(fundedCounts[i], completedCounts[i]);
+            unchecked { ++i; }
+        }
+    }
+
+    function finalizeMigration() external onlyOwner {
+        migrationFinalized = true;
+    }
+
+    function withdraw() external onlyOwner {
+        payable(owner).transfer(address(this).balance);
+    }
+}
@@ -0,0 +1,211 @@
+"""
+Bounded tool-calling conversation loop shared by the drivers.
+
+The model is called, any tool calls it makes are run through
+`cdp_agent.process_tool_calls`, and the results are fed back until it
+finishes. Each request is bounded by `ConversationLimits`: a maximum number
+of model rounds, a wall-clock deadline and a cumulative token budget. When a
+limit is hit the loop stops and returns `DEGRADED_RESPONSE` instead of
+stalling the worker. Every request reports its rounds and token usage.
+
+With `stream`, completions are streamed (see streaming.py): the answer is
+returned as soon as `</response>` closes, and read-only tool calls start as
+soon as their arguments have arrived instead of after the whole message.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+import json
+import time
+
+import api
+import cdp_agent
+
+# Returned (inside <response> tags, like a model answer) when a limit is hit
+DEGRADED_RESPONSE = ("<response>Sorry, I couldn't finish looking into that right now. "
+                     "Please try again in a bit!</response>")
+
+
+@dataclass(frozen=True)
+class ConversationLimits:
+    max_rounds: int = 6
+    deadline_sec: float = 60.0
+    max_tokens: int = 20000
+
+
+DEFAULT_LIMITS = ConversationLimits()
+
+
+@dataclass
+class ConversationResult:
+    content: str
+    rounds: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Whether some of the tokens are local estimates (streams cut short)
+    estimated_tokens: bool = False
+    elapsed_sec: float = 0.0
+    # Which limit stopped the loop ("max_rounds", "deadline", "max_tokens"), or
+    # the finish reason ("length", "content_filter") of an answer cut short
+    limit_hit: str | None = None
+    # (name, arguments, result) of every tool call, result None if it failed
+    tool_calls: list = field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def report(self) -> str:
+        limit = f", stopped by {self.limit_hit}" if self.limit_hit else ""
+        estimated = " estimated" if self.estimated_tokens else ""
+        return (f"Conversation: {self.rounds} rounds, {self.total_tokens}{estimated} tokens "
+                f"({self.prompt_tokens} prompt, {self.completion_tokens} completion), "
+                f"{self.elapsed_sec:.1f}s{limit}")
+
+
+def tool_result_messages(results: list) -> list:
+    """Turn `cdp_agent.process_tool_calls` results into tool messages."""
+    return [
+        {
+            "role": "tool",
+            "content": json.dumps(result["result"] if "result" in result else {"error": result["error"]}),
+            "tool_call_id": result["id"]
+        }
+        for result in results
+    ]
+
+
+class Conversation:
+    """State of one request's tool-calling loop."""
+
+    def __init__(self, agent: dict, messages: list, limits: ConversationLimits = DEFAULT_LIMITS, stream=False):
+        self.agent = agent
+        self.messages = messages
+        self.limits = limits
+        self.stream = stream
+        # Tool call id -> `cdp_agent.start_tool_call` handle, for the current round
+        self.started_tools = {}
+        self._side_effects_called = False
+        self.result = ConversationResult(content=DEGRADED_RESPONSE)
+        self.finished = False
+        self.started = time.monotonic()
+
+    def remaining_sec(self) -> float:
+        return self.limits.deadline_sec - (time.monotonic() - self.started)
+
+    def check_limits(self) -> bool:
+        """Whether another model round may start; records the limit hit if not."""
+        if self.result.rounds >= self.limits.max_rounds:
+            self.result.limit_hit = "max_rounds"
+        elif self.result.total_tokens >= self.limits.max_tokens:
+            self.result.limit_hit = "max_tokens"
+        elif self.remaining_sec() <= 0:
+            self.result.limit_hit = "deadline"
+        return self.result.limit_hit is None
+
+    def record(self, response) -> list:
+        """Account for one completion. Returns the tool-call messages to run, if any.
+
+        Sets `finished` and `result.content` once the model has finished.
+        """
+        self.result.rounds += 1
+        if response.usage is not None:
+            self.result.prompt_tokens += response.usage.prompt_tokens
+            self.result.completion_tokens += response.usage.completion_tokens
+            self.result.estimated_tokens |= bool(getattr(response.usage, "estimated", False))
+
+        tool_messages = []
+        for choice in response.choices:
+            if choice.finish_reason == "tool_calls":
+                self.messages.append(choice.message)
+                tool_messages.append(choice.message)
+                continue
+            # Any other finish reason is final: asking again would send the
+            # same messages and most likely get the same answer.
+            content = choice.message.content or ""
+            if choice.finish_reason == "stop" or "</response>" in content:
+                self.result.content = content
+            else:
+                # Cut short ("length", "content_filter", ...) before the answer closed
+                self.result.limit_hit = choice.finish_reason
+            self.finished = True
+            return []
+        return tool_messages
+
+    def finish(self) -> ConversationResult:
+        self.result.elapsed_sec = time.monotonic() - self.started
+        print(self.result.report())
+        return self.result
+
+    def start_round(self) -> None:
+        self.started_tools = {}
+        self._side_effects_called = False
+
+    def start_tool(self, tool_call) -> None:
+        """`on_tool_call` hook for streamed completions: start allowed read-only
+        calls right away. Calls after one with side effects wait for
+        `run_tools`, which runs them once it has finished."""
+        tool_name = tool_call.function.name
+        allowed_tools = self.agent.get("allowed_tools")
+        if tool_name not in cdp_agent.ACTIONS_BY_NAME or (allowed_tools is not None and tool_name not in allowed_tools):
+            return
+        if tool_name not in cdp_agent.READ_ONLY_TOOLS:
+            self._side_effects_called = True
+        elif not self._side_effects_called:
+            self.started_tools[tool_call.id] = cdp_agent.start_tool_call(
+                self.agent["wallet"], self.agent["Cdp"], tool_call)
+
+    def run_tools(self, message) -> None:
+        results = cdp_agent.process_tool_calls(
+            self.agent["wallet"], self.agent["Cdp"], message, self.agent.get("allowed_tools"), self.started_tools)
+        print(results)
+        by_id = {result["id"]: result for result in results}
+        for tool_call in message.tool_calls:
+            self.result.tool_calls.append((
+                tool_call.function.name, tool_call.function.arguments, by_id[tool_call.id].get("result")))
+        self.messages.extend(tool_result_messages(results))
+
+    def run(self) -> ConversationResult:
+        while not self.finished and self.check_limits():
+            self.start_round()
+            try:
+                response = api.generate_response(
+                    self.messages, tools=self.agent["tools"], timeout=self.remaining_sec(),
+                    stream=self.stream, on_tool_call=self.start_tool)
+            except Exception as e:
+                print(f"Error generating response: {e}")
+                if self.remaining_sec() <= 0:
+                    self.result.limit_hit = "deadline"
+                    break
+                raise
+            for message in self.record(response):
+                self.run_tools(message)
+        return self.finish()
+
+    async def arun(self) -> ConversationResult:
+        """Async `run`: completions go through AsyncOpenAI and tool calls hit the
+        synchronous CDP SDK in a worker thread to keep the event loop free."""
+        while not self.finished and self.check_limits():
+            self.start_round()
+            try:
+                response = await asyncio.wait_for(
+                    api.async_generate_response(
+                        self.messages, tools=self.agent["tools"], timeout=self.remaining_sec(),
+                        stream=self.stream, on_tool_call=self.start_tool),
+                    self.remaining_sec())
+            except asyncio.TimeoutError:
+                self.result.limit_hit = "deadline"
+                break
+            for message in self.record(response):
+                await asyncio.to_thread(self.run_tools, message)
+        return self.finish()
+
+
+def run_conversation(agent: dict, messages: list, limits: ConversationLimits = DEFAULT_LIMITS,
+                     stream=False) -> ConversationResult:
+    return Conversation(agent, messages, limits, stream).run()
+
+
+async def async_run_conversation(agent: dict, messages: list, limits: ConversationLimits = DEFAULT_LIMITS,
+                                 stream=False) -> ConversationResult:
+    return await Conversation(agent, messages, limits, stream).arun()
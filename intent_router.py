@@ -0,0 +1,210 @@
+"""
+Local intent router in front of the LLM.
+
+Common mentions ("how many tickets do I have?", "help", "how do I buy
+tickets?") are recognized by keyword rules or, failing that, a small naive
+Bayes classifier trained on each intent's example phrases. Both run on the CPU
+in microseconds. A classifier match counts only if the text also contains one
+of the intent's keywords, so e.g. "how do i get eth" can't be answered with
+the ticket link just because it reads like "how do i get tickets". A match
+above `MIN_CONFIDENCE` is answered from the intent's template and never
+reaches OpenAI; anything else falls through to the LLM as before.
+
+Intents are pluggable: build an `Intent` and `register` it on a router.
+
+Every decision is appended to `ROUTER_LOG_FILE`. Adding a `"label"` field
+(the correct intent, or "other") to reviewed lines lets
+`python intent_router.py report` print routing precision per intent.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+import json
+import math
+import re
+import sys
+import time
+from typing import Callable
+
+ROUTER_LOG_FILE = "intent_log.jsonl"
+# Template answers only for matches at least this confident
+MIN_CONFIDENCE = 0.9
+# Longer mentions usually ask for more than one thing; leave them to the LLM.
+MAX_ROUTED_WORDS = 12
+OTHER = "other"
+
+_MENTION = re.compile(r"@[\w.-]+")
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word unigrams and bigrams, with @mentions removed."""
+    words = _TOKEN.findall(_MENTION.sub(" ", text).lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+@dataclass
+class Intent:
+    name: str
+    # Regexes on the lowercased text with @mentions removed; any match routes
+    # with confidence 1.0.
+    rules: list
+    # Training phrases for the classifier
+    examples: list
+    # render(**facts) -> reply text
+    render: Callable[..., str]
+    # Regexes of which at least one must match for a classifier match to
+    # count; without any the intent is only routed by its rules.
+    keywords: list = field(default_factory=list)
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    confidence: float
+    source: str  # "rule", "classifier", "keyword" (classifier match without a keyword) or "length"
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes over unigrams and bigrams with add-one smoothing."""
+
+    def __init__(self):
+        self.word_counts = {}
+        self.totals = Counter()
+        self.docs = Counter()
+        self.vocabulary = set()
+
+    def fit(self, examples: dict) -> "NaiveBayesClassifier":
+        """`examples` maps label -> list of phrases."""
+        for label, phrases in examples.items():
+            counts = self.word_counts.setdefault(label, Counter())
+            for phrase in phrases:
+                tokens = tokenize(phrase)
+                counts.update(tokens)
+                self.totals[label] += len(tokens)
+                self.docs[label] += 1
+                self.vocabulary.update(tokens)
+        return self
+
+    def predict(self, text: str) -> tuple:
+        """Most likely label and its posterior probability."""
+        tokens = [token for token in tokenize(text) if token in self.vocabulary]
+        if not tokens:
+            return OTHER, 1.0
+        total_docs = sum(self.docs.values())
+        vocabulary_size = len(self.vocabulary)
+        scores = {}
+        for label, counts in self.word_counts.items():
+            score = math.log(self.docs[label] / total_docs)
+            denominator = self.totals[label] + vocabulary_size
+            for token in tokens:
+                score += math.log((counts[token] + 1) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / norm
+
+
+class IntentRouter:
+
+    def __init__(self, min_confidence=MIN_CONFIDENCE, log_file=ROUTER_LOG_FILE):
+        self.min_confidence = min_confidence
+        self.log_file = log_file
+        self.intents = {}
+        # Phrases that should not be routed anywhere
+        self.other_examples = []
+        self._classifier = None
+        self.routed = Counter()
+        self.passed = 0
+
+    def register(self, intent: Intent) -> None:
+        self.intents[intent.name] = intent
+        self._classifier = None
+
+    def add_other_examples(self, phrases) -> None:
+        self.other_examples.extend(phrases)
+        self._classifier = None
+
+    @property
+    def classifier(self) -> NaiveBayesClassifier:
+        if self._classifier is None:
+            examples = {name: intent.examples for name, intent in self.intents.items()}
+            examples[OTHER] = self.other_examples
+            self._classifier = NaiveBayesClassifier().fit(examples)
+        return self._classifier
+
+    def classify(self, text: str) -> IntentMatch:
+        cleaned = " ".join(_MENTION.sub(" ", text).lower().split())
+        if len(cleaned.split()) > MAX_ROUTED_WORDS:
+            return IntentMatch(OTHER, 1.0, "length")
+        for intent in self.intents.values():
+            if any(re.search(rule, cleaned) for rule in intent.rules):
+                return IntentMatch(intent.name, 1.0, "rule")
+        label, confidence = self.classifier.predict(cleaned)
+        if label != OTHER and not any(re.search(keyword, cleaned) for keyword in self.intents[label].keywords):
+            return IntentMatch(OTHER, confidence, "keyword")
+        return IntentMatch(label, confidence, "classifier")
+
+    def matches(self, text: str) -> bool:
+        """Whether `text` would be answered from a template."""
+        match = self.classify(text)
+        return match.intent != OTHER and match.confidence >= self.min_confidence
+
+    def route(self, text: str, **facts):
+        """Template reply for a confident intent match, or None to use the LLM.
+
+        `facts` are passed to the intent's template (e.g. `num_tickets`).
+        """
+        match = self.classify(text)
+        routed = match.intent != OTHER and match.confidence >= self.min_confidence
+        reply = self.intents[match.intent].render(**facts) if routed else None
+        if routed:
+            self.routed[match.intent] += 1
+        else:
+            self.passed += 1
+        self._log(text, match, routed)
+        return reply
+
+    def stats(self) -> dict:
+        handled = sum(self.routed.values())
+        total = handled + self.passed
+        return {"routed": dict(self.routed), "passed": self.passed,
+                "routed_share": handled / total if total else 0.0}
+
+    def _log(self, text: str, match: IntentMatch, routed: bool) -> None:
+        if self.log_file is None:
+            return
+        try:
+            with open(self.log_file, "a") as f:
+                f.write(json.dumps({
+                    "time": time.time(), "text": text, "intent": match.intent,
+                    "confidence": round(match.confidence, 4), "source": match.source, "routed": routed,
+                }) + "\n")
+        except OSError as e:
+            print(f"Error logging intent decision: {e}")
+
+
+def precision_report(path: str = ROUTER_LOG_FILE) -> dict:
+    """Per-intent routing counts and, over reviewed (labeled) lines, precision."""
+    report = {}
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if not entry["routed"]:
+                continue
+            stats = report.setdefault(entry["intent"], {"routed": 0, "labeled": 0, "correct": 0})
+            stats["routed"] += 1
+            if "label" in entry:
+                stats["labeled"] += 1
+                stats["correct"] += entry["label"] == entry["intent"]
+    for stats in report.values():
+        stats["precision"] = stats["correct"] / stats["labeled"] if stats["labeled"] else None
+    return report
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ["report"]:
+        raise SystemExit("usage: python intent_router.py report")
+    for intent, stats in sorted(precision_report().items()):
+        precision = "n/a" if stats["precision"] is None else f"{stats['precision']:.1%}"
+        print(f"{intent:>16}: routed {stats['routed']}, labeled {stats['labeled']}, precision {precision}")
@@ -0,0 +1,84 @@
+"""
+Durable job queue and processing journal for mentions.
+
+Every mention gets a row keyed by its notification URI as soon as it is
+fetched. Each pipeline stage records its progress (and whatever it produced)
+before handing the job on, so after a crash the driver resubmits unfinished
+jobs and each one resumes at the exact stage where it stopped: a generated
+reply is not regenerated and a completed ticket is not charged again.
+"""
+
+import json
+import time
+
+from sqlite_store import SQLiteStore
+
+JOURNAL_DB_FILE = "journal.db"
+
+# Stages in the order a job moves through them. `skipped` is terminal and
+# used for mentions that need no reply (e.g. already answered).
+STAGES = ("fetched", "ticket_checked", "generated", "ticket_completed", "posted")
+FINAL_STAGES = ("posted", "skipped")
+
+
+def stage_reached(stage: str, target: str) -> bool:
+    """Whether a job at `stage` has already completed `target`."""
+    if stage == "skipped":
+        return True
+    return STAGES.index(stage) >= STAGES.index(target)
+
+
+class Journal(SQLiteStore):
+    """SQLite-backed journal (WAL mode) of mention jobs."""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " uri TEXT PRIMARY KEY,"
+        " thread_key TEXT NOT NULL,"
+        " stage TEXT NOT NULL,"
+        " mention TEXT NOT NULL,"
+        " data TEXT NOT NULL DEFAULT '{}',"
+        " created_at REAL NOT NULL,"
+        " updated_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS jobs_stage ON jobs (stage, created_at)",
+    )
+
+    def __init__(self, path=JOURNAL_DB_FILE):
+        super().__init__(path, synchronous="NORMAL")
+
+    def add(self, uri: str, thread_key: str, mention: dict) -> bool:
+        """Record a newly fetched mention. Returns False if it was already journaled."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (uri, thread_key, stage, mention, created_at, updated_at)"
+                " VALUES (?, ?, 'fetched', ?, ?, ?)",
+                (uri, thread_key, json.dumps(mention), now, now))
+        return cursor.rowcount == 1
+
+    def advance(self, uri: str, stage: str, **data) -> None:
+        """Move a job to `stage`, merging `data` into its stored results."""
+        with self._lock, self._transaction():
+            row = self._conn.execute("SELECT data FROM jobs WHERE uri = ?", (uri,)).fetchone()
+            merged = json.loads(row[0]) if row else {}
+            merged.update(data)
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, data = ?, updated_at = ? WHERE uri = ?",
+                (stage, json.dumps(merged), time.time(), uri))
+
+    def get(self, uri: str):
+        """Return `(stage, data)` for a job, or `(None, {})` if unknown."""
+        with self._lock:
+            row = self._conn.execute("SELECT stage, data FROM jobs WHERE uri = ?", (uri,)).fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    def unfinished(self) -> list:
+        """Return `(uri, thread_key, mention)` for jobs that have not finished, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uri, thread_key, mention FROM jobs"
+                " WHERE stage NOT IN (?, ?) ORDER BY created_at",
+                FINAL_STAGES).fetchall()
+        return [(uri, key, json.loads(mention)) for uri, key, mention in rows]
@@ -0,0 +1,110 @@
+"""
+Minimal OpenAI-compatible stand-in server for exercising model tier routing
+(see model_router.py) without calling OpenAI.
+
+Serves POST /v1/chat/completions with a canned `<response>` answer naming the
+requested model. Models can be made to fail (HTTP 500) or to answer without a
+`<response>` part (a low-confidence answer), which makes the router fall back
+to the next tier. Streaming requests (`"stream": true`) are answered as
+server-sent events, a few characters per chunk:
+
+    python local_openai_server.py --port 8000 --fail gpt-4o-mini
+    OPENAI_API_KEY=local OPENAI_BASE_URL_SMALL=http://127.0.0.1:8000/v1 \\
+        OPENAI_BASE_URL_LARGE=http://127.0.0.1:8000/v1 python test_driver.py
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import time
+
+
+def completion(model: str, content: str, prompt_chars: int) -> dict:
+    return {
+        "id": f"chatcmpl-local-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        # Rough token counts, about 4 characters per token
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4,
+        },
+    }
+
+
+def stream_chunks(completion: dict, include_usage: bool, chunk_chars=8):
+    """`completion` as `chat.completion.chunk` events."""
+    content = completion["choices"][0]["message"]["content"]
+
+    def chunk(delta, finish_reason=None):
+        return {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"],
+                "model": completion["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+    yield chunk({"role": "assistant", "content": ""})
+    for i in range(0, len(content), chunk_chars):
+        yield chunk({"content": content[i:i + chunk_chars]})
+    yield chunk({}, "stop")
+    if include_usage:
+        yield {**chunk({}), "choices": [], "usage": completion["usage"]}
+
+
+def make_handler(fail: set, unsure: set, delay_sec: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            model = request["model"]
+            time.sleep(delay_sec)
+            if model in fail:
+                self.send_error(500, f"{model} is configured to fail")
+                return
+            content = (f"stub reply from {model}" if model in unsure
+                       else f"<thinking>stub</thinking><response>stub reply from {model}</response>")
+            prompt_chars = sum(len(m.get("content") or "") for m in request["messages"])
+            if request.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+                try:
+                    for chunk in stream_chunks(completion(model, content, prompt_chars), include_usage):
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client stopped reading early
+                return
+            body = json.dumps(completion(model, content, prompt_chars)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fail", action="append", default=[], help="model that returns HTTP 500")
+    parser.add_argument("--unsure", action="append", default=[], help="model that answers without <response>")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(set(args.fail), set(args.unsure), args.delay))
+    print(f"Serving on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
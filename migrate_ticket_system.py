@@ -0,0 +1,41 @@
+"""
+Deploy TicketSystemV2 and import every balance from the current TicketSystem.
+
+Balances come from the local ticket index (ticket_indexer.py), which is
+synced to the head of the old contract first. Purchases made on the old
+contract after that sync are not carried over, so switch the bot to the new
+contract (TICKET_SYSTEM_ADDRESS, TICKET_SYSTEM_VERSION=2) right after
+migrating. Build the contract artifact with compile_contracts.py before
+running this.
+"""
+
+import os
+
+from web3 import Web3
+
+import cdp_agent
+import cdp_agentkit_core.actions.deploy_ticket_system as deploy_ticket_system
+import cdp_agentkit_core.actions.ticket_system as ticket_system
+from ticket_indexer import TicketIndexer
+
+RPC_URL = os.environ.get("BASE_SEPOLIA_RPC_URL", deploy_ticket_system.DEFAULT_RPC_URL)
+
+agent = cdp_agent.init_agent()
+
+indexer = TicketIndexer(
+    Web3(Web3.HTTPProvider(RPC_URL)),
+    ticket_system.ticket_system_address(),
+    start_block=int(os.environ.get("TICKET_SYSTEM_START_BLOCK", "0")),
+    confirmations=0)
+print(f"Indexed {indexer.sync()} ticket events up to block {indexer.last_block}")
+
+deploy_response = deploy_ticket_system.deploy_ticket_system(agent["wallet"], agent["Cdp"], RPC_URL)
+print(deploy_response)
+if deploy_response.startswith("Deployed"):
+    contract_address = deploy_response.split()[3]
+    migrate_response = deploy_ticket_system.migrate_ticket_system(
+        agent["wallet"], agent["Cdp"], contract_address, indexer.all_balances())
+    print(migrate_response)
+    if migrate_response.startswith("Successfully"):
+        print(f"Set TICKET_SYSTEM_ADDRESS={contract_address}, TICKET_SYSTEM_VERSION=2 and "
+              f"TICKET_SYSTEM_START_BLOCK={indexer.web3.eth.block_number}, then restart the bot")
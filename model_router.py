@@ -0,0 +1,136 @@
+"""
+Model tier selection for chat completions.
+
+`api.generate_response` used to send every request to one model. Requests are
+now routed to a tier picked from cheap local features of the request:
+
+- prompt length (characters across all messages),
+- whether tools are likely needed (wallet/ticket keywords in the latest user
+  message, or tool results already in the conversation),
+- thread depth (number of previous messages in the thread).
+
+Routing starts at the picked tier and only moves up to a larger one when a
+call fails or its answer looks low-confidence (cut off at the length limit,
+empty, or missing the `<response>` part the prompts ask for). Latency and
+token usage are recorded per tier, see `tier_stats`.
+
+Each tier can point at its own OpenAI-compatible endpoint, so routing can be
+exercised against a local stand-in server (see local_openai_server.py):
+
+    OPENAI_BASE_URL_SMALL=http://127.0.0.1:8000/v1 OPENAI_BASE_URL_LARGE=http://127.0.0.1:8000/v1 ...
+"""
+
+from dataclasses import dataclass
+import os
+import re
+import threading
+
+from openai.types import CompletionUsage
+
+@dataclass(frozen=True)
+class ModelTier:
+    name: str
+    model: str
+    base_url: str | None = None
+
+
+# Tiers from smallest to largest
+MODEL_TIERS = (
+    ModelTier("small", os.environ.get("OPENAI_MODEL_SMALL", "gpt-4o-mini"), os.environ.get("OPENAI_BASE_URL_SMALL")),
+    ModelTier("large", os.environ.get("OPENAI_MODEL_LARGE", "gpt-4o"), os.environ.get("OPENAI_BASE_URL_LARGE")),
+)
+
+# Requests scoring at least this many points start on the large tier
+LARGE_TIER_SCORE = 2
+LONG_PROMPT_CHARS = 6000
+DEEP_THREAD_MESSAGES = 4
+
+TOOL_KEYWORDS = re.compile(r"\b(balance|wallet|ticket|tickets|address|eth|usdc|token|tokens|onchain|contract)\b",
+                           re.IGNORECASE)
+
+
+def _content(message) -> str:
+    content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+    return content if isinstance(content, str) else ""
+
+
+def _role(message) -> str:
+    return message.get("role") if isinstance(message, dict) else getattr(message, "role", "")
+
+
+def request_features(messages: list, tools=None) -> dict:
+    """Cheap local features of a chat request."""
+    last_user = next((_content(m) for m in reversed(messages) if _role(m) == "user"), "")
+    current = last_user.rsplit("<current_message>", 1)[-1]
+    previous = re.search(r"<previous_messages>(.*?)</previous_messages>", last_user, re.DOTALL)
+    return {
+        "prompt_chars": sum(len(_content(m)) for m in messages),
+        "needs_tools": bool(tools) and (bool(TOOL_KEYWORDS.search(current))
+                                        or any(_role(m) == "tool" for m in messages)),
+        "thread_depth": len([p for p in previous.group(1).split("\n--\n") if p.strip()]) if previous else 0,
+    }
+
+
+def choose_tier(messages: list, tools=None) -> int:
+    """Index into MODEL_TIERS of the tier a request starts on."""
+    features = request_features(messages, tools)
+    score = ((features["prompt_chars"] >= LONG_PROMPT_CHARS)
+             + features["needs_tools"]
+             + (features["thread_depth"] >= DEEP_THREAD_MESSAGES))
+    return min(len(MODEL_TIERS) - 1, 1 if score >= LARGE_TIER_SCORE else 0)
+
+
+def low_confidence(response) -> bool:
+    """Whether a completion looks unreliable enough to retry on a larger tier."""
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        return True
+    if choice.finish_reason == "stop":
+        content = choice.message.content or ""
+        return not content.strip() or "<response>" not in content
+    return False
+
+
+def add_usage(response, spent: list):
+    """`response` with the usage of `spent` (discarded responses, e.g. from
+    tiers that fell back) added to its own, so token budgets see every call."""
+    usages = [r.usage for r in [response, *spent] if getattr(r, "usage", None) is not None]
+    if not spent or not usages:
+        return response
+    prompt_tokens = sum(usage.prompt_tokens for usage in usages)
+    completion_tokens = sum(usage.completion_tokens for usage in usages)
+    response.usage = CompletionUsage(
+        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        estimated=any(getattr(usage, "estimated", False) for usage in usages))
+    return response
+
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def record(tier: ModelTier, latency_sec: float, response=None, failed=False, fell_back=False) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(tier.name, {
+            "model": tier.model, "calls": 0, "failures": 0, "fallbacks": 0,
+            "latency_sec": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "estimated_usage_calls": 0})
+        stats["calls"] += 1
+        stats["latency_sec"] += latency_sec
+        stats["failures"] += failed
+        stats["fallbacks"] += fell_back
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            stats["prompt_tokens"] += usage.prompt_tokens
+            stats["completion_tokens"] += usage.completion_tokens
+            # Streams cut after </response> carry a local estimate
+            stats["estimated_usage_calls"] += bool(getattr(usage, "estimated", False))
+
+
+def tier_stats() -> dict:
+    """Per-tier calls, failures, fallbacks (to the next tier), mean latency and tokens."""
+    with _stats_lock:
+        return {
+            name: {**stats, "mean_latency_sec": stats["latency_sec"] / stats["calls"] if stats["calls"] else 0.0}
+            for name, stats in _stats.items()
+        }
@@ -0,0 +1,135 @@
+"""
+A small asyncio staged pipeline.
+
+Jobs enter the first stage through `Pipeline.submit` and flow through the
+stages in order, each stage connected to the next by a bounded queue. Every
+stage runs its own pool of workers, so many jobs can be in flight at once,
+while jobs that share an ordering key (e.g. a Bluesky thread) are still
+processed strictly one after another in submission order.
+
+A job whose key already has a job in flight is parked outside the queues and
+only enters the first stage once that job has finished, so a long run of
+mentions in one thread never ties up workers that other threads could use.
+"""
+
+import asyncio
+
+
+class Job:
+    """A unit of work flowing through the pipeline."""
+
+    def __init__(self, key, payload):
+        self.key = key
+        self.payload = payload
+        # Free-form scratch space the stages use to hand results downstream.
+        self.data = {}
+        # Next job with the same key, parked until this one finishes
+        self.successor = None
+        self.done = asyncio.Event()
+
+
+class Stage:
+    """A pipeline stage.
+
+    Args:
+        name (str): Name used in log output.
+        func: Coroutine function taking a `Job`. Returning a falsy value
+            drops the job (it is finished without visiting later stages).
+        workers (int): Number of concurrent workers for this stage.
+    """
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+
+class Pipeline:
+    """Stages connected by bounded queues.
+
+    Args:
+        stages (list): The `Stage`s, in order.
+        queue_size (int): Capacity of each stage's input queue.
+        on_error: Optional function called with `(job, exception)` when a
+            stage raises, before the job is dropped, e.g. to undo side
+            effects of the stages it already went through.
+    """
+
+    def __init__(self, stages, queue_size=32, on_error=None):
+        self.stages = stages
+        self.on_error = on_error
+        self.queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+        # Last submitted job for each ordering key, used to chain jobs.
+        self._tails = {}
+        self._tasks = []
+        # Puts of released successors; the event loop only holds weak references to tasks
+        self._releases = set()
+
+    async def submit(self, job):
+        """Queue a job, or park it behind an in-flight job with the same key."""
+        tail = self._tails.get(job.key)
+        self._tails[job.key] = job
+        if tail is None:
+            await self.queues[0].put(job)
+        else:
+            tail.successor = job
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                self._tasks.append(asyncio.create_task(self._worker(index)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run(self, producer):
+        """Start the workers and run `producer(pipeline)` until it returns."""
+        self.start()
+        try:
+            await producer(self)
+            # Parked jobs aren't in any queue yet; wait for every key's last job.
+            while self._tails:
+                await next(iter(self._tails.values())).done.wait()
+            for queue in self.queues:
+                await queue.join()
+        finally:
+            await self.stop()
+
+    def _finish(self, job):
+        job.done.set()
+        if job.successor is not None:
+            # Not awaited here: a later stage's worker must not block on the
+            # first queue, or the stages could wait on each other.
+            task = asyncio.create_task(self.queues[0].put(job.successor))
+            self._releases.add(task)
+            task.add_done_callback(self._releases.discard)
+            job.successor = None
+        elif self._tails.get(job.key) is job:
+            del self._tails[job.key]
+
+    async def _worker(self, index):
+        stage = self.stages[index]
+        queue = self.queues[index]
+        while True:
+            job = await queue.get()
+            try:
+                try:
+                    keep = await stage.func(job)
+                except Exception as e:
+                    print(f"Error in {stage.name} stage for {job.key}: {e}")
+                    keep = False
+                    if self.on_error is not None:
+                        try:
+                            self.on_error(job, e)
+                        except Exception as error:
+                            print(f"Error handling failed job {job.key}: {error}")
+
+                if keep and index + 1 < len(self.stages):
+                    await self.queues[index + 1].put(job)
+                else:
+                    self._finish(job)
+            finally:
+                queue.task_done()
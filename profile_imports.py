@@ -0,0 +1,87 @@
+"""
+Import-time profile of the agent's cold start.
+
+Runs each scenario in a fresh interpreter with `python -X importtime` and
+reports its total import time and the slowest top-level imports. The
+`eager actions` scenario loads every registered CDP action up front (what
+`cdp_agentkit_core.actions` used to do on import), so comparing it with
+`lazy actions` shows what the lazy action registry saves.
+
+    python profile_imports.py
+    python profile_imports.py --top 20 --runs 5
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Scenario name -> code run in a fresh interpreter
+SCENARIOS = {
+    "lazy actions": "import cdp_agentkit_core.actions",
+    "eager actions": "import cdp_agentkit_core.actions as a; a.load_all_cdp_actions()",
+    "tool specs (warm cache)": (
+        "import cdp_agentkit_core.actions as a, tool_specs; tool_specs.get_tool_specs(a.CDP_ACTIONS)"),
+    "cdp_agent": "import cdp_agent",
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile(code: str) -> dict:
+    """Cumulative import time in microseconds of every module imported by `code`.
+
+    Only the first (outermost) entry per module is kept, together with its
+    nesting depth.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            _, cumulative, indent, module = match.groups()
+            modules.setdefault(module, (int(cumulative), len(indent) // 2))
+    return modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--runs", type=int, default=3, help="runs per scenario; the median is reported")
+    args = parser.parse_args()
+
+    # Warm the OS file cache and the tool spec cache before measuring.
+    profile(SCENARIOS["tool specs (warm cache)"])
+
+    totals = {}
+    for name, code in SCENARIOS.items():
+        try:
+            runs = [profile(code) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name}: failed ({e})\n")
+            continue
+        total = statistics.median(
+            sum(cumulative for cumulative, depth in modules.values() if depth == 0) for modules in runs)
+        totals[name] = total
+        print(f"{name}: {total / 1e6:.3f}s total, {len(runs[-1])} modules")
+        top_level = sorted(
+            ((cumulative, module) for module, (cumulative, depth) in runs[-1].items() if depth == 0),
+            reverse=True)
+        for cumulative, module in top_level[:args.top]:
+            print(f"  {cumulative / 1e3:>9.1f}ms  {module}")
+        print()
+
+    if "lazy actions" in totals and "eager actions" in totals:
+        saved = totals["eager actions"] - totals["lazy actions"]
+        print(f"Lazy registry saves {saved / 1e6:.3f}s "
+              f"({saved / totals['eager actions']:.0%}) of the action package import")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Cache of final replies for repeated questions.
+
+Entries are keyed on the normalized question plus its thread context, with
+the asking user's handle swapped for a placeholder so "what can you do?" from
+two users is the same question. A cache hit skips the whole OpenAI
+conversation.
+
+A reply that needed tools is only valid while their results are: the entry
+records the (read-only) tool calls the model made and a fingerprint of their
+results, and a lookup re-runs those calls for the asking user (they are
+memoized, see `cdp_agent.tool_result_cache`) and only serves the reply if
+the fingerprint still matches. Replies that involved a write tool, an error
+or a cut-short conversation are never cached.
+
+Static replies and state-dependent replies get separate TTLs, and a full
+cache evicts the least frequently used entry.
+"""
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+
+from cache import LRUTTLCache
+
+RESPONSE_CACHE_SIZE = 512
+# Replies that used no tools
+RESPONSE_CACHE_TTL_SEC = 6 * 3600
+# Replies built from tool results; re-validated on every hit anyway
+RESPONSE_CACHE_STATEFUL_TTL_SEC = 300
+
+# Stands in for the asking user's handle in keys, tool arguments and replies
+AUTHOR_PLACEHOLDER = "\x00author\x00"
+
+_WHITESPACE = re.compile(r"\s+")
+# Trailing punctuation and emoji-style symbols don't change the question
+_TRAILING = re.compile(r"[\s\W_]+$")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING.sub("", text) or text
+
+
+def _with_placeholder(text: str, author: str) -> str:
+    return re.sub(re.escape(author), AUTHOR_PLACEHOLDER, text, flags=re.IGNORECASE)
+
+
+def _fingerprint(results: list) -> str:
+    return hashlib.sha256(json.dumps(results).encode()).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE, ttl_sec=RESPONSE_CACHE_TTL_SEC,
+                 stateful_ttl_sec=RESPONSE_CACHE_STATEFUL_TTL_SEC, policy="lfu", clock=time.monotonic):
+        self.stateful_ttl_sec = stateful_ttl_sec
+        self._cache = LRUTTLCache(max_size=max_size, ttl_sec=ttl_sec, clock=clock, policy=policy)
+        self.stale = 0
+
+    def key(self, text: str, context: list, author: str) -> str:
+        """Cache key for a question with its thread context (nearest first)."""
+        parts = [_with_placeholder(normalize_text(part), author.casefold()) for part in [text, *context]]
+        return hashlib.sha256("\n--\n".join(parts).encode()).hexdigest()
+
+    def lookup(self, key: str, author: str, run_tool):
+        """The cached reply for `author`, or None.
+
+        `run_tool(name, arguments)` runs a read-only tool call and returns its
+        result; it is used to check a state-dependent reply is still current.
+        """
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry["tool_calls"]:
+            try:
+                results = [
+                    _with_placeholder(run_tool(name, arguments.replace(AUTHOR_PLACEHOLDER, author)), author)
+                    for name, arguments in entry["tool_calls"]]
+            except Exception as e:
+                print(f"Error re-checking cached response: {e}")
+                return None
+            if _fingerprint(results) != entry["fingerprint"]:
+                self.stale += 1
+                return None
+        return entry["reply"].replace(AUTHOR_PLACEHOLDER, author)
+
+    def store(self, key: str, author: str, reply: str, tool_calls: list, read_only_tools) -> bool:
+        """Cache a finished reply. `tool_calls` are `(name, arguments, result)`
+        with `result` None for calls that failed. Returns whether it was cached.
+        """
+        if any(result is None or name not in read_only_tools or result.startswith(("Error", "Contract error"))
+               for name, _, result in tool_calls):
+            return False
+        # Identical calls within one conversation only need checking once.
+        calls = list(dict.fromkeys(
+            (name, _with_placeholder(arguments, author)) for name, arguments, _ in tool_calls))
+        results = list(dict.fromkeys(
+            (name, _with_placeholder(arguments, author), _with_placeholder(result, author))
+            for name, arguments, result in tool_calls))
+        self._cache.set(key, {
+            "reply": _with_placeholder(reply, author),
+            "tool_calls": calls,
+            "fingerprint": _fingerprint([result for _, _, result in results]),
+        }, ttl_sec=self.stateful_ttl_sec if calls else None)
+        return True
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "stale": self.stale}
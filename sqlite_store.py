@@ -0,0 +1,51 @@
+"""
+Shared setup for the bot's SQLite stores.
+
+The journal, thread index, ticket index and thread summaries each keep one
+connection in autocommit mode and WAL, so readers don't wait on the writer.
+Pipeline stages call in from worker threads, so the connection is shared
+behind a lock. `SQLiteStore` holds that setup, plus the explicit transaction
+that multi-statement writes use.
+"""
+
+from contextlib import contextmanager
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """Base class for a store with one connection (`_conn`) guarded by `_lock`.
+
+    Subclasses list their `CREATE ... IF NOT EXISTS` statements in `SCHEMA`.
+
+    Args:
+        path (str): The database file.
+        synchronous (str, optional): `PRAGMA synchronous` level, e.g. "NORMAL".
+    """
+
+    SCHEMA = ()
+
+    def __init__(self, path, synchronous=None):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            if synchronous is not None:
+                self._conn.execute(f"PRAGMA synchronous={synchronous}")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    @contextmanager
+    def _transaction(self):
+        """Run the block as one write transaction. The caller holds `_lock`."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
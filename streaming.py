@@ -0,0 +1,194 @@
+"""
+Incremental assembly of streamed chat completions.
+
+`StreamAssembler` is fed `ChatCompletionChunk`s as they arrive and keeps
+track of:
+
+- the `<thinking>`/`<response>` structure of the content, so the reply text
+  is known the moment `</response>` closes (the rest of the stream can then
+  be dropped),
+- tool-call deltas, so each tool call is handed over as soon as it is
+  complete (i.e. when the next call starts or the message finishes) rather
+  than when the whole message is done.
+
+`completion()` turns what has been received into a regular `ChatCompletion`,
+so callers handle streamed and non-streamed responses the same way.
+
+Usage only arrives with the last chunk, so a stream dropped after
+`</response>` has none. Its usage is then estimated locally with
+`context_packer.estimate_tokens` and marked `estimated=True`.
+"""
+
+import json
+import time
+
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from context_packer import estimate_tokens
+
+RESPONSE_OPEN = "<response>"
+RESPONSE_CLOSE = "</response>"
+# Per-message formatting tokens (role, separators) in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _message_text(message) -> str:
+    if not isinstance(message, dict):
+        message = message.model_dump(exclude_none=True)
+    text = message.get("content") or ""
+    if not isinstance(text, str):
+        text = json.dumps(text)
+    if message.get("tool_calls"):
+        text += json.dumps(message["tool_calls"])
+    return text
+
+
+def estimate_usage(messages, tools, completion: str) -> CompletionUsage:
+    """Usage estimated from the request and the completion text, marked `estimated`."""
+    prompt_tokens = sum(estimate_tokens(_message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+                        for message in messages)
+    if tools:
+        prompt_tokens += estimate_tokens(json.dumps(tools))
+    completion_tokens = estimate_tokens(completion)
+    return CompletionUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens, estimated=True)
+
+
+class StreamAssembler:
+
+    def __init__(self, on_tool_call=None):
+        # on_tool_call(tool_call) is called once per complete tool call
+        self.on_tool_call = on_tool_call
+        self.id = None
+        self.model = None
+        self.content = []
+        self.tool_calls = {}
+        self._announced = set()
+        self.finish_reason = None
+        self.usage = None
+        self.response_text = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.content)
+
+    @property
+    def response_closed(self) -> bool:
+        return self.response_text is not None
+
+    def feed(self, chunk) -> None:
+        self.id = self.id or chunk.id
+        self.model = self.model or chunk.model
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.index != 0:
+                continue
+            delta = choice.delta
+            if delta.content:
+                self.content.append(delta.content)
+                # The closing tag may be split across deltas
+                if self.response_text is None and RESPONSE_CLOSE in self.text[-len(delta.content) - len(RESPONSE_CLOSE):]:
+                    self._close_response()
+            for tool_delta in delta.tool_calls or ():
+                self._feed_tool_call(tool_delta)
+            if choice.finish_reason is not None:
+                self.finish_reason = choice.finish_reason
+                self._announce_tool_calls(upto=None)
+
+    def _close_response(self) -> None:
+        text = self.text
+        start = text.find(RESPONSE_OPEN)
+        end = text.find(RESPONSE_CLOSE)
+        if start != -1 and end > start:
+            self.response_text = text[start + len(RESPONSE_OPEN):end].strip()
+
+    def _feed_tool_call(self, tool_delta) -> None:
+        call = self.tool_calls.setdefault(tool_delta.index, {"id": None, "name": "", "arguments": []})
+        if tool_delta.id:
+            call["id"] = tool_delta.id
+        if tool_delta.function is not None:
+            if tool_delta.function.name:
+                call["name"] += tool_delta.function.name
+            if tool_delta.function.arguments:
+                call["arguments"].append(tool_delta.function.arguments)
+        # Calls stream one after another; a new index means the earlier ones are done.
+        self._announce_tool_calls(upto=tool_delta.index)
+
+    def _tool_call(self, index) -> ChatCompletionMessageToolCall:
+        call = self.tool_calls[index]
+        return ChatCompletionMessageToolCall(
+            id=call["id"], type="function",
+            function=Function(name=call["name"], arguments="".join(call["arguments"])))
+
+    def _announce_tool_calls(self, upto) -> None:
+        for index in sorted(self.tool_calls):
+            if upto is not None and index >= upto:
+                break
+            if index not in self._announced:
+                self._announced.add(index)
+                if self.on_tool_call is not None:
+                    self.on_tool_call(self._tool_call(index))
+
+    def completion(self, messages=(), tools=None) -> ChatCompletion:
+        """The completion received so far. A stream dropped after `</response>`
+        is reported as a normal stop with the content up to that point, and
+        with usage estimated from `messages`, `tools` (the request's) and the
+        content received."""
+        content = self.text
+        finish_reason = self.finish_reason
+        if finish_reason is None and self.response_closed and not self.tool_calls:
+            content = content[:content.find(RESPONSE_CLOSE) + len(RESPONSE_CLOSE)]
+            finish_reason = "stop"
+        tool_calls = [self._tool_call(index) for index in sorted(self.tool_calls)] or None
+        usage = self.usage
+        if usage is None:
+            arguments = "".join(call.function.arguments for call in tool_calls or ())
+            usage = estimate_usage(messages, tools, self.text + arguments)
+        return ChatCompletion(
+            id=self.id or "stream",
+            object="chat.completion",
+            created=int(time.time()),
+            model=self.model or "",
+            choices=[Choice(
+                index=0,
+                finish_reason=finish_reason or "stop",
+                message=ChatCompletionMessage(role="assistant", content=content or None, tool_calls=tool_calls),
+            )],
+            usage=usage,
+        )
+
+
+def stream_completion(client, on_tool_call=None, stop_after_response=True, **request) -> ChatCompletion:
+    """Run a streaming chat completion and return it assembled.
+
+    With `stop_after_response`, the stream is closed as soon as `</response>`
+    closes (unless the model is making tool calls).
+    """
+    assembler = StreamAssembler(on_tool_call)
+    stream = client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request)
+    try:
+        for chunk in stream:
+            assembler.feed(chunk)
+            if stop_after_response and assembler.response_closed and not assembler.tool_calls:
+                break
+    finally:
+        stream.close()
+    return assembler.completion(request.get("messages", ()), request.get("tools"))
+
+
+async def async_stream_completion(client, on_tool_call=None, stop_after_response=True, **request) -> ChatCompletion:
+    """Async `stream_completion`."""
+    assembler = StreamAssembler(on_tool_call)
+    stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request)
+    try:
+        async for chunk in stream:
+            assembler.feed(chunk)
+            if stop_after_response and assembler.response_closed and not assembler.tool_calls:
+                break
+    finally:
+        await stream.close()
+    return assembler.completion(request.get("messages", ()), request.get("tools"))
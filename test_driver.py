@@ -3,10 +3,8 @@ AI Driver script for monitoring Bluesky notifications and responding to mentions
 from allowlisted users using OpenAI.
 """
 
-import api
 import cdp_agent
-import os
-import json
+from conversation import run_conversation
 import re
 
 
@@ -43,30 +41,9 @@ def get_ai_response(agent: dict, user: str,prompt: str) -> str:
                         "  - Do not call any other function other than `get_wallet_details`, `get_balance`, or `get_valid_ticket`!")
         }
     ]
-    
-    while True:
-        response = api.generate_response(messages, tools=agent["tools"])
-        finished = False
-        for choice in response.choices:
-            if choice.finish_reason == "tool_calls":
-                messages.append(choice.message)
-                results = cdp_agent.process_tool_calls(agent["wallet"], agent["Cdp"], choice.message)
-                print(results)
-                for result in results:
-                    function_call_result_message = {
-                        "role": "tool",
-                        "content": json.dumps(result["result"]),
-                        "tool_call_id": result["id"]
-                    }
-                    messages.append(function_call_result_message)
-            elif choice.finish_reason == "stop":
-                finished = True
-                break
-
-        if finished:
-            break
 
-    response = response.choices[0].message.content
+    result = run_conversation(agent, messages)
+    response = result.content
     print(f"\nFull AI Response: {response}\n")
     if re.search(r'<response>(.*?)</response>', response, re.DOTALL):
         return re.search(r'<response>(.*?)</response>', response, re.DOTALL).group(1).strip()
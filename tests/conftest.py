@@ -0,0 +1,5 @@
+import os
+
+# api.py reads the Bluesky settings at import; nothing here logs in.
+for name in ("BLUESKY_USERNAME", "BLUESKY_PASSWORD", "BLUESKY_HANDLE", "BLUESKY_ALLOWED_USERS"):
+    os.environ.setdefault(name, "test.bsky.social")
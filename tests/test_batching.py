@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from batching import Coalescer
+
+
+class Recorder(Coalescer):
+
+    def __init__(self, dedupe=False, fail=False):
+        super().__init__(window_sec=0.01, max_batch=3, dedupe=dedupe)
+        self.fail = fail
+        self.batches = []
+
+    async def run_batch(self, items):
+        self.batches.append(items)
+        if self.fail:
+            raise RuntimeError("down")
+        return [item.upper() for item in items]
+
+
+def test_requests_in_one_window_share_a_batch():
+    async def main():
+        coalescer = Recorder()
+        results = await asyncio.gather(*(coalescer.request(item) for item in ["a", "b", "a", "c"]))
+        return coalescer.batches, results
+
+    batches, results = asyncio.run(main())
+    # max_batch flushes the first three at once
+    assert batches == [["a", "b", "a"], ["c"]]
+    assert results == ["A", "B", "A", "C"]
+
+
+def test_dedupe_shares_one_slot():
+    async def main():
+        coalescer = Recorder(dedupe=True)
+        results = await asyncio.gather(*(coalescer.request(item) for item in ["a", "b", "a"]))
+        return coalescer.batches, results
+
+    batches, results = asyncio.run(main())
+    assert batches == [["a", "b"]]
+    assert results == ["A", "B", "A"]
+
+
+def test_failure_reaches_every_request():
+    async def main():
+        coalescer = Recorder(fail=True)
+        return await asyncio.gather(coalescer.request("a"), coalescer.request("b"), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(NotImplementedError):
+        asyncio.run(Coalescer(0.01, 1).request("a"))
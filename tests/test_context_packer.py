@@ -0,0 +1,30 @@
+from context_packer import SEPARATOR_TOKENS, ContextPacker, estimate_tokens, graphemes, truncate_tokens
+
+
+def test_pack_stays_within_budget():
+    packer = ContextPacker(budget_tokens=120, root_max_tokens=40, post_max_tokens=30)
+    ancestors = [f"post {i} " + "lorem ipsum dolor sit amet " * 20 for i in range(10)]
+    root = "the root post " + "consectetur adipiscing elit " * 30
+    context = packer.pack(ancestors, root=root, current="lorem")
+
+    used = sum(estimate_tokens(message) + SEPARATOR_TOKENS for message in context.messages)
+    assert used == context.tokens <= 120
+    assert context.messages[-1].startswith("the root post")
+    assert context.dropped + len(context.messages) == 11
+    assert context.tokens_saved > 0
+
+
+def test_short_context_is_kept_whole():
+    context = ContextPacker(budget_tokens=600).pack(["nearest", "older"], root="root")
+    assert context.messages == ["nearest", "older", "root"]
+    assert (context.dropped, context.truncated, context.tokens_saved) == (0, 0, 0)
+
+
+def test_truncation_keeps_graphemes_whole():
+    family = "\U0001F468‍\U0001F469‍\U0001F467"
+    text = ("hello " + family + " ") * 20
+    cut = truncate_tokens(text, 20)
+    assert estimate_tokens(cut) <= 20
+    assert cut.endswith("…")
+    clusters = graphemes(cut[:-1])
+    assert all(cluster in graphemes(text) for cluster in clusters)
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+import conversation
+import model_router
+from conversation import DEGRADED_RESPONSE, ConversationLimits, async_run_conversation, run_conversation
+
+AGENT = {"wallet": None, "Cdp": None, "tools": []}
+
+
+def completion(content=None, finish_reason="stop", tool_calls=None, tokens=100):
+    return ChatCompletion(
+        id="c", object="chat.completion", created=0, model="m",
+        choices=[Choice(index=0, finish_reason=finish_reason, message=ChatCompletionMessage(
+            role="assistant", content=content, tool_calls=tool_calls))],
+        usage=CompletionUsage(prompt_tokens=tokens - 20, completion_tokens=20, total_tokens=tokens))
+
+
+def tool_call_completion(tokens=100):
+    return completion(finish_reason="tool_calls", tokens=tokens, tool_calls=[ChatCompletionMessageToolCall(
+        id="t1", type="function", function=Function(name="get_balance", arguments="{}"))])
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Queue of completions the stubbed model returns, and the calls it got."""
+    queue, calls = [], []
+
+    def generate_response(messages, **kwargs):
+        calls.append(list(messages))
+        return queue.pop(0)
+
+    async def async_generate_response(messages, **kwargs):
+        return generate_response(messages, **kwargs)
+
+    monkeypatch.setattr(conversation.api, "generate_response", generate_response)
+    monkeypatch.setattr(conversation.api, "async_generate_response", async_generate_response)
+    monkeypatch.setattr(conversation.cdp_agent, "process_tool_calls", lambda wallet, Cdp, message, *args: [
+        {"id": tool_call.id, "result": "1 ETH"} for tool_call in message.tool_calls])
+    return queue, calls
+
+
+def test_stop_returns_the_answer(responses):
+    queue, calls = responses
+    queue.append(completion("<response>hi</response>"))
+    result = run_conversation(AGENT, [{"role": "user", "content": "hi"}])
+    assert (result.content, result.rounds, result.limit_hit) == ("<response>hi</response>", 1, None)
+    assert result.total_tokens == 100
+
+
+def test_tool_calls_are_run_and_fed_back(responses):
+    queue, calls = responses
+    queue.extend([tool_call_completion(), completion("<response>1 ETH</response>")])
+    result = run_conversation(AGENT, [{"role": "user", "content": "balance?"}])
+    assert result.content == "<response>1 ETH</response>"
+    assert result.tool_calls == [("get_balance", "{}", "1 ETH")]
+    assert [message["role"] for message in calls[1] if isinstance(message, dict)] == ["user", "tool"]
+
+
+@pytest.mark.parametrize("finish_reason", ["length", "content_filter"])
+def test_cut_off_answer_is_final_after_one_call(responses, finish_reason):
+    queue, calls = responses
+    queue.extend([completion("<thinking>and so on", finish_reason=finish_reason)] * 6)
+    result = asyncio.run(async_run_conversation(AGENT, [{"role": "user", "content": "hi"}]))
+    assert len(calls) == 1
+    assert result.content == DEGRADED_RESPONSE
+    assert result.limit_hit == finish_reason
+
+
+def test_cut_off_after_a_closed_response_keeps_it(responses):
+    queue, calls = responses
+    queue.append(completion("<response>short</response> and then", finish_reason="length"))
+    result = run_conversation(AGENT, [{"role": "user", "content": "hi"}])
+    assert (result.content, result.limit_hit) == ("<response>short</response> and then", None)
+
+
+def test_round_limit(responses):
+    queue, calls = responses
+    queue.extend([tool_call_completion() for _ in range(5)])
+    result = run_conversation(AGENT, [{"role": "user", "content": "hi"}], ConversationLimits(max_rounds=3))
+    assert (result.rounds, result.limit_hit, result.content) == (3, "max_rounds", DEGRADED_RESPONSE)
+
+
+def test_token_limit(responses):
+    queue, calls = responses
+    queue.extend([tool_call_completion(tokens=400) for _ in range(5)])
+    result = asyncio.run(async_run_conversation(
+        AGENT, [{"role": "user", "content": "hi"}], ConversationLimits(max_tokens=1000)))
+    assert (result.rounds, result.limit_hit) == (3, "max_tokens")
+
+
+def test_fallback_usage_is_added_to_the_final_response():
+    answer = model_router.add_usage(completion("<response>ok</response>"), [completion("", tokens=50)])
+    assert (answer.usage.prompt_tokens, answer.usage.completion_tokens) == (110, 40)
+    assert not answer.usage.estimated
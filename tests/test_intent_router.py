@@ -0,0 +1,54 @@
+import pytest
+
+import ai_driver
+from intent_router import OTHER, Intent, IntentRouter
+
+
+@pytest.fixture(scope="module")
+def router():
+    router = ai_driver.create_intent_router()
+    router.log_file = None
+    return router
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("how many tickets do i have", "ticket_balance"),
+    ("@bot how many tickets do I have left?", "ticket_balance"),
+    ("what's my ticket balance", "ticket_balance"),
+    ("how do i buy tickets", "buy_tickets"),
+    ("where can i get more tickets", "buy_tickets"),
+    ("help", "help"),
+    ("what can you do", "help"),
+])
+def test_routes_common_questions(router, text, intent):
+    match = router.classify(text)
+    assert match.intent == intent
+    assert router.matches(text)
+
+
+@pytest.mark.parametrize("text", [
+    "how do i get eth",
+    "how do i buy eth",
+    "where can i get more eth",
+    "i want more eth",
+    "what can you do with my tickets",
+    "what is the price of eth",
+    "how many tickets have been sold",
+])
+def test_leaves_other_questions_to_the_llm(router, text):
+    assert not router.matches(text)
+    assert router.route(text, num_tickets="1") is None
+
+
+def test_long_mentions_are_not_routed(router):
+    assert router.classify("how many tickets do i have and also can you tell me a long story please").source == "length"
+
+
+def test_classifier_match_needs_a_keyword():
+    router = IntentRouter(log_file=None)
+    router.register(Intent("greeting", rules=[], examples=["hello there", "hi there"],
+                           render=lambda **facts: "hi", keywords=[r"\bhello\b"]))
+    router.add_other_examples(["send eth", "tell me a joke"])
+    assert router.classify("hello there").intent == "greeting"
+    match = router.classify("hi there")
+    assert (match.intent, match.source) == (OTHER, "keyword")
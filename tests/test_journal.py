@@ -0,0 +1,150 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import ai_driver
+from journal import FINAL_STAGES, STAGES, Journal, stage_reached
+from notifications import Mention
+from pipeline import Job
+
+MENTION = Mention("at://m/1", "cid1", "alice.bsky.social", "how much eth do you have?", "mention")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.db")
+
+
+def test_add_is_idempotent(path):
+    journal = Journal(path)
+    assert journal.add(MENTION.uri, MENTION.root_uri, MENTION.to_dict())
+    assert not journal.add(MENTION.uri, MENTION.root_uri, MENTION.to_dict())
+    assert journal.get(MENTION.uri) == ("fetched", {})
+    assert journal.get("at://unknown") == (None, {})
+    journal.close()
+
+
+def test_advance_merges_data(path):
+    journal = Journal(path)
+    journal.add(MENTION.uri, MENTION.root_uri, MENTION.to_dict())
+    journal.advance(MENTION.uri, "ticket_checked", num_tickets="2", context=["a"])
+    journal.advance(MENTION.uri, "generated", reply="hi", paid=True)
+    assert journal.get(MENTION.uri) == (
+        "generated", {"num_tickets": "2", "context": ["a"], "reply": "hi", "paid": True})
+    journal.close()
+
+
+@pytest.mark.parametrize("stage", STAGES + ("skipped",))
+def test_resume_after_crash_at_each_stage(path, stage):
+    journal = Journal(path)
+    journal.add(MENTION.uri, MENTION.root_uri, MENTION.to_dict())
+    if stage != "fetched":
+        journal.advance(MENTION.uri, stage, reply="hi")
+    # Crash: the connection goes away without any cleanup
+    del journal
+
+    reopened = Journal(path)
+    unfinished = reopened.unfinished()
+    if stage in FINAL_STAGES:
+        assert unfinished == []
+    else:
+        [(uri, key, mention)] = unfinished
+        assert (uri, key) == (MENTION.uri, MENTION.root_uri)
+        assert Mention.from_dict(mention).to_dict() == MENTION.to_dict()
+        assert reopened.get(uri)[0] == stage
+    reopened.close()
+
+
+def test_stage_reached():
+    assert stage_reached("generated", "ticket_checked")
+    assert stage_reached("generated", "generated")
+    assert not stage_reached("generated", "ticket_completed")
+    assert stage_reached("skipped", "posted")
+
+
+class FakeIndexer:
+    def __init__(self):
+        self.calls = []
+
+    def mark_submitted(self, job_id):
+        self.calls.append(("submitted", job_id))
+
+    def release(self, job_id):
+        self.calls.append(("release", job_id))
+
+
+@pytest.fixture
+def driver(path, monkeypatch):
+    """Journal, agent and a record of the side effects of post_reply."""
+    journal = Journal(path)
+    journal.add(MENTION.uri, MENTION.root_uri, MENTION.to_dict())
+    effects = []
+
+    def complete_ticket(wallet, cdp, handle):
+        effects.append(("complete", handle))
+        return "Successfully completed ticket"
+
+    async def reply_post(mention, root, text):
+        effects.append(("post", mention.uri))
+        return SimpleNamespace(uri="at://bot/reply")
+
+    monkeypatch.setattr(ai_driver.completeTicketAction, "complete_ticket", complete_ticket)
+    monkeypatch.setattr(ai_driver.cdp_agent, "invalidate_tool_results", lambda wallet: None)
+    monkeypatch.setattr(ai_driver.api, "async_bluesky_reply_post", reply_post)
+    monkeypatch.setattr(ai_driver.api, "bluesky_has_responded_to", lambda uri: ("post", uri) in effects)
+    monkeypatch.setattr(ai_driver, "get_thread_summaries", lambda: SimpleNamespace(
+        get=lambda uri: None, update=lambda *args: None))
+    agent = {"wallet": None, "Cdp": None, "ticket_indexer": FakeIndexer()}
+    yield journal, agent, effects
+    journal.close()
+
+
+def post(journal, agent):
+    return asyncio.run(ai_driver.post_reply(agent, journal, Job(MENTION.root_uri, MENTION)))
+
+
+def test_resume_at_generated_completes_and_posts(driver):
+    journal, agent, effects = driver
+    journal.advance(MENTION.uri, "generated", reply="hi", paid=True, thread_messages=[])
+    assert post(journal, agent)
+    assert effects == [("complete", MENTION.handle), ("post", MENTION.uri)]
+    assert journal.get(MENTION.uri)[0] == "posted"
+
+
+def test_resume_after_ticket_completed_does_not_charge_again(driver):
+    journal, agent, effects = driver
+    journal.advance(MENTION.uri, "ticket_completed", reply="hi", paid=True, thread_messages=[])
+    assert post(journal, agent)
+    assert effects == [("post", MENTION.uri)]
+
+
+def test_resume_after_posting_does_not_post_twice(driver):
+    journal, agent, effects = driver
+    journal.advance(MENTION.uri, "ticket_completed", reply="hi", paid=True, thread_messages=[])
+    # The reply went out but the crash came before the journal recorded it
+    effects.append(("post", MENTION.uri))
+    assert post(journal, agent)
+    assert effects == [("post", MENTION.uri)]
+    assert journal.get(MENTION.uri)[0] == "posted"
+
+
+def test_resume_at_generated_skips_generation(driver, monkeypatch):
+    journal, agent, effects = driver
+    journal.advance(MENTION.uri, "generated", reply="hi", paid=True)
+
+    async def generate(*args):
+        raise AssertionError("regenerated")
+
+    monkeypatch.setattr(ai_driver, "generate_ai_reply", generate)
+    job = Job(MENTION.root_uri, MENTION)
+    assert asyncio.run(ai_driver.generate_reply(agent, journal, job))
+    assert job.data["reply"] == "hi"
+
+
+def test_degraded_reply_is_not_charged(driver):
+    journal, agent, effects = driver
+    journal.advance(MENTION.uri, "generated", reply="Sorry", paid=True, degraded=True)
+    assert post(journal, agent)
+    assert effects == [("post", MENTION.uri)]
+    assert agent["ticket_indexer"].calls == [("release", MENTION.uri)]
@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import ai_driver
+import notifications
+from notifications import HighWaterMark, iter_new_notifications, load_mark, save_mark
+from pipeline import Job
+
+
+def notification(n, indexed_at=None, reason="mention", is_read=False):
+    return SimpleNamespace(uri=f"at://n/{n}", indexed_at=indexed_at or f"2026-01-01T00:00:{n:02d}Z",
+                           reason=reason, is_read=is_read)
+
+
+def test_mark_covers_ties_by_uri():
+    mark = HighWaterMark()
+    assert not mark.covers(notification(1))
+    mark.advance(notification(2))
+    mark.advance(notification(3, indexed_at="2026-01-01T00:00:02Z"))
+    assert mark.indexed_at == "2026-01-01T00:00:02Z"
+    assert mark.uris == {"at://n/2", "at://n/3"}
+    assert mark.covers(notification(1))
+    assert mark.covers(notification(3, indexed_at="2026-01-01T00:00:02Z"))
+    # Same timestamp, not yet seen
+    assert not mark.covers(notification(4, indexed_at="2026-01-01T00:00:02Z"))
+    assert not mark.covers(notification(5))
+    mark.advance(notification(5))
+    assert mark.uris == {"at://n/5"}
+
+
+def test_mark_persists(tmp_path):
+    path = str(tmp_path / "state.json")
+    assert load_mark(path).indexed_at is None
+    mark = HighWaterMark("2026-01-01T00:00:05Z", ["at://n/5", "at://n/4"])
+    save_mark(mark, path)
+    loaded = load_mark(path)
+    assert (loaded.indexed_at, loaded.uris) == (mark.indexed_at, mark.uris)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Notifications (newest first) served in pages of `limit`; records the params."""
+    state = SimpleNamespace(items=[], requests=[])
+
+    async def list_notifications(params):
+        state.requests.append(params)
+        start = int(params.get("cursor", 0))
+        end = start + params["limit"]
+        return SimpleNamespace(notifications=state.items[start:end],
+                               cursor=str(end) if end < len(state.items) else None)
+
+    monkeypatch.setattr(notifications.api, "async_bluesky_list_notifications", list_notifications)
+    return state
+
+
+def drain(mark, limit=2):
+    async def collect():
+        return [page async for page in iter_new_notifications(mark, limit=limit)]
+    return [[item.uri for item in page] for page in asyncio.run(collect())]
+
+
+def test_pages_until_the_mark(server):
+    server.items = [notification(n) for n in (9, 8, 7, 6, 5, 4)]
+    mark = HighWaterMark()
+    mark.advance(notification(6))
+    assert drain(mark) == [["at://n/9", "at://n/8"], ["at://n/7"]]
+    # Nothing older than the mark was asked for
+    assert len(server.requests) == 2
+    assert mark.indexed_at == notification(6).indexed_at
+
+
+def test_first_start_stops_at_read_notifications(server):
+    server.items = [notification(9), notification(8), notification(7, is_read=True), notification(6)]
+    assert drain(HighWaterMark()) == [["at://n/9", "at://n/8"]]
+    assert len(server.requests) == 2
+
+
+def test_other_reasons_are_filtered(server):
+    server.items = [notification(9), notification(8, reason="like"), notification(7, reason="reply")]
+    assert drain(HighWaterMark(), limit=5) == [["at://n/9", "at://n/7"]]
+
+
+def test_mark_is_saved_once_jobs_are_done(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    seen = []
+
+    async def update_seen(seen_at):
+        seen.append(seen_at)
+
+    monkeypatch.setattr(ai_driver.api, "async_bluesky_update_seen", update_seen)
+    mark = HighWaterMark("2026-01-01T00:00:05Z", ["at://n/5"])
+
+    async def main():
+        job = Job("root", None)
+        commit = asyncio.create_task(ai_driver.commit_when_done([job], "now", mark, None))
+        await asyncio.sleep(0.01)
+        assert load_mark().indexed_at is None and not seen
+        job.done.set()
+        await commit
+
+    asyncio.run(main())
+    assert load_mark().indexed_at == "2026-01-01T00:00:05Z"
+    assert seen == ["now"]
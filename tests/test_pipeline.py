@@ -0,0 +1,79 @@
+import asyncio
+
+from pipeline import Job, Pipeline, Stage
+
+
+def run(pipeline, jobs):
+    async def producer(pipeline):
+        for job in jobs:
+            await pipeline.submit(job)
+
+    asyncio.run(pipeline.run(producer))
+
+
+def test_jobs_flow_through_every_stage():
+    seen = []
+
+    async def first(job):
+        job.data["first"] = True
+        return True
+
+    async def second(job):
+        seen.append((job.payload, job.data["first"]))
+        return True
+
+    run(Pipeline([Stage("first", first, workers=2), Stage("second", second)]),
+        [Job(key, key) for key in "abc"])
+    assert sorted(seen) == [("a", True), ("b", True), ("c", True)]
+
+
+def test_same_key_jobs_run_in_order_one_at_a_time():
+    events = []
+
+    async def first(job):
+        events.append(("start", job.payload))
+        await asyncio.sleep(0.01 if job.payload == 0 else 0)
+        return True
+
+    async def second(job):
+        await asyncio.sleep(0.01)
+        events.append(("end", job.payload))
+        return True
+
+    run(Pipeline([Stage("first", first, workers=4), Stage("second", second, workers=4)]),
+        [Job("thread", n) for n in range(3)])
+    assert events == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+
+
+def test_long_thread_does_not_block_other_keys():
+    finished = []
+
+    async def stage(job):
+        await asyncio.sleep(0.01)
+        finished.append(job.key)
+        return True
+
+    # More jobs in one thread than there are workers
+    jobs = [Job("busy", n) for n in range(10)] + [Job("other", 0)]
+    run(Pipeline([Stage("only", stage, workers=2)], queue_size=4), jobs)
+    assert finished.index("other") < 3
+
+
+def test_dropped_and_failed_jobs_release_their_key():
+    reached, errors = [], []
+
+    async def first(job):
+        if job.payload == "boom":
+            raise RuntimeError("boom")
+        return job.payload != "drop"
+
+    async def second(job):
+        reached.append(job.payload)
+        return True
+
+    pipeline = Pipeline([Stage("first", first), Stage("second", second)],
+                        on_error=lambda job, error: errors.append((job.payload, str(error))))
+    run(pipeline, [Job("thread", payload) for payload in ("boom", "drop", "ok")])
+    assert reached == ["ok"]
+    assert errors == [("boom", "boom")]
+    assert not pipeline._tails
@@ -0,0 +1,67 @@
+import pytest
+
+from response_cache import ResponseCache
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_hit_is_shared_between_users(clock):
+    cache = ResponseCache(clock=clock)
+    key = cache.key("What can you do?", [], "alice.bsky.social")
+    assert cache.lookup(key, "alice.bsky.social", run_tool=None) is None
+    assert cache.store(key, "alice.bsky.social", "Hi @alice.bsky.social, I answer questions.", [], set())
+
+    other = cache.key("what can you do", [], "bob.bsky.social")
+    assert other == key
+    assert cache.lookup(other, "bob.bsky.social", run_tool=None) == "Hi @bob.bsky.social, I answer questions."
+
+
+def test_different_context_misses(clock):
+    cache = ResponseCache(clock=clock)
+    cache.store(cache.key("why?", ["it rained"], "alice"), "alice", "Clouds.", [], set())
+    assert cache.lookup(cache.key("why?", ["it snowed"], "alice"), "alice", run_tool=None) is None
+
+
+def test_entries_expire(clock):
+    cache = ResponseCache(ttl_sec=60, stateful_ttl_sec=10, clock=clock)
+    static = cache.key("help", [], "alice")
+    stateful = cache.key("my balance", [], "alice")
+    cache.store(static, "alice", "I help.", [], set())
+    cache.store(stateful, "alice", "You have 1 ETH.", [("get_balance", "{}", "1 ETH")], {"get_balance"})
+
+    run_tool = lambda name, arguments: "1 ETH"
+    clock.now = 9
+    assert cache.lookup(stateful, "alice", run_tool) == "You have 1 ETH."
+    clock.now = 11
+    assert cache.lookup(stateful, "alice", run_tool) is None
+    assert cache.lookup(static, "alice", run_tool) == "I help."
+    clock.now = 61
+    assert cache.lookup(static, "alice", run_tool) is None
+
+
+def test_stale_tool_results_miss(clock):
+    cache = ResponseCache(clock=clock)
+    key = cache.key("my balance", [], "alice")
+    cache.store(key, "alice", "You have 1 ETH.", [("get_balance", "{}", "1 ETH")], {"get_balance"})
+    assert cache.lookup(key, "alice", lambda name, arguments: "2 ETH") is None
+    assert cache.stats()["stale"] == 1
+
+
+def test_write_tools_and_errors_are_not_cached(clock):
+    cache = ResponseCache(clock=clock)
+    key = cache.key("send it", [], "alice")
+    assert not cache.store(key, "alice", "Sent.", [("transfer", "{}", "ok")], {"get_balance"})
+    assert not cache.store(key, "alice", "Hm.", [("get_balance", "{}", "Error: down")], {"get_balance"})
+    assert cache.lookup(key, "alice", run_tool=None) is None
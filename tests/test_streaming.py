@@ -0,0 +1,76 @@
+from openai.types.chat import ChatCompletionChunk
+
+from streaming import StreamAssembler
+
+
+def chunk(content=None, tool_calls=None, finish_reason=None, usage=None):
+    delta = {}
+    if content is not None:
+        delta["content"] = content
+    if tool_calls is not None:
+        delta["tool_calls"] = tool_calls
+    return ChatCompletionChunk.model_validate({
+        "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        "usage": usage,
+    })
+
+
+def tool_delta(index, id=None, name=None, arguments=None):
+    function = {}
+    if name is not None:
+        function["name"] = name
+    if arguments is not None:
+        function["arguments"] = arguments
+    return {"index": index, "id": id, "type": "function" if id else None, "function": function}
+
+
+def test_closing_tag_split_across_deltas():
+    assembler = StreamAssembler()
+    for content in ["<thinking>hm</thinking><response>", "Hello there", "</resp"]:
+        assembler.feed(chunk(content))
+    assert not assembler.response_closed
+    assembler.feed(chunk("onse>"))
+    assert assembler.response_closed
+    assert assembler.response_text == "Hello there"
+
+
+def test_tool_calls_are_announced_once_complete():
+    announced = []
+    assembler = StreamAssembler(on_tool_call=lambda call: announced.append(call.function.name))
+    assembler.feed(chunk(tool_calls=[tool_delta(0, id="call_a", name="get_balance")]))
+    assembler.feed(chunk(tool_calls=[tool_delta(0, arguments='{"asset_id": ')]))
+    assembler.feed(chunk(tool_calls=[tool_delta(0, arguments='"eth"}')]))
+    assert announced == []
+    assembler.feed(chunk(tool_calls=[tool_delta(1, id="call_b", name="get_wallet_details", arguments="{}")]))
+    assert announced == ["get_balance"]
+    assembler.feed(chunk(finish_reason="tool_calls"))
+    assert announced == ["get_balance", "get_wallet_details"]
+
+    message = assembler.completion().choices[0].message
+    assert [call.id for call in message.tool_calls] == ["call_a", "call_b"]
+    assert message.tool_calls[0].function.arguments == '{"asset_id": "eth"}'
+
+
+def test_dropped_stream_gets_estimated_usage():
+    assembler = StreamAssembler()
+    for content in ["<response>Hi", "</response>", "\ntrailing"]:
+        assembler.feed(chunk(content))
+    messages = [{"role": "user", "content": "hello"}]
+    completion = assembler.completion(messages)
+    choice = completion.choices[0]
+    assert choice.finish_reason == "stop"
+    assert choice.message.content == "<response>Hi</response>"
+    assert completion.usage.estimated
+    assert completion.usage.prompt_tokens > 0 and completion.usage.completion_tokens > 0
+
+
+def test_reported_usage_is_kept():
+    assembler = StreamAssembler()
+    assembler.feed(chunk("<response>Hi</response>", finish_reason="stop"))
+    assembler.feed(ChatCompletionChunk.model_validate({
+        "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini",
+        "choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 5, "total_tokens": 17}}))
+    usage = assembler.completion([{"role": "user", "content": "hello"}]).usage
+    assert (usage.prompt_tokens, usage.completion_tokens) == (12, 5)
+    assert not getattr(usage, "estimated", False)
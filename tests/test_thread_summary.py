@@ -0,0 +1,37 @@
+import pytest
+
+from thread_summary import SUMMARY_LABEL, ThreadSummaryStore, fold_summary
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ThreadSummaryStore(path=str(tmp_path / "summaries.db"), keep_recent=2, summarize=fold_summary)
+    yield store
+    store.close()
+
+
+def test_window_overflow_is_folded_into_the_summary(store):
+    first = store.update(None, "root", ["a: one", "b: two", "bot: three"], "reply1")
+    assert (first.summary, first.recent, first.message_count) == ("a: one", ["b: two", "bot: three"], 3)
+    second = store.update(store.get("reply1"), "root", ["a: four", "bot: five"], "reply2")
+    assert second.recent == ["a: four", "bot: five"]
+    assert second.summary == "a: one b: two bot: three"
+    assert second.previous_messages() == ["bot: five", "a: four", f"{SUMMARY_LABEL} a: one b: two bot: three"]
+
+
+def test_branches_keep_separate_summaries(store):
+    trunk = store.update(None, "root", ["a: hi", "bot: hello"], "reply1")
+    store.update(trunk, "root", ["a: left", "bot: left answer", "a: more"], "left")
+    store.update(trunk, "root", ["c: right", "bot: right answer"], "right")
+    assert "left" not in " ".join(store.get("right").previous_messages())
+    assert store.get("left").recent == ["bot: left answer", "a: more"]
+    # The shared start is unchanged
+    assert store.get("reply1").recent == ["a: hi", "bot: hello"]
+
+
+def test_nearest_picks_the_closest_summarized_reply(store):
+    store.update(None, "root", ["a: hi"], "reply1")
+    store.update(store.get("reply1"), "root", ["a: again"], "reply2")
+    assert store.nearest(["post9", "reply2", "post5", "reply1"]).last_uri == "reply2"
+    assert store.nearest(["post9"]) is None
+    assert store.nearest([]) is None
@@ -0,0 +1,52 @@
+import asyncio
+
+from web3 import Web3
+
+from cdp_agentkit_core.actions.complete_tickets import TICKET_COMPLETED_BY_HASH_TOPIC, completed_handles
+from cdp_agentkit_core.actions.ticket_system import TICKET_SYSTEM_ADDRESS_TESTNET
+from ticket_batcher import TicketCompletionBatcher
+
+
+def completion_log(handle, address=TICKET_SYSTEM_ADDRESS_TESTNET):
+    return {"address": address, "topics": [TICKET_COMPLETED_BY_HASH_TOPIC, Web3.keccak(text=handle)]}
+
+
+def test_completed_handles_from_receipt_logs():
+    receipt = {"logs": [
+        completion_log("alice"),
+        completion_log("carol"),
+        completion_log("carol"),
+        # Another contract's log is ignored
+        completion_log("bob", address="0x" + "11" * 20),
+    ]}
+    assert completed_handles(receipt, ["alice", "bob", "carol", "carol", "carol"]) == [
+        True, False, True, True, False]
+
+
+def test_each_waiter_gets_its_own_result():
+    submitted = []
+
+    def submit(handles):
+        submitted.append(handles)
+        return [f"Successfully completed ticket for {handle}" if handle != "bob"
+                else f"No ticket available for {handle}" for handle in handles]
+
+    async def main():
+        batcher = TicketCompletionBatcher(submit, window_sec=0.01)
+        return await asyncio.gather(*(batcher.complete(handle) for handle in ("alice", "bob", "carol")))
+
+    results = asyncio.run(main())
+    assert submitted == [["alice", "bob", "carol"]]
+    assert results == ["Successfully completed ticket for alice", "No ticket available for bob",
+                       "Successfully completed ticket for carol"]
+
+
+def test_submit_error_resolves_every_waiter():
+    def submit(handles):
+        raise RuntimeError("rpc down")
+
+    async def main():
+        batcher = TicketCompletionBatcher(submit, window_sec=10, max_batch=2)
+        return await asyncio.gather(batcher.complete("alice"), batcher.complete("bob"))
+
+    assert asyncio.run(main()) == ["Error completing tickets: rpc down"] * 2
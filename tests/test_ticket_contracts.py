@@ -0,0 +1,69 @@
+"""Deploys the Solidity contracts to an in-process eth-tester chain. Skipped
+when solc can't be found or downloaded (see compile_contracts.py)."""
+
+import pytest
+from web3.exceptions import ContractLogicError
+
+import compile_contracts
+from cdp_agentkit_core.actions.complete_tickets import completed_handles
+from ticket_gas_benchmark import TICKET_PRICE_WEI, deploy, handle_hashes, local_web3
+
+
+@pytest.fixture(scope="module")
+def compiled():
+    try:
+        return {name: compile_contracts.compile_contract(file_name, name)
+                for file_name, name in compile_contracts.CONTRACTS.items()}
+    except (SystemExit, Exception) as e:
+        pytest.skip(f"Can't compile the contracts: {e}")
+
+
+@pytest.fixture
+def web3():
+    return local_web3()
+
+
+def buy(web3, ticket_system, handle, amount):
+    ticket_system.functions.buyTickets(handle, amount).transact(
+        {"from": web3.eth.accounts[1], "value": TICKET_PRICE_WEI * amount})
+
+
+def test_complete_tickets_skips_handles_without_tickets(compiled, web3, monkeypatch):
+    v2 = deploy(web3, compiled["TicketSystemV2"])
+    monkeypatch.setenv("TICKET_SYSTEM_ADDRESS", v2.address)
+    buy(web3, v2, "alice", 2)
+    buy(web3, v2, "carol", 1)
+    handles = ["alice", "bob", "carol", "alice"]
+    tx_hash = v2.functions.completeTickets(handle_hashes(handles)).transact({"from": web3.eth.accounts[0]})
+    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    assert completed_handles(receipt, handles) == [True, False, True, True]
+    assert tuple(v2.functions.getTicketInfo("alice").call()) == (2, 2, 0)
+    assert tuple(v2.functions.getTicketInfo("bob").call()) == (0, 0, 0)
+
+
+def test_migration_imports_balances_then_opens_sales(compiled, web3):
+    owner = web3.eth.accounts[0]
+    v1 = deploy(web3, compiled["TicketSystem"])
+    buy(web3, v1, "alice", 3)
+    v1.functions.completeTicket("alice").transact({"from": owner})
+
+    contract = web3.eth.contract(abi=compiled["TicketSystemV2"]["abi"], bytecode=compiled["TicketSystemV2"]["bin"])
+    receipt = web3.eth.wait_for_transaction_receipt(contract.constructor(owner).transact({"from": owner}))
+    v2 = web3.eth.contract(address=receipt.contractAddress, abi=compiled["TicketSystemV2"]["abi"])
+    funded, completed, _ = v1.functions.getTicketInfo("alice").call()
+    v2.functions.migrate(handle_hashes(["alice"]), [funded], [completed]).transact({"from": owner})
+    # Sales stay closed until the import is finalized
+    with pytest.raises(ContractLogicError):
+        buy(web3, v2, "bob", 1)
+    v2.functions.finalizeMigration().transact({"from": owner})
+
+    assert tuple(v2.functions.getTicketInfo("alice").call()) == (3, 1, 2)
+    buy(web3, v2, "alice", 1)
+    assert tuple(v2.functions.getTicketInfo("alice").call()) == (4, 1, 3)
+    with pytest.raises(ContractLogicError):
+        v2.functions.migrate(handle_hashes(["alice"]), [9], [0]).transact({"from": owner})
+
+
+def test_v1_has_no_batch_completion(compiled):
+    names = {entry.get("name") for entry in compiled["TicketSystem"]["abi"]}
+    assert "completeTicket" in names and "completeTickets" not in names
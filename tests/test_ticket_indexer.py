@@ -0,0 +1,271 @@
+import pytest
+from web3 import Web3
+
+import ticket_indexer
+from ticket_indexer import (
+    TICKET_COMPLETED_BY_HASH_TOPIC, TICKET_COMPLETED_TOPIC, TICKETS_PURCHASED_BY_HASH_TOPIC,
+    TICKETS_PURCHASED_TOPIC, TicketIndexer, handle_hash,
+)
+
+CONTRACT = "0x" + "ab" * 20
+
+
+class FakeChain:
+    """Stand-in for the parts of web3 the indexer uses."""
+
+    def __init__(self):
+        self.block_number = 0
+        self.logs = []
+        self.get_logs_calls = []
+        # handle -> (funded, completed) as `getTicketInfo` reports it
+        self.ticket_info = {}
+        self.eth = self
+
+    def mine(self, *logs):
+        self.block_number += 1
+        for log in logs:
+            self.logs.append((self.block_number, log))
+
+    def get_logs(self, params):
+        self.get_logs_calls.append((params["fromBlock"], params["toBlock"]))
+        topics = set(params["topics"][0])
+        return [log for block, log in self.logs
+                if params["fromBlock"] <= block <= params["toBlock"] and log["topics"][0] in topics]
+
+    def contract(self, address, abi):
+        chain = self
+
+        class Call:
+            def __init__(self, handle):
+                self.handle = handle
+
+            def call(self, block_identifier=None):
+                funded, completed = chain.ticket_info.get(self.handle, (0, 0))
+                return funded, completed, max(funded - completed, 0)
+
+        class Functions:
+            getTicketInfo = Call
+
+        class Contract:
+            functions = Functions
+
+        return Contract
+
+
+def purchased(handle, amount, by_hash=False):
+    topic = TICKETS_PURCHASED_BY_HASH_TOPIC if by_hash else TICKETS_PURCHASED_TOPIC
+    return {"topics": [topic, Web3.keccak(text=handle), b"\x00" * 32], "data": amount.to_bytes(32, "big")}
+
+
+def completed(handle, by_hash=False):
+    topic = TICKET_COMPLETED_BY_HASH_TOPIC if by_hash else TICKET_COMPLETED_TOPIC
+    return {"topics": [topic, Web3.keccak(text=handle)], "data": b""}
+
+
+@pytest.fixture
+def chain():
+    return FakeChain()
+
+
+@pytest.fixture
+def indexer(chain, tmp_path):
+    indexer = TicketIndexer(chain, CONTRACT, path=str(tmp_path / "ticket_index.db"), confirmations=0)
+    yield indexer
+    indexer.close()
+
+
+def synced(chain, indexer, *logs):
+    chain.mine(*logs)
+    indexer.sync()
+    return indexer
+
+
+def test_not_caught_up_before_first_sync(indexer):
+    assert indexer.get_ticket_info("alice") is None
+    assert indexer.reserve("alice", "m1") is None
+
+
+def test_apply_purchase_and_completion_topics(chain, indexer):
+    synced(chain, indexer, purchased("alice", 3), purchased("alice", 2, by_hash=True), purchased("bob", 1))
+    synced(chain, indexer, completed("alice"), completed("alice", by_hash=True))
+    assert indexer.get_ticket_info("alice") == (5, 2, 3)
+    assert indexer.get_ticket_info("bob") == (1, 0, 1)
+    assert indexer.get_ticket_info("carol") == (0, 0, 0)
+    assert dict((key, (funded, done)) for key, funded, done in indexer.all_balances()) == {
+        handle_hash("alice"): (5, 2), handle_hash("bob"): (1, 0)}
+
+
+def test_cursor_advances_and_only_new_blocks_are_read(chain, indexer):
+    synced(chain, indexer, purchased("alice", 1))
+    assert indexer.last_block == 1
+    chain.mine()
+    chain.mine(purchased("alice", 1))
+    assert indexer.sync() == 1
+    assert indexer.last_block == 3
+    assert chain.get_logs_calls == [(0, 1), (2, 3)]
+    assert indexer.get_ticket_info("alice") == (2, 0, 2)
+
+
+def test_sync_in_chunks_and_respects_confirmations(chain, tmp_path):
+    indexer = TicketIndexer(chain, CONTRACT, path=str(tmp_path / "chunks.db"), confirmations=2, chunk_blocks=2)
+    for _ in range(7):
+        chain.mine(purchased("alice", 1))
+    # Blocks 0-1, then 2-3 and 4-5
+    assert indexer.sync(max_chunks=1) == 1
+    assert not indexer.caught_up
+    assert indexer.last_block == 1
+    assert indexer.sync() == 4
+    assert indexer.caught_up
+    # Blocks 6 and 7 are not confirmed yet
+    assert indexer.last_block == 5
+    assert indexer.get_ticket_info("alice") == (5, 0, 5)
+    indexer.close()
+
+
+def test_cursor_survives_restart(chain, indexer, tmp_path):
+    synced(chain, indexer, purchased("alice", 2))
+    restarted = TicketIndexer(chain, CONTRACT, path=str(tmp_path / "ticket_index.db"), confirmations=0)
+    chain.mine(completed("alice"))
+    assert restarted.sync() == 1
+    assert restarted.get_ticket_info("alice") == (2, 1, 1)
+    restarted.close()
+
+
+def test_switching_contract_drops_old_balances(chain, indexer, tmp_path):
+    synced(chain, indexer, purchased("alice", 2))
+    assert indexer.reserve("alice", "m1") == 2
+    indexer.mark_no_tickets("bob")
+    indexer.close()
+    switched = TicketIndexer(chain, "0x" + "cd" * 20, path=str(tmp_path / "ticket_index.db"), confirmations=0)
+    assert switched.last_block is None
+    chain.logs.clear()
+    switched.sync()
+    assert switched.get_ticket_info("alice") == (0, 0, 0)
+    assert not switched.has_no_tickets("bob")
+    assert switched.reserve("alice", "m2", available=1) == 1
+    switched.close()
+
+
+def test_reopening_same_contract_keeps_state(chain, indexer, tmp_path):
+    synced(chain, indexer, purchased("alice", 2))
+    indexer.close()
+    reopened = TicketIndexer(chain, CONTRACT, path=str(tmp_path / "ticket_index.db"), confirmations=0)
+    assert reopened.last_block == 1
+    reopened.close()
+
+
+def test_reconcile_overwrites_drift(chain, indexer):
+    synced(chain, indexer, purchased("alice", 2))
+    chain.ticket_info["alice"] = (2, 0)
+    assert not indexer.reconcile("alice")
+    chain.ticket_info["alice"] = (4, 1)
+    assert indexer.reconcile("alice")
+    assert indexer.get_ticket_info("alice") == (4, 1, 3)
+
+
+def test_reconcile_clears_negative_cache(chain, indexer):
+    synced(chain, indexer)
+    indexer.mark_no_tickets("alice")
+    chain.ticket_info["alice"] = (1, 0)
+    assert indexer.reconcile("alice")
+    assert not indexer.has_no_tickets("alice")
+
+
+def test_reserve_claims_tickets_one_job_at_a_time(chain, indexer):
+    synced(chain, indexer, purchased("alice", 2))
+    assert indexer.reserve("alice", "m1") == 2
+    # Same job again is a no-op
+    assert indexer.reserve("alice", "m1") == 1
+    assert indexer.reserve("alice", "m2") == 1
+    assert indexer.reserve("alice", "m3") == 0
+    assert indexer.reserve("bob", "m4") == 0
+
+
+def test_release_gives_the_ticket_back(chain, indexer):
+    synced(chain, indexer, purchased("alice", 1))
+    assert indexer.reserve("alice", "m1") == 1
+    assert indexer.reserve("alice", "m2") == 0
+    indexer.release("m1")
+    assert indexer.reserve("alice", "m2") == 1
+
+
+def test_release_keeps_submitted_reservation(chain, indexer):
+    synced(chain, indexer, purchased("alice", 1))
+    assert indexer.reserve("alice", "m1") == 1
+    indexer.mark_submitted("m1")
+    indexer.release("m1")
+    assert indexer.reserve("alice", "m2") == 0
+
+
+def test_completion_event_settles_submitted_reservation(chain, indexer):
+    synced(chain, indexer, purchased("alice", 2))
+    assert indexer.reserve("alice", "m1") == 2
+    indexer.mark_submitted("m1")
+    # Still counted until the completion is indexed
+    assert indexer.reserve("alice", "m2") == 1
+    indexer.release("m2")
+    synced(chain, indexer, completed("alice"))
+    assert indexer.get_ticket_info("alice") == (2, 1, 1)
+    assert indexer.reserve("alice", "m2") == 1
+
+
+def test_expired_reservations_stop_counting(chain, indexer, monkeypatch):
+    synced(chain, indexer, purchased("alice", 1))
+    assert indexer.reserve("alice", "m1") == 1
+    monkeypatch.setattr(ticket_indexer.time, "time", lambda: 10 ** 10)
+    assert indexer.reserve("alice", "m2") == 1
+
+
+def test_reserve_with_on_chain_balance(chain, indexer):
+    synced(chain, indexer)
+    assert indexer.reserve("alice", "m1", available=1) == 1
+    assert indexer.reserve("alice", "m2", available=1) == 0
+
+
+def test_reserve_with_on_chain_balance_counts_submitted(chain, indexer):
+    synced(chain, indexer, purchased("alice", 2))
+    assert indexer.reserve("alice", "m1", available=2) == 2
+    indexer.mark_submitted("m1")
+    # The completion may still be pending, so the on-chain balance can't be trusted to include it
+    assert indexer.reserve("alice", "m2", available=2) == 1
+    assert indexer.reserve("alice", "m3", available=2) == 0
+    indexer.release("m2")
+    synced(chain, indexer, completed("alice"))
+    assert indexer.reserve("alice", "m3", available=1) == 1
+
+
+def test_negative_cache(chain, indexer):
+    synced(chain, indexer)
+    assert not indexer.has_no_tickets("alice")
+    indexer.mark_no_tickets("alice")
+    assert indexer.has_no_tickets("alice")
+    assert not indexer.has_no_tickets("bob")
+    synced(chain, indexer, purchased("alice", 1))
+    assert not indexer.has_no_tickets("alice")
+
+
+def test_mark_no_tickets_skipped_when_index_has_balance(chain, indexer):
+    synced(chain, indexer, purchased("alice", 1))
+    indexer.mark_no_tickets("alice")
+    assert not indexer.has_no_tickets("alice")
+
+
+def test_negative_cache_expires(chain, indexer, monkeypatch):
+    synced(chain, indexer)
+    indexer.mark_no_tickets("alice")
+    monkeypatch.setattr(ticket_indexer.time, "time", lambda: 10 ** 10)
+    assert not indexer.has_no_tickets("alice")
+
+
+def test_claim_canned_reply_once_per_window(chain, indexer, monkeypatch):
+    synced(chain, indexer)
+    assert indexer.claim_canned_reply("alice", "m1", window_sec=3600)
+    # The same job may claim again, e.g. after a restart
+    assert indexer.claim_canned_reply("alice", "m1", window_sec=3600)
+    assert not indexer.claim_canned_reply("alice", "m2", window_sec=3600)
+    assert indexer.claim_canned_reply("bob", "m3", window_sec=3600)
+    # Claiming doesn't put the handle in the negative cache
+    assert not indexer.has_no_tickets("alice")
+    now = ticket_indexer.time.time()
+    monkeypatch.setattr(ticket_indexer.time, "time", lambda: now + 3601)
+    assert indexer.claim_canned_reply("alice", "m2", window_sec=3600)
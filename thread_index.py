@@ -0,0 +1,70 @@
+"""
+Local index of the posts the bot has already replied to.
+
+Every successful reply records its parent and thread root URIs, so checking
+whether a mention has been answered is a local primary-key lookup instead of
+fetching the whole thread and scanning its replies. The index can be rebuilt
+from the bot's own author feed, e.g. after moving to a new machine.
+"""
+
+import time
+
+from sqlite_store import SQLiteStore
+
+THREAD_INDEX_DB_FILE = "thread_index.db"
+
+
+class ThreadIndex(SQLiteStore):
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS replies ("
+        " parent_uri TEXT PRIMARY KEY,"
+        " root_uri TEXT NOT NULL,"
+        " reply_uri TEXT,"
+        " created_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS replies_root ON replies (root_uri)",
+    )
+
+    def __init__(self, path=THREAD_INDEX_DB_FILE):
+        super().__init__(path)
+
+    def record(self, parent_uri: str, root_uri: str, reply_uri: str = None) -> None:
+        """Record that the bot replied to `parent_uri` in the thread `root_uri`."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO replies (parent_uri, root_uri, reply_uri, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                (parent_uri, root_uri, reply_uri, time.time()))
+
+    def has_responded(self, parent_uri: str) -> bool:
+        """Whether the bot has replied directly to `parent_uri`."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM replies WHERE parent_uri = ?", (parent_uri,)).fetchone()
+        return row is not None
+
+    def has_responded_in_thread(self, root_uri: str) -> bool:
+        """Whether the bot has replied anywhere in the thread rooted at `root_uri`."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM replies WHERE root_uri = ? LIMIT 1", (root_uri,)).fetchone()
+        return row is not None
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM replies LIMIT 1").fetchone()
+        return row is None
+
+    def record_feed_posts(self, feed) -> int:
+        """Record every reply found in a page of author feed items. Returns how many."""
+        count = 0
+        for feed_view in feed:
+            # Reposts show up in the author feed but are someone else's post.
+            if feed_view.reason is not None:
+                continue
+            reply = getattr(feed_view.post.record, "reply", None)
+            if reply is None:
+                continue
+            self.record(reply.parent.uri, reply.root.uri, feed_view.post.uri)
+            count += 1
+        return count
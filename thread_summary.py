@@ -0,0 +1,141 @@
+"""
+Rolling summaries for long conversations.
+
+For every reply the bot posts, the store keeps the last
+`KEEP_RECENT_MESSAGES` raw messages of the conversation leading up to it
+plus a summary of everything before them. Entries are keyed by the bot's
+reply, not the thread root: a thread can branch, and each branch is its own
+conversation. The next reply in a branch builds on the entry of the bot's
+nearest reply among its ancestors: the new messages (posts since that reply,
+the mention and the new reply) are appended, and whatever falls out of the
+raw window is folded into the summary. Only those messages and the old
+summary are sent to the summarizer, never the whole thread.
+
+Prompts in a branch with a summary carry the summary, the raw window and the
+posts written since the bot's last reply in it, instead of the thread's full
+history, so their size stays flat as the conversation grows.
+
+An entry is never changed once written (a new reply gets a new entry), so
+updates can't race.
+"""
+
+from dataclasses import dataclass
+import json
+import time
+
+import api
+from context_packer import truncate_tokens
+from sqlite_store import SQLiteStore
+
+THREAD_SUMMARY_DB_FILE = "thread_summaries.db"
+KEEP_RECENT_MESSAGES = 4
+SUMMARY_MAX_TOKENS = 150
+SUMMARY_TIMEOUT_SEC = 20
+# Prefix of the summary's entry in <previous_messages>
+SUMMARY_LABEL = "(Summary of the earlier conversation)"
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a Bluesky thread for an assistant that replies in it. "
+    "Given the current summary (if any) and the messages that follow it, write an updated summary in at most "
+    "three sentences. Keep who asked what, facts and numbers the assistant gave, and anything still open. "
+    "Write the summary inside a `<response>` tag."
+)
+
+
+@dataclass
+class ThreadSummary:
+    root_uri: str
+    summary: str
+    # Raw messages, oldest first
+    recent: list
+    # URI of the bot's reply this entry ends with (its key)
+    last_uri: str | None
+    message_count: int
+
+    def previous_messages(self) -> list:
+        """Summary and raw window for `<previous_messages>`, nearest first."""
+        messages = self.recent[::-1]
+        if self.summary:
+            messages.append(f"{SUMMARY_LABEL} {self.summary}")
+        return messages
+
+
+def fold_summary(summary: str, messages: list) -> str:
+    """Local summarizer: append the messages and keep the summary's start."""
+    return truncate_tokens(" ".join([summary, *messages]).strip(), SUMMARY_MAX_TOKENS)
+
+
+def summarize(summary: str, messages: list) -> str:
+    """Fold `messages` into `summary` with the model, falling back to `fold_summary`."""
+    previous = f"<summary>{summary}</summary>\n" if summary else ""
+    joined = "\n--\n".join(messages)
+    try:
+        response = api.generate_response([
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"{previous}<messages>{joined}</messages>"},
+        ], timeout=SUMMARY_TIMEOUT_SEC)
+        content = response.choices[0].message.content or ""
+        start, end = content.find("<response>"), content.find("</response>")
+        if start != -1 and end > start:
+            return truncate_tokens(content[start + len("<response>"):end].strip(), SUMMARY_MAX_TOKENS)
+        print("Thread summary answer has no <response> part, folding locally")
+    except Exception as e:
+        print(f"Error summarizing thread: {e}")
+    return fold_summary(summary, messages)
+
+
+class ThreadSummaryStore(SQLiteStore):
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS reply_summaries ("
+        " reply_uri TEXT PRIMARY KEY,"
+        " root_uri TEXT NOT NULL,"
+        " summary TEXT NOT NULL,"
+        " recent TEXT NOT NULL,"
+        " message_count INTEGER NOT NULL,"
+        " created_at REAL NOT NULL)",
+    )
+
+    def __init__(self, path=THREAD_SUMMARY_DB_FILE, keep_recent=KEEP_RECENT_MESSAGES, summarize=summarize):
+        super().__init__(path)
+        self.keep_recent = keep_recent
+        self.summarize = summarize
+
+    def get(self, reply_uri: str) -> ThreadSummary | None:
+        """The entry ending with the bot's reply `reply_uri`, if any."""
+        return self.nearest([reply_uri])
+
+    def nearest(self, uris: list) -> ThreadSummary | None:
+        """The entry of the first of `uris` (e.g. a mention's ancestors,
+        nearest first) that is one of the bot's summarized replies."""
+        if not uris:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT reply_uri, root_uri, summary, recent, message_count FROM reply_summaries"
+                f" WHERE reply_uri IN ({', '.join('?' * len(uris))})", uris).fetchall()
+        by_uri = {row[0]: row for row in rows}
+        for uri in uris:
+            if uri in by_uri:
+                reply_uri, root_uri, summary, recent, message_count = by_uri[uri]
+                return ThreadSummary(root_uri, summary, json.loads(recent), reply_uri, message_count)
+        return None
+
+    def update(self, previous: ThreadSummary | None, root_uri: str, messages: list,
+               reply_uri: str) -> ThreadSummary:
+        """Append `messages` (oldest first) to `previous` (the entry the
+        conversation continues from, None for a new one) and store the result
+        under the bot's new reply, folding whatever leaves the raw window
+        into the summary. Blocks on the summarizer."""
+        entry = previous or ThreadSummary(root_uri, "", [], None, 0)
+        recent = entry.recent + messages
+        overflow, recent = recent[:-self.keep_recent], recent[-self.keep_recent:]
+        summary = self.summarize(entry.summary, overflow) if overflow else entry.summary
+        entry = ThreadSummary(root_uri, summary, recent, reply_uri, entry.message_count + len(messages))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reply_summaries"
+                " (reply_uri, root_uri, summary, recent, message_count, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (reply_uri, root_uri, summary, json.dumps(recent), entry.message_count, time.time()))
+        return entry
@@ -0,0 +1,41 @@
+"""
+Coalesce ticket completions into batched `completeTickets` transactions.
+
+Each answered mention used to send its own `completeTicket` transaction.
+`TicketCompletionBatcher.complete` instead parks the handle for a short
+window and then flushes everything collected in a single transaction, so a
+burst of replies costs one transaction instead of one per reply.
+"""
+
+import asyncio
+
+from batching import Coalescer
+
+
+class TicketCompletionBatcher(Coalescer):
+    """Collect handles for `window_sec` (or until `max_batch`) and submit them together.
+
+    A handle listed twice in one batch completes two tickets.
+
+    Args:
+        submit: Blocking callable taking a list of handles and returning one
+            result string per handle; it runs in a worker thread. Typically
+            `complete_tickets.complete_tickets_each` bound to a wallet.
+        window_sec (float): How long the first handle in a batch waits for company.
+        max_batch (int): Flush immediately once this many handles are waiting.
+    """
+
+    def __init__(self, submit, window_sec=2.0, max_batch=50):
+        super().__init__(window_sec, max_batch)
+        self.submit = submit
+
+    async def complete(self, bsky_handle: str) -> str:
+        """Complete one ticket for `bsky_handle`; returns its result in the batch."""
+        return await self.request(bsky_handle)
+
+    async def run_batch(self, handles: list) -> list:
+        print(f"Completing {len(handles)} tickets in one transaction")
+        try:
+            return await asyncio.to_thread(self.submit, handles)
+        except Exception as e:
+            return [f"Error completing tickets: {e!s}"] * len(handles)
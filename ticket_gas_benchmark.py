@@ -0,0 +1,118 @@
+"""
+Gas comparison of TicketSystem and TicketSystemV2 on a local EVM.
+
+Compiles both contracts, deploys them to an in-process eth-tester chain and
+reports gas per ticket for buying, completing one at a time, completing in a
+`completeTickets` batch (V2 only; the deployed V1 contract has no batch call,
+so its one-at-a-time cost is the baseline), and reading balances (N single `getTicketInfo`
+calls vs one V2 `getTicketInfoBatch`).
+
+Needs the optional dev dependencies `py-solc-x` (plus a solc install) and
+`eth-tester[py-evm]`:
+
+    pip install py-solc-x "eth-tester[py-evm]"
+    python ticket_gas_benchmark.py
+
+To run against a local node with unlocked accounts (anvil, hardhat) instead
+of eth-tester, set `GAS_BENCHMARK_RPC_URL`:
+
+    anvil &
+    GAS_BENCHMARK_RPC_URL=http://127.0.0.1:8545 python ticket_gas_benchmark.py
+"""
+
+import os
+
+from web3 import Web3
+
+from compile_contracts import compile_contract
+
+TICKET_PRICE_WEI = Web3.to_wei(0.0001, "ether")
+BATCH_SIZES = [1, 5, 10, 25, 50]
+
+
+def deploy(web3: Web3, compiled: dict):
+    owner = web3.eth.accounts[0]
+    contract = web3.eth.contract(abi=compiled["abi"], bytecode=compiled["bin"])
+    tx_hash = contract.constructor(owner).transact({"from": owner})
+    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    ticket_system = web3.eth.contract(address=receipt.contractAddress, abi=compiled["abi"])
+    if hasattr(ticket_system.functions, "finalizeMigration"):
+        ticket_system.functions.finalizeMigration().transact({"from": owner})
+    return ticket_system
+
+
+def gas_used(web3: Web3, tx_hash) -> int:
+    return web3.eth.wait_for_transaction_receipt(tx_hash).gasUsed
+
+
+def handle_hashes(handles: list[str]) -> list[bytes]:
+    return [Web3.keccak(text=handle) for handle in handles]
+
+
+def bench(web3: Web3, compiled: dict, handles: list[str], v2: bool) -> dict:
+    """Gas per ticket for each operation on one contract version."""
+    owner, buyer = web3.eth.accounts[0], web3.eth.accounts[1]
+    size = len(handles)
+    # Complete-one-at-a-time and batched completion each get a fresh deployment
+    single, batch = deploy(web3, compiled), deploy(web3, compiled)
+    # V1 completes one ticket per transaction either way
+
+    buy_gas = 0
+    for ticket_system in (single, batch):
+        for handle in handles:
+            buy_gas += gas_used(web3, ticket_system.functions.buyTickets(handle, 1).transact(
+                {"from": buyer, "value": TICKET_PRICE_WEI}))
+
+    keys = handle_hashes(handles) if v2 else handles
+    complete_gas = sum(
+        gas_used(web3, single.functions.completeTicket(key).transact({"from": owner}))
+        for key in keys)
+    if v2:
+        batch_gas = gas_used(web3, batch.functions.completeTickets(handle_hashes(handles)).transact({"from": owner}))
+    else:
+        batch_gas = sum(
+            gas_used(web3, batch.functions.completeTicket(handle).transact({"from": owner}))
+            for handle in handles)
+
+    if v2:
+        read_gas = batch.functions.getTicketInfoBatch(handle_hashes(handles)).estimate_gas()
+    else:
+        read_gas = sum(batch.functions.getTicketInfo(handle).estimate_gas() for handle in handles)
+
+    return {
+        "buy": buy_gas / (2 * size),
+        "complete": complete_gas / size,
+        "complete batch": batch_gas / size,
+        "read": read_gas / size,
+    }
+
+
+def local_web3() -> Web3:
+    """GAS_BENCHMARK_RPC_URL's node, or an in-process eth-tester chain."""
+    rpc_url = os.environ.get("GAS_BENCHMARK_RPC_URL")
+    if rpc_url:
+        return Web3(Web3.HTTPProvider(rpc_url))
+    try:
+        from web3 import EthereumTesterProvider
+        return Web3(EthereumTesterProvider())
+    except Exception as e:
+        raise SystemExit(f"{e}. Install eth-tester[py-evm] to run this benchmark.")
+
+
+def main() -> None:
+    web3 = local_web3()
+    v1 = compile_contract("TicketContract.sol", "TicketSystem")
+    v2 = compile_contract("TicketSystemV2.sol", "TicketSystemV2")
+
+    print(f"{'tickets':>8} {'operation':>15} {'v1 gas/ticket':>14} {'v2 gas/ticket':>14} {'saving':>7}")
+    for size in BATCH_SIZES:
+        handles = [f"user{i}.bsky.social" for i in range(size)]
+        v1_gas = bench(web3, v1, handles, v2=False)
+        v2_gas = bench(web3, v2, handles, v2=True)
+        for operation in v1_gas:
+            saving = 1 - v2_gas[operation] / v1_gas[operation]
+            print(f"{size:>8} {operation:>15} {v1_gas[operation]:>14,.0f} {v2_gas[operation]:>14,.0f} {saving:>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""
+Off-chain index of TicketSystem balances.
+
+Consumes `TicketsPurchased` and `TicketCompleted`/`TicketCompletedByHash` logs from the ticket
+contract (contracts/TicketContract.sol) into a local SQLite table, tracking
+the last indexed block so each sync only asks for new logs. Checking whether
+a handle has tickets is then a local lookup instead of a `read_contract`
+round trip through the CDP API. Balances can be reconciled against on-chain
+`getTicketInfo` reads (at the indexed block) to correct any drift.
+
+Both events index the handle as `string indexed`, so logs carry
+keccak256(handle) rather than the handle itself; balances are keyed by that
+hash, the same key the contract uses internally.
+
+It also keeps a reservation ledger: accepting a mention reserves one of the
+handle's tickets locally, so concurrent mentions from one user see the
+reduced balance straight away instead of waiting for completions to land.
+A reservation is settled by the matching completion event, or released if
+the completion fails.
+
+Handles confirmed to have no tickets go into a negative cache, so repeat
+mentions from them skip the on-chain read. An entry stays valid until a
+purchase for that handle is indexed, and also records when the canned
+"buy tickets" reply was last sent so it is posted at most once per window.
+
+The indexer only needs a web3 instance, so it can be pointed at a local EVM
+(e.g. `Web3(EthereumTesterProvider())`) with a freshly deployed contract.
+"""
+
+import threading
+import time
+
+from web3 import Web3
+
+from sqlite_store import SQLiteStore
+
+TICKET_INDEX_DB_FILE = "ticket_index.db"
+# Blocks requested per eth_getLogs call; public RPCs cap the range.
+LOG_CHUNK_BLOCKS = 2000
+# Only index blocks this far behind the head to stay clear of reorgs.
+CONFIRMATIONS = 2
+
+# Reservations older than this are dropped, e.g. for jobs that failed for good
+# or completions whose transaction never landed.
+RESERVATION_TTL_SEC = 3600
+
+# Upper bound on how long a handle stays in the negative cache without a
+# purchase being indexed, in case the index is lagging or missed a log.
+NO_TICKETS_TTL_SEC = 86400
+
+# Only the view needed for reconciliation
+ticket_abi = [
+    {
+        "inputs": [{"internalType": "string", "name": "bskyHandle", "type": "string"}],
+        "name": "getTicketInfo",
+        "outputs": [
+            {"internalType": "uint256", "name": "fundedCount", "type": "uint256"},
+            {"internalType": "uint256", "name": "completedCount", "type": "uint256"},
+            {"internalType": "uint256", "name": "availableTickets", "type": "uint256"}
+        ],
+        "stateMutability": "view",
+        "type": "function"
+    }
+]
+
+TICKETS_PURCHASED_TOPIC = bytes(Web3.keccak(text="TicketsPurchased(string,address,uint256)"))
+# TicketSystemV2 events, keyed by the same handle hash
+TICKETS_PURCHASED_BY_HASH_TOPIC = bytes(Web3.keccak(text="TicketsPurchasedByHash(bytes32,address,uint256)"))
+PURCHASED_TOPICS = (TICKETS_PURCHASED_TOPIC, TICKETS_PURCHASED_BY_HASH_TOPIC)
+TICKET_COMPLETED_TOPIC = bytes(Web3.keccak(text="TicketCompleted(string)"))
+# Emitted by TicketSystemV2; topic 1 is the same handle hash as TicketCompleted's.
+TICKET_COMPLETED_BY_HASH_TOPIC = bytes(Web3.keccak(text="TicketCompletedByHash(bytes32)"))
+COMPLETED_TOPICS = (TICKET_COMPLETED_TOPIC, TICKET_COMPLETED_BY_HASH_TOPIC)
+
+
+def handle_hash(bsky_handle: str) -> str:
+    """keccak256 of the handle, as the contract and event topics compute it."""
+    return bytes(Web3.keccak(text=bsky_handle)).hex()
+
+
+class TicketIndexer(SQLiteStore):
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS balances ("
+        " handle_hash TEXT PRIMARY KEY,"
+        " funded INTEGER NOT NULL DEFAULT 0,"
+        " completed INTEGER NOT NULL DEFAULT 0,"
+        " updated_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS cursor ("
+        " contract TEXT PRIMARY KEY,"
+        " block INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS reservations ("
+        " job_id TEXT PRIMARY KEY,"
+        " handle_hash TEXT NOT NULL,"
+        " state TEXT NOT NULL,"
+        " created_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS no_tickets ("
+        " handle_hash TEXT PRIMARY KEY,"
+        " checked_at REAL NOT NULL,"
+        " canned_reply_job TEXT,"
+        " canned_reply_at REAL)",
+        "CREATE INDEX IF NOT EXISTS reservations_handle ON reservations (handle_hash, created_at)",
+    )
+
+    def __init__(self, web3, contract_address, path=TICKET_INDEX_DB_FILE, start_block=0,
+                 confirmations=CONFIRMATIONS, chunk_blocks=LOG_CHUNK_BLOCKS):
+        self.web3 = web3
+        self.contract_address = Web3.to_checksum_address(contract_address)
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.chunk_blocks = chunk_blocks
+        self.contract = web3.eth.contract(address=self.contract_address, abi=ticket_abi)
+        # Serialises sync and reconcile so a reconciliation read always
+        # matches the cursor block; lookups only take `_lock`.
+        self._sync_lock = threading.Lock()
+        # Set once a sync reaches the confirmed head. Until then unseen
+        # handles can't be told apart from handles whose logs are still
+        # ahead of the cursor, so lookups return None.
+        self.caught_up = False
+        super().__init__(path)
+        with self._lock:
+            self._forget_other_contracts()
+
+    def _forget_other_contracts(self) -> None:
+        """Drop state indexed from a different contract address.
+
+        Balances, reservations and the negative cache aren't keyed by
+        contract, so after switching contracts (e.g. to TicketSystemV2) the
+        old counts would otherwise be served as the new contract's. The new
+        contract is indexed from `start_block`; balances it got through
+        `migrate` (which emits no events) come from on-chain reads and
+        `reconcile` instead.
+        """
+        if not self._conn.execute(
+                "SELECT 1 FROM cursor WHERE contract != ?", (self.contract_address,)).fetchone():
+            return
+        print(f"Ticket index was built for another contract, re-indexing {self.contract_address}")
+        with self._transaction():
+            for table in ("balances", "reservations", "no_tickets", "cursor"):
+                self._conn.execute(f"DELETE FROM {table}")
+
+    @property
+    def last_block(self):
+        """Last fully indexed block, or None if nothing has been indexed yet."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT block FROM cursor WHERE contract = ?", (self.contract_address,)).fetchone()
+        return row[0] if row else None
+
+    def sync(self, max_chunks=None) -> int:
+        """Index new logs up to the confirmed head. Returns the number of logs applied."""
+        with self._sync_lock:
+            return self._sync(max_chunks)
+
+    def _sync(self, max_chunks) -> int:
+        head = self.web3.eth.block_number - self.confirmations
+        last_block = self.last_block
+        from_block = self.start_block if last_block is None else last_block + 1
+        applied = 0
+        chunks = 0
+        while from_block <= head and (max_chunks is None or chunks < max_chunks):
+            to_block = min(from_block + self.chunk_blocks - 1, head)
+            logs = self.web3.eth.get_logs({
+                "address": self.contract_address,
+                "fromBlock": from_block,
+                "toBlock": to_block,
+                "topics": [[*PURCHASED_TOPICS, *COMPLETED_TOPICS]],
+            })
+            applied += self._apply(logs, to_block)
+            from_block = to_block + 1
+            chunks += 1
+        if from_block > head:
+            self.caught_up = True
+        return applied
+
+    def _apply(self, logs, to_block) -> int:
+        """Apply one chunk of logs and advance the cursor in a single transaction."""
+        now = time.time()
+        with self._lock, self._transaction():
+            for log in logs:
+                topic = bytes(log["topics"][0])
+                key = bytes(log["topics"][1]).hex()
+                if topic in PURCHASED_TOPICS:
+                    amount = int.from_bytes(bytes(log["data"])[:32], "big")
+                    self._conn.execute(
+                        "INSERT INTO balances (handle_hash, funded, completed, updated_at)"
+                        " VALUES (?, ?, 0, ?)"
+                        " ON CONFLICT(handle_hash) DO UPDATE SET"
+                        " funded = funded + excluded.funded, updated_at = excluded.updated_at",
+                        (key, amount, now))
+                    self._conn.execute("DELETE FROM no_tickets WHERE handle_hash = ?", (key,))
+                elif topic in COMPLETED_TOPICS:
+                    self._conn.execute(
+                        "INSERT INTO balances (handle_hash, funded, completed, updated_at)"
+                        " VALUES (?, 0, 1, ?)"
+                        " ON CONFLICT(handle_hash) DO UPDATE SET"
+                        " completed = completed + 1, updated_at = excluded.updated_at",
+                        (key, now))
+                    # The completion is now counted in the balance, so the
+                    # submitted reservation it settles must stop counting.
+                    self._conn.execute(
+                        "DELETE FROM reservations WHERE job_id = ("
+                        " SELECT job_id FROM reservations"
+                        " WHERE handle_hash = ? AND state = 'submitted'"
+                        " ORDER BY created_at LIMIT 1)",
+                        (key,))
+            self._conn.execute(
+                "INSERT INTO cursor (contract, block) VALUES (?, ?)"
+                " ON CONFLICT(contract) DO UPDATE SET block = excluded.block",
+                (self.contract_address, to_block))
+        return len(logs)
+
+    def get_ticket_info(self, bsky_handle: str):
+        """Return `(funded, completed, available)` from the index, or None if not caught up yet."""
+        if not self.caught_up:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT funded, completed FROM balances WHERE handle_hash = ?",
+                (handle_hash(bsky_handle),)).fetchone()
+        funded, completed = row if row else (0, 0)
+        return funded, completed, max(funded - completed, 0)
+
+    def reserve(self, bsky_handle: str, job_id: str, available: int = None):
+        """Atomically claim one ticket for `job_id`.
+
+        Availability is the indexed balance (or `available`, e.g. from an
+        on-chain read, when given) minus tickets already reserved by other
+        jobs, so concurrent mentions from one handle can't all spend the same
+        ticket before any completion confirms. Reservations stay counted
+        until their completion event is indexed, even against an on-chain
+        balance that may already include it, so the count errs towards
+        refusing. Reserving again for the same job is a no-op.
+
+        Returns:
+            int | None: Tickets that were available to this job (0 means none,
+            so nothing was reserved), or None if no `available` was given and
+            the index hasn't caught up.
+        """
+        if available is None and not self.caught_up:
+            return None
+        key = handle_hash(bsky_handle)
+        now = time.time()
+        with self._lock, self._transaction():
+            # Reservations whose job never finished stop counting after a while.
+            self._conn.execute(
+                "DELETE FROM reservations WHERE created_at < ?", (now - RESERVATION_TTL_SEC,))
+            if self._conn.execute(
+                    "SELECT 1 FROM reservations WHERE job_id = ?", (job_id,)).fetchone():
+                return max(available or 0, 1)
+            if available is None:
+                row = self._conn.execute(
+                    "SELECT funded, completed FROM balances WHERE handle_hash = ?", (key,)).fetchone()
+                available = max(row[0] - row[1], 0) if row else 0
+            # Submitted completions count until their event is indexed:
+            # the transaction may still be pending, and an on-chain read
+            # can't tell whether it is.
+            reserved = self._conn.execute(
+                "SELECT COUNT(*) FROM reservations WHERE handle_hash = ?", (key,)).fetchone()[0]
+            available = max(available - reserved, 0)
+            if available > 0:
+                self._conn.execute(
+                    "INSERT INTO reservations (job_id, handle_hash, state, created_at)"
+                    " VALUES (?, ?, 'reserved', ?)",
+                    (job_id, key, now))
+        return available
+
+    def mark_submitted(self, job_id: str) -> None:
+        """The completion for `job_id` was sent; its event will settle the reservation."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reservations SET state = 'submitted' WHERE job_id = ?", (job_id,))
+
+    def release(self, job_id: str) -> None:
+        """Give back the ticket reserved for `job_id` (e.g. its completion or
+        the job itself failed). A submitted reservation is left for its
+        completion event to settle."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM reservations WHERE job_id = ? AND state = 'reserved'", (job_id,))
+
+    def has_no_tickets(self, bsky_handle: str) -> bool:
+        """Whether the handle is in the negative cache (known to have no tickets)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT checked_at FROM no_tickets WHERE handle_hash = ?",
+                (handle_hash(bsky_handle),)).fetchone()
+        return row is not None and row[0] >= time.time() - NO_TICKETS_TTL_SEC
+
+    def mark_no_tickets(self, bsky_handle: str) -> None:
+        """Add a handle just confirmed on chain to have no tickets to the negative cache.
+
+        Skipped if the index already shows a balance, i.e. a purchase was
+        indexed between the on-chain read and this call.
+        """
+        key = handle_hash(bsky_handle)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT funded, completed FROM balances WHERE handle_hash = ?", (key,)).fetchone()
+            if row and row[0] > row[1]:
+                return
+            self._conn.execute(
+                "INSERT INTO no_tickets (handle_hash, checked_at) VALUES (?, ?)"
+                " ON CONFLICT(handle_hash) DO UPDATE SET checked_at = excluded.checked_at",
+                (key, time.time()))
+
+    def claim_canned_reply(self, bsky_handle: str, job_id: str, window_sec: float) -> bool:
+        """Whether `job_id` may post the canned reply to a handle without tickets.
+
+        Only one job per handle gets to post it within `window_sec`; claiming
+        again for the same job (e.g. after a restart) still succeeds.
+        """
+        key = handle_hash(bsky_handle)
+        now = time.time()
+        with self._lock, self._transaction():
+            # A new row only tracks the reply; checked_at 0 keeps it out
+            # of the negative cache (the user may just have every ticket
+            # reserved by other mentions).
+            row = self._conn.execute(
+                "SELECT canned_reply_job, canned_reply_at FROM no_tickets WHERE handle_hash = ?",
+                (key,)).fetchone()
+            if row and row[1] is not None and row[0] != job_id and row[1] >= now - window_sec:
+                return False
+            self._conn.execute(
+                "INSERT INTO no_tickets (handle_hash, checked_at, canned_reply_job, canned_reply_at)"
+                " VALUES (?, 0, ?, ?)"
+                " ON CONFLICT(handle_hash) DO UPDATE SET"
+                " canned_reply_job = excluded.canned_reply_job,"
+                " canned_reply_at = excluded.canned_reply_at",
+                (key, job_id, now))
+        return True
+
+    def all_balances(self) -> list:
+        """Every indexed balance as `(handle_hash, funded, completed)`."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT handle_hash, funded, completed FROM balances ORDER BY handle_hash").fetchall()
+
+    def reconcile(self, bsky_handle: str) -> bool:
+        """Check a handle's indexed balance against `getTicketInfo` on chain.
+
+        The contract is read at the last indexed block, so the comparison is
+        exact even while newer logs are still waiting to be indexed. A drifted
+        balance is overwritten. Returns True if it had drifted.
+        """
+        key = handle_hash(bsky_handle)
+        with self._sync_lock:
+            last_block = self.last_block
+            if last_block is None:
+                return False
+            funded, completed, _ = self.contract.functions.getTicketInfo(bsky_handle).call(
+                block_identifier=last_block)
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT funded, completed FROM balances WHERE handle_hash = ?", (key,)).fetchone()
+                if (row or (0, 0)) == (funded, completed):
+                    return False
+                self._conn.execute(
+                    "INSERT INTO balances (handle_hash, funded, completed, updated_at)"
+                    " VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(handle_hash) DO UPDATE SET"
+                    " funded = excluded.funded, completed = excluded.completed,"
+                    " updated_at = excluded.updated_at",
+                    (key, funded, completed, time.time()))
+                if funded > completed:
+                    self._conn.execute("DELETE FROM no_tickets WHERE handle_hash = ?", (key,))
+            print(f"Reconciled ticket balance for {bsky_handle}: {row} -> {(funded, completed)}")
+            return True
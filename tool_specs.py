@@ -0,0 +1,132 @@
+"""
+Precompiled OpenAI tool specifications for the CDP actions.
+
+Building the tool list means calling `model_json_schema()` on every action's
+pydantic args model, which is slow enough to show up at startup. The list is
+built once and cached on disk under a fingerprint of the action modules'
+source, so a warm start just loads the JSON. A change to any action module (or
+to pydantic) changes the fingerprint and the list is rebuilt.
+
+The result is a frozen `ToolSpecs`, built once per process and shared by
+every request. With the lazy action registry a warm start never imports
+the action modules at all; they load when a tool is first called.
+"""
+
+from dataclasses import dataclass, field
+import hashlib
+import inspect
+import json
+import os
+import sys
+from types import MappingProxyType
+
+import pydantic
+
+TOOL_SPECS_CACHE_FILE = "tool_specs_cache.json"
+
+
+@dataclass(frozen=True)
+class ToolSpecs:
+    """OpenAI `tools` for a set of actions.
+
+    `tools` is shared across requests; treat the specs as read-only.
+    """
+    fingerprint: str
+    tools: tuple
+    by_name: MappingProxyType = field(repr=False)
+
+    @classmethod
+    def from_tools(cls, fingerprint: str, tools) -> "ToolSpecs":
+        tools = tuple(tools)
+        return cls(fingerprint, tools, MappingProxyType({tool["function"]["name"]: tool for tool in tools}))
+
+    @property
+    def names(self) -> frozenset:
+        return frozenset(self.by_name)
+
+    def select(self, names) -> "ToolSpecs":
+        """The specs restricted to `names` (None keeps every tool), in the same order."""
+        if names is None:
+            return self
+        names = frozenset(names)
+        return ToolSpecs.from_tools(
+            self.fingerprint, (tool for tool in self.tools if tool["function"]["name"] in names))
+
+
+def build_tool(action) -> dict:
+    """OpenAI tool specification for one CdpAction."""
+    action_args_schema = action.args_schema.model_json_schema()
+    action_args_schema["strict"] = True
+    return {
+        "type": "function",
+        "function": {
+            "name": action.name,
+            "description": action.description.strip(),
+            "parameters": action_args_schema
+        }
+    }
+
+
+def _source_file(action) -> str:
+    # Lazy registry entries know their file without importing the module.
+    source_file = getattr(action, "source_file", None)
+    if source_file is not None:
+        return source_file
+    return inspect.getfile(sys.modules[type(action).__module__])
+
+
+def actions_fingerprint(actions) -> str:
+    """Hash of the source of every module defining one of `actions`."""
+    digest = hashlib.sha256(pydantic.VERSION.encode())
+    paths = sorted({_source_file(action) for action in actions})
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    # Order and membership of the action list matter too.
+    digest.update(",".join(action.name for action in actions).encode())
+    return digest.hexdigest()
+
+
+def _load_cached(fingerprint: str, path: str):
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if cached.get("fingerprint") != fingerprint:
+        return None
+    return cached["tools"]
+
+
+def _save_cached(fingerprint: str, tools, path: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "tools": list(tools)}, f)
+    os.replace(tmp_path, path)
+
+
+_specs = {}
+
+
+def get_tool_specs(actions, path: str = TOOL_SPECS_CACHE_FILE) -> ToolSpecs:
+    """Tool specifications for `actions`, from memory, the disk cache or built fresh."""
+    fingerprint = actions_fingerprint(actions)
+    specs = _specs.get(fingerprint)
+    if specs is not None:
+        return specs
+
+    tools = _load_cached(fingerprint, path)
+    if tools is None:
+        tools = [build_tool(action) for action in actions]
+        try:
+            _save_cached(fingerprint, tools, path)
+        except OSError as e:
+            print(f"Error caching tool specs: {e}")
+        print(f"Built {len(tools)} tool specs")
+    else:
+        print(f"Loaded {len(tools)} cached tool specs")
+
+    specs = ToolSpecs.from_tools(fingerprint, tools)
+    _specs[fingerprint] = specs
+    return specs